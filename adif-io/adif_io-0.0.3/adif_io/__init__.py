@@ -27,8 +27,13 @@
 # value for a key is whatever was found in the ADIF, as a string.
 # Order of QSOs in the list is same as in ADIF file.
 
+from array import array
+import contextlib
 from datetime import datetime, timedelta, timezone
+import io
+import os
 import re
+import sys
 
 class AdifException(Exception):
     """Base exception."""
@@ -38,61 +43,176 @@ class AdifHeaderWithoutEOH(AdifException):
     """Exception for header found, not terminated with <EOH>"""
     pass
 
-def read_from_string(adif_string):
-    # The ADIF file header keys and values, if any.
-    adif_headers = {}
-    
-    header_field_re = re.compile(r'<((eoh)|(\w+)\:(\d+)(\:[^>]+)?)>', re.IGNORECASE)
-    field_re = re.compile(r'<((eor)|(\w+)\:(\d+)(\:[^>]+)?)>', re.IGNORECASE)
-    
-    qsos = []
-    cursor = 0
-    if adif_string[0] != '<':
-        # Input has ADIF header. Read all header fields.
-        eoh_found = False
-        while(not eoh_found):
-            header_field_mo = header_field_re.search(adif_string, cursor)
-            if header_field_mo:
-                if header_field_mo.group(2):
-                    eoh_found = True
-                    cursor = header_field_mo.end(0)
-                else:
-                    field = header_field_mo.group(3).upper()
-                    value_start = header_field_mo.end(0)
-                    value_end = value_start + int(header_field_mo.group(4))
-                    value = adif_string[value_start:value_end]
-                    adif_headers[field] = value
-                    cursor = value_end
-            else:
-                raise AdifHeaderWithoutEOF()
-                
-        
-    qso = {}
-    field_mo = field_re.search(adif_string, cursor)
-    while(field_mo):
-        if field_mo.group(2):
-            # <eor> found:
-            qsos.append(qso)
-            qso = {}
-            cursor = field_mo.end(0)
-        else:
-            # Field found:
-            field = field_mo.group(3).upper()
-            value_start = field_mo.end(0)
-            value_end = value_start + int(field_mo.group(4))
-            value = adif_string[value_start:value_end]
-            qso[field] = value
-            cursor = value_end
-        field_mo = field_re.search(adif_string, cursor)
-
-    return [qsos, adif_headers]
-
-def read_from_file(filename):
+def read_from_string(adif_string, scanner=None):
+    """Return [qsos, header] of ADIF text.
+
+    scanner is the name of one of the scanners in SCANNERS (see
+    scanner.py); they all return the same QSOs."""
+    return scan(adif_string, scanner)
+
+def read_from_file(filename, scanner=None):
     
     with open(filename) as adif_file:
         adif_string = adif_file.read()
-        print("[["+adif_string+"]]")
-        return read_from_string(adif_string)
+        return read_from_string(adif_string, scanner)
+
+# Streaming input.
+
+# read_from_file() holds the whole file (and then the whole list of
+# QSOs) in memory.  For big files, iter_records() reads the file in
+# chunks and yields each QSO dict as soon as its <eor> has been read.
+# A value is always taken by its length prefix, so a value containing
+# <eor> or crossing a chunk boundary is handled like read_from_string().
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_header_field_re = re.compile(r'<((eoh)|(\w+)\:(\d+)(\:[^>]+)?)>', re.IGNORECASE)
+_field_re = re.compile(r'<((eor)|(\w+)\:(\d+)(\:[^>]+)?)>', re.IGNORECASE)
+
+class AdifStream:
+    """Incremental reader for an open ADIF text file.
+
+    Call read_header() (optional) and then iterate to get the QSOs."""
+
+    def __init__(self, adif_file, chunk_size=DEFAULT_CHUNK_SIZE):
+        if not isinstance(adif_file, io.TextIOBase):
+            adif_file = io.TextIOWrapper(adif_file)
+        self._file = adif_file
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._cursor = 0
+        self._eof = False
+        self._header = None
+
+    def _fill(self):
+        """Read one more chunk, dropping what has been consumed.
+        Return False at end of file."""
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._cursor:] + chunk
+        self._cursor = 0
+        return True
+
+    def _next_field(self, field_re):
+        """Return (True, None, None) for the end tag, (False, field, value)
+        for a field, or None at end of input."""
+        while True:
+            field_mo = field_re.search(self._buffer, self._cursor)
+            if field_mo:
+                if field_mo.group(2):
+                    self._cursor = field_mo.end(0)
+                    return (True, None, None)
+                value_start = field_mo.end(0)
+                value_end = value_start + int(field_mo.group(4))
+                if value_end <= len(self._buffer) or self._eof:
+                    self._cursor = value_end
+                    return (False, field_mo.group(3).upper(),
+                            self._buffer[value_start:value_end])
+            if not self._fill():
+                if field_mo:
+                    # Value truncated by end of file, as read_from_string().
+                    continue
+                return None
+
+    def read_header(self):
+        """Return the ADIF header dict (empty if the file has no header)."""
+        if self._header is None:
+            self._header = {}
+            while self._cursor >= len(self._buffer):
+                if not self._fill():
+                    return self._header
+            if self._buffer[self._cursor] != '<':
+                while True:
+                    found = self._next_field(_header_field_re)
+                    if found is None:
+                        raise AdifHeaderWithoutEOH()
+                    eoh, field, value = found
+                    if eoh:
+                        break
+                    self._header[field] = value
+        return self._header
+
+    def __iter__(self):
+        self.read_header()
+        qso = {}
+        found = self._next_field(_field_re)
+        while found:
+            eor, field, value = found
+            if eor:
+                yield qso
+                qso = {}
+            else:
+                qso[field] = value
+            found = self._next_field(_field_re)
+
+# A file name ending in one of these is decompressed as it is read;
+# STDIN as a file name is the standard input.
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.xz')
+STDIN = '-'
+
+def is_stream_only(source):
+    """Return True if a file name can only be read as a stream (not
+    memory-mapped or read twice): stdin or a compressed file."""
+    return source == STDIN or str(source).lower().endswith(COMPRESSED_SUFFIXES)
+
+def open_input(source, binary=False):
+    """Return (file, must_close) for a file name, STDIN, or an open file;
+    a text file unless binary."""
+    if not isinstance(source, (str, bytes, os.PathLike)):
+        return source, False
+    if source == STDIN:
+        return (sys.stdin.buffer if binary else sys.stdin), False
+    mode = 'rb' if binary else 'rt'
+    suffix = os.path.splitext(str(source))[1].lower()
+    # Imported here: most files are not compressed.
+    if suffix == '.gz':
+        import gzip
+        return gzip.open(source, mode), True
+    if suffix == '.bz2':
+        import bz2
+        return bz2.open(source, mode), True
+    if suffix == '.xz':
+        import lzma
+        return lzma.open(source, mode), True
+    return open(source, mode), True
+
+# A file name ending in this (before any COMPRESSED_SUFFIXES) is an
+# ADX (XML) file; see adx.py.
+ADX_SUFFIX = '.adx'
+
+def is_adx(source):
+    """Return True if a file name is of an ADX file (e.g. log.adx, log.adx.gz)."""
+    name = str(source).lower()
+    if name.endswith(COMPRESSED_SUFFIXES):
+        name = os.path.splitext(name)[0]
+    return name.endswith(ADX_SUFFIX)
+
+@contextlib.contextmanager
+def open_stream(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return an AdifStream of a file name, STDIN or an open file, or an
+    AdxStream if it is the name of an ADX file; a file it opens is closed
+    at the end of the with statement."""
+    adx = is_adx(source)
+    adif_file, must_close = open_input(source, binary=adx)
+    try:
+        yield AdxStream(adif_file) if adx else AdifStream(adif_file, chunk_size)
+    finally:
+        if must_close:
+            adif_file.close()
+
+def read_header(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read only the ADIF header of a file name or open file."""
+    with open_stream(source, chunk_size) as stream:
+        return stream.read_header()
+
+def iter_records(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the QSO dicts of a file name or open file, one at a time."""
+    with open_stream(source, chunk_size) as stream:
+        yield from stream
 
 _one_day = timedelta(days=1)
     
@@ -132,3 +252,174 @@ def time_off(qso):
             return time_off_maybe
         else:
             return time_off_maybe + _one_day
+
+# Batch versions of time_on() and time_off().
+
+# These take lists (or other sequences) of the QSO_DATE, TIME_ON,
+# QSO_DATE_OFF and TIME_OFF strings of many QSOs and return
+# (epochs, bad): epochs is an array('q') of epoch seconds (UTC) and bad
+# a bytearray that is 1 where a date or time is not valid (the epoch
+# is 0 there), instead of raising an exception part-way through.
+# Times may be HHMM or HHMMSS.  If NumPy is installed, the strings are
+# converted in one vectorized pass (unless there are only a few, when
+# that costs more than it saves); otherwise in a loop that converts
+# each distinct date only once.
+
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+_NUMPY_MIN_BATCH = 64
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+_numpy = None
+
+def _import_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+def _day_numbers(dates):
+    """Return {date: days since 1970-01-01, or None if not a valid YYYYMMDD}."""
+    days = {}
+    for date in set(dates):
+        day = None
+        if date and len(date) == 8 and date.isdigit() and date.isascii():
+            try:
+                day = datetime(int(date[0:4]), int(date[4:6]), int(date[6:8])).toordinal() - _EPOCH_ORDINAL
+            except ValueError:
+                pass
+        days[date] = day
+    return days
+
+def _time_seconds(time):
+    """Return the seconds since midnight for HHMM or HHMMSS, or None."""
+    if not (len(time) in (4, 6) and time.isdigit() and time.isascii()):
+        return None
+    h = int(time[0:2])
+    mi = int(time[2:4])
+    s = int(time[4:6]) if len(time) == 6 else 0
+    if h > 23 or mi > 59 or s > 59:
+        return None
+    return (h * 60 + mi) * 60 + s
+
+def _epochs_python(dates, times):
+    days = _day_numbers(dates)
+    epochs = array('q', bytes(8 * len(dates)))
+    bad = bytearray(len(dates))
+    for i, (date, time) in enumerate(zip(dates, times)):
+        day = days[date]
+        seconds = _time_seconds(time)
+        if day is None or seconds is None:
+            bad[i] = 1
+        else:
+            epochs[i] = day * _SECONDS_PER_DAY + seconds
+    return epochs, bad
+
+def _digits_numpy(np, strings, widths):
+    """Return (digits, ok): an n x max(widths) array of the digit values
+    of the strings, and where the strings are all ASCII digits of one of
+    the widths."""
+    width = max(widths)
+    strings = np.asarray(strings, dtype=str)
+    lengths = np.char.str_len(strings) if strings.size else np.zeros(0, dtype=int)
+    ok = np.isin(lengths, widths)
+    digits = strings.astype('<U%d' % width).view(np.uint32).reshape(len(strings), width).astype(np.int64) - 48
+    in_range = (digits >= 0) & (digits <= 9)
+    for w in widths:
+        ok &= (lengths != w) | in_range[:, :w].all(axis=1)
+    return digits, ok
+
+def _epochs_numpy(np, dates, times):
+    date_digits, ok = _digits_numpy(np, dates, (8,))
+    time_digits, time_ok = _digits_numpy(np, times, (4, 6))
+    ok &= time_ok
+    y = date_digits[:, 0] * 1000 + date_digits[:, 1] * 100 + date_digits[:, 2] * 10 + date_digits[:, 3]
+    mo = date_digits[:, 4] * 10 + date_digits[:, 5]
+    d = date_digits[:, 6] * 10 + date_digits[:, 7]
+    h = time_digits[:, 0] * 10 + time_digits[:, 1]
+    mi = time_digits[:, 2] * 10 + time_digits[:, 3]
+    has_seconds = np.char.str_len(np.asarray(times, dtype=str)) == 6 if len(times) else ok
+    s = np.where(has_seconds, time_digits[:, 4] * 10 + time_digits[:, 5], 0)
+    ok &= (y >= 1) & (mo >= 1) & (mo <= 12) & (d >= 1) & (h <= 23) & (mi <= 59) & (s <= 59)
+    # Days since 1970-01-01 of a proleptic Gregorian date
+    # (H. Hinnant's days_from_civil).
+    yy = y - (mo <= 2)
+    era = yy // 400
+    yoe = yy - era * 400
+    doy = (153 * (mo + np.where(mo > 2, -3, 9)) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    days = era * 146097 + doe - 719468
+    leap = ((y % 4 == 0) & (y % 100 != 0)) | (y % 400 == 0)
+    month_days = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])[np.clip(mo, 0, 12)]
+    ok &= d <= month_days + (leap & (mo == 2))
+    epochs = np.where(ok, days * _SECONDS_PER_DAY + (h * 60 + mi) * 60 + s, 0)
+    return epochs, ok
+
+def _to_arrays(np, epochs, ok):
+    result = array('q')
+    result.frombytes(epochs.astype(np.int64).tobytes())
+    return result, bytearray((~ok).astype(np.uint8).tobytes())
+
+def time_on_epochs(dates, times):
+    """Batch time_on(): return (epochs, bad) for QSO_DATEs and TIME_ONs."""
+    if len(dates) != len(times):
+        raise ValueError('dates and times must have the same length')
+    np = _import_numpy() if len(dates) >= _NUMPY_MIN_BATCH else None
+    if np:
+        return _to_arrays(np, *_epochs_numpy(np, dates, times))
+    return _epochs_python(dates, times)
+
+def time_off_epochs(dates, times_on, times_off, dates_off=None):
+    """Batch time_off(): return (epochs, bad) for the QSO_DATEs, TIME_ONs,
+    TIME_OFFs and (if known) QSO_DATE_OFFs of QSOs.
+
+    A dates_off entry of None means the QSO has no QSO_DATE_OFF.  Then, as
+    in time_off(), TIME_OFF is on QSO_DATE if that is after TIME_ON, or
+    else on the next day."""
+    n = len(dates)
+    if not (len(times_on) == n and len(times_off) == n
+            and (dates_off is None or len(dates_off) == n)):
+        raise ValueError('dates and times must have the same length')
+    if dates_off is None:
+        dates_off = [None] * n
+    has_off = [date_off is not None for date_off in dates_off]
+    off_dates = [date if date_off is None else date_off
+                 for date, date_off in zip(dates, dates_off)]
+    np = _import_numpy() if n >= _NUMPY_MIN_BATCH else None
+    if np:
+        on, on_ok = _epochs_numpy(np, dates, times_on)
+        off, off_ok = _epochs_numpy(np, off_dates, times_off)
+        has_off = np.array(has_off, dtype=bool)
+        roll = ~has_off & (off <= on)
+        off = np.where(roll, off + _SECONDS_PER_DAY, off)
+        ok = off_ok & (has_off | on_ok)
+        return _to_arrays(np, np.where(ok, off, 0), ok)
+    on, on_bad = _epochs_python(dates, times_on)
+    off, off_bad = _epochs_python(off_dates, times_off)
+    for i in range(n):
+        if has_off[i] or off_bad[i]:
+            continue
+        if on_bad[i]:
+            off_bad[i] = 1
+            off[i] = 0
+        elif off[i] <= on[i]:
+            off[i] += _SECONDS_PER_DAY
+    return off, off_bad
+
+# The scanners of read_from_string() (see scanner.py).
+from .scanner import DEFAULT_SCANNER, SCANNERS, canonical_name, scan
+
+# The memory-mapped, bytes-level parser (see mapped.py).
+from .mapped import AdifRecord, MappedAdif, iter_mapped_records
+
+# Output (see writer.py).
+from .writer import AdifWriter
+
+# ADX, the XML form of ADIF (see adx.py).
+from .adx import AdxStream, AdxWriter
+
+# Parallel parsing of one big file (see parallel.py).
+from .parallel import parallel_map, split_points
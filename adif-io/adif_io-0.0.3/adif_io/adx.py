@@ -0,0 +1,251 @@
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# ADX (the XML form of ADIF) input and output.
+
+# An ADX file is:
+#
+#    <?xml version="1.0" encoding="UTF-8"?>
+#    <ADX>
+#      <HEADER>
+#        <ADIF_VER>3.1.0</ADIF_VER>
+#        <USERDEF FIELDID="1" TYPE="N">EPC</USERDEF>
+#      </HEADER>
+#      <RECORDS>
+#        <RECORD>
+#          <CALL>W1AW</CALL>
+#          <APP PROGRAMID="LOTW" FIELDNAME="MODEGROUP">DATA</APP>
+#          <USERDEF FIELDNAME="EPC">32</USERDEF>
+#        </RECORD>
+#      </RECORDS>
+#    </ADX>
+#
+# The QSOs and the header are the same dicts as from an .adi file: an
+# APP element is the field APP_<PROGRAMID>_<FIELDNAME>, a USERDEF
+# element in a record is the field it names, and one in the header is
+# USERDEF<FIELDID>; AdxWriter writes a field that a USERDEF header
+# field names as a USERDEF element.  Data types (the TYPE attributes) are dropped, as
+# they are for .adi files.
+#
+# AdxStream reads with ElementTree.iterparse(), and clears each record
+# once it has been made into a dict, so the tree never holds more than
+# one record, however big the file is.  AdxWriter writes through one
+# large buffer, like AdifWriter, and has the same methods, except the
+# ones that copy .adi bytes as they are.
+#
+# The writer escapes text itself: xml.sax.saxutils would make importing
+# adif_io slow, as it imports urllib and email.
+
+import os
+import re
+
+from .scanner import canonical_name
+
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+_APP = 'APP'
+_USERDEF = 'USERDEF'
+_APP_PREFIX = 'APP_'
+_userdef_re = re.compile(r'USERDEF(\d+)$')
+
+_ESCAPES = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'))
+_ATTRIBUTE_ESCAPES = _ESCAPES + (('"', '&quot;'), ('\n', '&#10;'), ('\r', '&#13;'), ('\t', '&#9;'))
+
+def _escape(text):
+    """Return text with &, < and > escaped, for the content of an element."""
+    for char, entity in _ESCAPES:
+        if char in text:
+            text = text.replace(char, entity)
+    return text
+
+def _quoteattr(text):
+    """Return text escaped and in double quotes, for an attribute value."""
+    for char, entity in _ATTRIBUTE_ESCAPES:
+        if char in text:
+            text = text.replace(char, entity)
+    return '"%s"' % text
+
+def _field_name(element):
+    """Return the field name of an element of a header or record."""
+    tag = element.tag
+    if tag == _APP:
+        return canonical_name('APP_%s_%s' % (element.get('PROGRAMID', ''),
+                                             element.get('FIELDNAME', '')))
+    if tag == _USERDEF:
+        fieldid = element.get('FIELDID')
+        if fieldid is not None:
+            return canonical_name(_USERDEF + fieldid)
+        return canonical_name(element.get('FIELDNAME', ''))
+    return canonical_name(tag)
+
+class AdxStream:
+    """Incremental reader for an open ADX file (best opened in binary
+    mode, so the XML declaration gives the encoding).
+
+    Call read_header() (optional) and then iterate to get the QSOs."""
+
+    def __init__(self, adx_file):
+        # Imported here: most files are not ADX.
+        from xml.etree import ElementTree
+        self._events = ElementTree.iterparse(adx_file, events=('start', 'end'))
+        self._header = None
+        # The RECORDS element, once its start has been read
+        self._records = None
+
+    def read_header(self):
+        """Return the ADIF header dict (empty if the file has no header)."""
+        if self._header is None:
+            self._header = {}
+            for event, element in self._events:
+                if event == 'start':
+                    if element.tag == 'RECORDS':
+                        self._records = element
+                        break
+                elif element.tag == 'HEADER':
+                    for field in element:
+                        self._header[_field_name(field)] = field.text or ''
+                    element.clear()
+                    break
+        return self._header
+
+    def __iter__(self):
+        self.read_header()
+        # Most fields are plain elements; look each tag up once.
+        names = {}
+        for event, element in self._events:
+            if event == 'start':
+                if self._records is None and element.tag == 'RECORDS':
+                    self._records = element
+                continue
+            if element.tag != 'RECORD':
+                continue
+            qso = {}
+            for field in element:
+                name = names.get(field.tag)
+                if name is None:
+                    name = _field_name(field)
+                    if field.tag != _APP and field.tag != _USERDEF:
+                        names[field.tag] = name
+                qso[name] = field.text or ''
+            # Drop the record from the tree.
+            if self._records is not None:
+                self._records.clear()
+            else:
+                element.clear()
+            yield qso
+
+class AdxWriter:
+    """Write an ADX file: the header and records.
+
+    target is a file name (the file is created) or a binary stream
+    (e.g. sys.stdout.buffer, which is flushed but not closed).
+    close() ends the file, so use it as a context manager or close it."""
+
+    def __init__(self, target, buffer_size=DEFAULT_BUFFER_SIZE, encoding='utf-8'):
+        if isinstance(target, (str, bytes, os.PathLike)):
+            self._stream = open(target, 'wb')
+            self._must_close = True
+        else:
+            self._stream = target
+            self._must_close = False
+        self._buffer = bytearray()
+        self._buffer_size = buffer_size
+        self._encoding = encoding
+        self._tag_cache = {}
+        # The fields defined by USERDEFn header fields
+        self._userdefs = set()
+        self._in_records = False
+        self._closed = False
+        self._write('<?xml version="1.0" encoding="%s"?>\n<ADX>\n' % encoding.upper())
+
+    def _tags(self, name):
+        """Return the start and end tags of the element of a field."""
+        tags = self._tag_cache.get(name)
+        if tags is None:
+            userdef = _userdef_re.match(name)
+            app = name[len(_APP_PREFIX):].partition('_')
+            if userdef:
+                tags = ('<USERDEF FIELDID="%s">' % userdef.group(1), '</USERDEF>')
+            elif name in self._userdefs:
+                tags = ('<USERDEF FIELDNAME=%s>' % _quoteattr(name), '</USERDEF>')
+            elif name.startswith(_APP_PREFIX) and app[0] and app[2]:
+                tags = ('<APP PROGRAMID=%s FIELDNAME=%s>' % (_quoteattr(app[0]), _quoteattr(app[2])),
+                        '</APP>')
+            else:
+                tags = ('<%s>' % name, '</%s>' % name)
+            self._tag_cache[name] = tags
+        return tags
+
+    def _fields(self, fields, indent):
+        parts = []
+        for name, value in fields:
+            start, end = self._tags(name)
+            parts.append('%s%s%s%s\n' % (indent, start, _escape(value), end))
+        return parts
+
+    def _write(self, text):
+        self._buffer += text.encode(self._encoding)
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def write_text(self, text):
+        """Write a line of free text, as an XML comment (before the header)."""
+        self._write('  <!-- %s -->\n' % text.replace('--', '- -'))
+
+    def write_header(self, header, first=(), ignore=()):
+        """Write the HEADER element.
+
+        The fields named in first are written first, then all others
+        except those named in ignore, each group in the order of header."""
+        fields = [(name, value) for name, value in header.items() if name in first]
+        fields.extend((name, value) for name, value in header.items()
+                      if not (name in first) and not (name in ignore))
+        # In .adi, the value is the field name, then maybe ",{range or values}".
+        self._userdefs = {value.partition(',')[0].strip().upper()
+                          for name, value in fields if _userdef_re.match(name)}
+        self._tag_cache.clear()
+        self._write(''.join(['  <HEADER>\n'] + self._fields(fields, '    ') + ['  </HEADER>\n']))
+
+    def write_record(self, record, extra=None):
+        """Write a record (a mapping of field names to values) as a RECORD
+        element.  The fields of the mapping extra, if any, are written at
+        the end of the record, replacing fields of the same name."""
+        if extra:
+            record = {name: value for name, value in record.items() if not (name in extra)}
+            record.update(extra)
+        parts = self._fields(record.items(), '      ')
+        parts.insert(0, '    <RECORD>\n' if self._in_records else '  <RECORDS>\n    <RECORD>\n')
+        parts.append('    </RECORD>\n')
+        self._in_records = True
+        self._write(''.join(parts))
+
+    def flush(self):
+        if self._buffer:
+            self._stream.write(self._buffer)
+            self._buffer.clear()
+        self._stream.flush()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._write(('  </RECORDS>\n' if self._in_records else '') + '</ADX>\n')
+        self.flush()
+        if self._must_close:
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,251 @@
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Memory-mapped, bytes-level ADIF parser.
+
+# The file is mmap'ed and scanned as raw bytes.  Each QSO is an
+# AdifRecord, which holds only the field names and the (offset, length)
+# of each value in the map (offsets relative to the start of the
+# record, in one small array); a value is decoded when it is read.
+# Lengths are byte counts, so non-ASCII (e.g. UTF-8) values are
+# handled correctly.
+
+# Field names are upper-cased once per distinct "<name:length>" tag
+# (canonical_name(), the same strings as read_from_string()) and shared
+# by all records, and so is the tuple of field names of records
+# with the same layout (which is nearly all of them in a LotW report).
+
+# The records are the same as the dicts of read_from_string(): a field
+# name is what \w+ matches in the decoded text (so non-ASCII letters
+# too), and if a field occurs more than once in a record, the last
+# value wins, in the place of the first one.
+
+from array import array
+from collections.abc import Mapping
+import mmap
+import re
+
+from . import AdifHeaderWithoutEOH
+from .scanner import canonical_name
+
+# Names may have non-ASCII letters; _word_re checks them once decoded.
+_header_field_re = re.compile(rb'<(?:(eoh)|([\w\x80-\xff]+):(\d+)(?::[^>]+)?)>',
+                              re.IGNORECASE)
+_field_re = re.compile(rb'<(?:(eor)|([\w\x80-\xff]+):(\d+)(?::[^>]+)?)>', re.IGNORECASE)
+_word_re = re.compile(r'\w+')
+
+# Whole ASCII tag (e.g. b'<CALL:5>') -> (field name, value length),
+# or _END for <eor>/<eoh>.  The number of distinct tags in real files is
+# small, but do not let a strange file grow this without limit.
+_END = object()
+_NOT_A_TAG = object()
+_tag_cache = {}
+_TAG_CACHE_LIMIT = 10000
+
+# Tuple of field names -> (the tuple of field names of the record, and
+# None, or if a name occurs more than once, the indexes of the fields
+# to keep), to share them between records.
+_layout_cache = {}
+_LAYOUT_CACHE_LIMIT = 10000
+
+def _field_name(name, encoding, errors):
+    """Return the field name of the bytes of a tag's name, or None
+    if read_from_string() would not take it for one."""
+    name = str(name, encoding, errors)
+    return name if _word_re.fullmatch(name) else None
+
+def _lookup_tag(field_mo, encoding='utf-8', errors='replace'):
+    tag = field_mo.group(0)
+    entry = _tag_cache.get(tag)
+    if entry is None:
+        if field_mo.group(1):
+            entry = _END
+        else:
+            name = _field_name(field_mo.group(2), encoding, errors)
+            entry = _NOT_A_TAG if name is None else (canonical_name(name),
+                                                    int(field_mo.group(3)))
+        # Non-ASCII names depend on the encoding.
+        if len(_tag_cache) < _TAG_CACHE_LIMIT and tag.isascii():
+            _tag_cache[tag] = entry
+    return entry
+
+def _shared_layout(names):
+    """Return (names, keep) for the field names of a record, as a tuple
+    without repeated names, and None, or the indexes of the fields to keep."""
+    layout = tuple(names)
+    shared = _layout_cache.get(layout)
+    if shared is None:
+        if len(set(layout)) == len(layout):
+            shared = (layout, None)
+        else:
+            # The last value wins, in the place of the first one.
+            last = {name: i for i, name in enumerate(layout)}
+            unique = tuple(last)
+            shared = (unique, [last[name] for name in unique])
+        if len(_layout_cache) < _LAYOUT_CACHE_LIMIT:
+            _layout_cache[layout] = shared
+    return shared
+
+class AdifRecord(Mapping):
+    """One QSO: a read-only mapping from upper-case field name to value.
+
+    start and end are the byte offsets of the record in the file,
+    from just after the previous record (or header) through its <eor>.
+    If a field occurs more than once in a record, the last one wins."""
+
+    __slots__ = ('_source', '_names', '_spans', 'start', 'end')
+
+    def __init__(self, source, names, spans, start, end):
+        self._source = source
+        self._names = names
+        self._spans = spans
+        self.start = start
+        self.end = end
+
+    def _index(self, name):
+        try:
+            return self._names.index(name) * 2
+        except ValueError:
+            raise KeyError(name) from None
+
+    def __getitem__(self, name):
+        i = self._index(name)
+        value_start = self.start + self._spans[i]
+        source = self._source
+        return str(source.buffer[value_start:value_start + self._spans[i + 1]],
+                   source.encoding, source.errors)
+
+    def get(self, name, default=None):
+        if name in self._names:
+            return self[name]
+        return default
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def raw(self, name):
+        """Return the undecoded bytes of a value."""
+        i = self._index(name)
+        value_start = self.start + self._spans[i]
+        return self._source.buffer[value_start:value_start + self._spans[i + 1]]
+
+    def span(self, name):
+        """Return (offset, length) of a value in the file."""
+        i = self._index(name)
+        return self.start + self._spans[i], self._spans[i + 1]
+
+    def __repr__(self):
+        return 'AdifRecord({!r})'.format(dict(self))
+
+class MappedAdif:
+    """A memory-mapped ADIF file.
+
+    header is the ADIF header dict, header_end the offset just after
+    <eoh> (0 if there is no header).  Iterate to get the AdifRecords.
+    The records refer to the map, so do not use them after close()."""
+
+    def __init__(self, filename, encoding='utf-8', errors='replace'):
+        self.filename = filename
+        self.encoding = encoding
+        self.errors = errors
+        with open(filename, 'rb') as adif_file:
+            try:
+                self.buffer = mmap.mmap(adif_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped.
+                self.buffer = b''
+        self.header = {}
+        self.header_end = 0
+        self._read_header()
+
+    def _read_header(self):
+        buffer = self.buffer
+        if not buffer or buffer[0:1] == b'<':
+            return
+        cursor = 0
+        while True:
+            field_mo = _header_field_re.search(buffer, cursor)
+            if not field_mo:
+                raise AdifHeaderWithoutEOH()
+            if field_mo.group(1):
+                self.header_end = field_mo.end(0)
+                return
+            name = _field_name(field_mo.group(2), self.encoding, self.errors)
+            if name is None:
+                cursor = field_mo.start(0) + 1
+                continue
+            value_start = field_mo.end(0)
+            value_end = value_start + int(field_mo.group(3))
+            self.header[name.upper()] = str(
+                buffer[value_start:value_end], self.encoding, self.errors)
+            cursor = value_end
+
+    def size(self):
+        """Return the size of the file in bytes."""
+        return len(self.buffer)
+
+    def __iter__(self):
+        return self.records(self.header_end, len(self.buffer))
+
+    def records(self, start, end):
+        """Yield the records that start at or after offset start
+        and whose <eor> ends by offset end."""
+        buffer = self.buffer
+        search = _field_re.search
+        lookup = _tag_cache.get
+        names = []
+        spans = []
+        record_start = cursor = start
+        field_mo = search(buffer, cursor, end)
+        while field_mo:
+            entry = lookup(field_mo.group(0)) or _lookup_tag(field_mo, self.encoding, self.errors)
+            if entry is _END:
+                cursor = field_mo.end(0)
+                layout, keep = _shared_layout(names)
+                if keep is not None:
+                    spans = [spans[i * 2 + half] for i in keep for half in (0, 1)]
+                yield AdifRecord(self, layout, array('I', spans), record_start, cursor)
+                names.clear()
+                spans.clear()
+                record_start = cursor
+            elif entry is _NOT_A_TAG:
+                cursor = field_mo.start(0) + 1
+            else:
+                name, length = entry
+                value_start = field_mo.end(0)
+                names.append(name)
+                spans.append(value_start - record_start)
+                spans.append(length)
+                cursor = value_start + length
+            field_mo = search(buffer, cursor, end)
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def iter_mapped_records(filename, encoding='utf-8', errors='replace'):
+    """Yield the AdifRecords of a file, using a memory map."""
+    return iter(MappedAdif(filename, encoding, errors))
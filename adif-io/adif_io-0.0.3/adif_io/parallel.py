@@ -0,0 +1,116 @@
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Parallel parsing of one big ADIF file.
+
+# The file is split into byte ranges that end just after an <eor>, and
+# each range is parsed by a worker process with its own memory map of
+# the file (so the pages are shared, not copied).  Each worker calls a
+# function on the AdifRecords of its range and sends back only what
+# that function returns, e.g. tuples of key fields or columnar batches,
+# never pickled dicts of all the fields.  The results are returned in
+# file order.
+
+# An <eor> inside a value (<notes:20>the <eor> marker ...) must not be
+# taken as a split point.  A candidate <eor> is only used if no field
+# tag in the max_value_length bytes before it has a value that covers
+# it.  As a second check, every range but the last must end exactly at
+# the end of its last record; if not, the whole file is parsed serially
+# instead, so the results are always the same as a serial parse.
+
+import os
+import re
+
+from .mapped import MappedAdif
+
+DEFAULT_MAX_VALUE_LENGTH = 1 << 20
+
+_eor_re = re.compile(rb'<eor>', re.IGNORECASE)
+_tag_re = re.compile(rb'<([\w\x80-\xff]+):(\d+)(?::[^>]+)?>')
+
+def _covered(buffer, position, max_value_length):
+    """Return True if a field tag before position has a value that
+    includes position (looking back max_value_length bytes)."""
+    lower = max(0, position - max_value_length)
+    # Try every '<', not just non-overlapping matches, in case one
+    # "tag" inside a value hides the start of a real one.
+    cursor = buffer.rfind(b'<', lower, position)
+    while cursor >= 0:
+        tag_mo = _tag_re.match(buffer, cursor, position)
+        if tag_mo and tag_mo.end(0) <= position < tag_mo.end(0) + int(tag_mo.group(2)):
+            return True
+        cursor = buffer.rfind(b'<', lower, cursor)
+    return False
+
+def split_points(adif, parts, max_value_length=DEFAULT_MAX_VALUE_LENGTH):
+    """Return the offsets that split the records of a MappedAdif into
+    about parts ranges, each starting just after an <eor>."""
+    buffer = adif.buffer
+    start = adif.header_end
+    end = len(buffer)
+    points = [start]
+    for i in range(1, parts):
+        target = max(points[-1], start + (end - start) * i // parts)
+        eor_mo = _eor_re.search(buffer, target)
+        while eor_mo and _covered(buffer, eor_mo.start(0), max_value_length):
+            eor_mo = _eor_re.search(buffer, eor_mo.end(0))
+        if not eor_mo:
+            break
+        if eor_mo.end(0) > points[-1]:
+            points.append(eor_mo.end(0))
+    points.append(end)
+    return points
+
+# State of a worker process
+_worker_adif = None
+
+def _init_worker(filename, encoding, errors):
+    global _worker_adif
+    _worker_adif = MappedAdif(filename, encoding, errors)
+
+def _run(func, adif, start, end):
+    """Call func(adif, records) on the records of a range.
+    Return (result, offset just after the last record)."""
+    last = [start]
+    def records():
+        for record in adif.records(start, end):
+            last[0] = record.end
+            yield record
+    result = func(adif, records())
+    return result, last[0]
+
+def _run_in_worker(func, start, end):
+    return _run(func, _worker_adif, start, end)
+
+def parallel_map(adif, func, jobs=None, max_value_length=DEFAULT_MAX_VALUE_LENGTH):
+    """Call func(adif, records) for ranges of the records of a MappedAdif
+    in up to jobs worker processes; return the results in file order.
+
+    func must be a module-level function (so it can be pickled) that
+    uses up all of records, an iterator of the AdifRecords of its range
+    of the worker's own MappedAdif of the same file."""
+    jobs = jobs or os.cpu_count() or 1
+    points = split_points(adif, jobs * 4, max_value_length)
+    if jobs > 1 and len(points) > 2:
+        # Imported here: multiprocessing is slow to import.
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(jobs, initializer=_init_worker,
+                                 initargs=(adif.filename, adif.encoding, adif.errors)) as executor:
+            ranges = list(zip(points, points[1:]))
+            futures = [executor.submit(_run_in_worker, func, start, end) for start, end in ranges]
+            done = [future.result() for future in futures]
+        if all(last == end for (result, last), (start, end) in zip(done[:-1], ranges)):
+            return [result for result, last in done]
+    # One range, or a split point was inside a value after all.
+    return [_run(func, adif, adif.header_end, len(adif.buffer))[0]]
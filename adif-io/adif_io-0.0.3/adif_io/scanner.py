@@ -0,0 +1,295 @@
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Scanners for read_from_string().
+
+# Each scanner takes the whole ADIF text and returns [qsos, header],
+# and they all return the same thing for the same text:
+#
+#    search     the original parser: one regular expression search from
+#               Python for each field, and another one for the header
+#    finditer   one re.finditer() pass over the tags; it is only started
+#               again after a value that has a '<' in it (a value is
+#               taken by its length, so a tag-like thing inside it is
+#               not a tag)
+#    find       a hand-written scanner: str.find('<') and str.find('>')
+#               and a dict lookup of the text between them
+#
+# The finditer and find scanners look up each distinct tag (e.g.
+# "CALL:5") once and keep its field name and value length.  Field names
+# are upper-cased through canonical_name(), so the CALL of every QSO is
+# the same interned string, not a new one per QSO.
+
+import re
+import sys
+
+from . import AdifHeaderWithoutEOH
+
+# Field names to intern up front (ADIF 3.1 and LotW ones that are common).
+FIELD_NAMES = (
+    'ADIF_VER', 'PROGRAMID', 'PROGRAMVERSION', 'CREATED_TIMESTAMP',
+    'CALL', 'BAND', 'BAND_RX', 'MODE', 'SUBMODE', 'FREQ', 'FREQ_RX',
+    'QSO_DATE', 'TIME_ON', 'QSO_DATE_OFF', 'TIME_OFF',
+    'QSL_RCVD', 'QSL_SENT', 'QSLRDATE', 'QSLSDATE', 'QSL_RCVD_VIA', 'QSL_SENT_VIA',
+    'LOTW_QSL_RCVD', 'LOTW_QSL_SENT', 'LOTW_QSLRDATE', 'LOTW_QSLSDATE',
+    'EQSL_QSL_RCVD', 'EQSL_QSL_SENT', 'EQSL_QSLRDATE', 'EQSL_QSLSDATE',
+    'CLUBLOG_QSO_UPLOAD_DATE', 'CLUBLOG_QSO_UPLOAD_STATUS',
+    'STATION_CALLSIGN', 'OPERATOR', 'OWNER_CALLSIGN',
+    'GRIDSQUARE', 'MY_GRIDSQUARE', 'DXCC', 'MY_DXCC', 'COUNTRY', 'MY_COUNTRY',
+    'STATE', 'MY_STATE', 'CNTY', 'MY_CNTY', 'CONT', 'PFX',
+    'CQZ', 'ITUZ', 'MY_CQ_ZONE', 'MY_ITU_ZONE', 'IOTA', 'MY_IOTA',
+    'RST_SENT', 'RST_RCVD', 'TX_PWR', 'RX_PWR', 'NAME', 'QTH', 'COMMENT', 'NOTES',
+    'PROP_MODE', 'SAT_NAME', 'SAT_MODE', 'CONTEST_ID', 'SRX', 'STX',
+    'SRX_STRING', 'STX_STRING',
+    'APP_LOTW_OWNCALL', 'APP_LOTW_RXQSO', 'APP_LOTW_RXQSL', 'APP_LOTW_MODEGROUP',
+    'APP_LOTW_QSO_TIMESTAMP', 'APP_LOTW_LASTQSORX', 'APP_LOTW_LASTQSL',
+    'APP_LOTW_NUMREC', 'APP_LOTW_DXCC_ENTITY_STATUS', 'APP_LOTW_CREDIT_GRANTED',
+)
+
+# Spelling in the file -> canonical (upper-case, interned) field name.
+# Do not let a strange file grow this or the tag caches without limit.
+_names = {}
+_NAMES_LIMIT = 10000
+for _name in FIELD_NAMES:
+    _name = sys.intern(_name)
+    _names[_name] = _name
+    _names[_name.lower()] = _name
+del _name
+
+def canonical_name(name):
+    """Return the upper-case field name, the same string object each time."""
+    canonical = _names.get(name)
+    if canonical is None:
+        canonical = sys.intern(name.upper())
+        if len(_names) < _NAMES_LIMIT:
+            _names[name] = canonical
+    return canonical
+
+#### search: the original parser
+
+_header_field_re = re.compile(r'<((eoh)|(\w+)\:(\d+)(\:[^>]+)?)>', re.IGNORECASE)
+_field_re = re.compile(r'<((eor)|(\w+)\:(\d+)(\:[^>]+)?)>', re.IGNORECASE)
+
+def scan_search(adif_string):
+    # The ADIF file header keys and values, if any.
+    adif_headers = {}
+
+    qsos = []
+    cursor = 0
+    if adif_string[0] != '<':
+        # Input has ADIF header. Read all header fields.
+        eoh_found = False
+        while(not eoh_found):
+            header_field_mo = _header_field_re.search(adif_string, cursor)
+            if header_field_mo:
+                if header_field_mo.group(2):
+                    eoh_found = True
+                    cursor = header_field_mo.end(0)
+                else:
+                    field = header_field_mo.group(3).upper()
+                    value_start = header_field_mo.end(0)
+                    value_end = value_start + int(header_field_mo.group(4))
+                    value = adif_string[value_start:value_end]
+                    adif_headers[field] = value
+                    cursor = value_end
+            else:
+                raise AdifHeaderWithoutEOH()
+
+    qso = {}
+    field_mo = _field_re.search(adif_string, cursor)
+    while(field_mo):
+        if field_mo.group(2):
+            # <eor> found:
+            qsos.append(qso)
+            qso = {}
+            cursor = field_mo.end(0)
+        else:
+            # Field found:
+            field = field_mo.group(3).upper()
+            value_start = field_mo.end(0)
+            value_end = value_start + int(field_mo.group(4))
+            value = adif_string[value_start:value_end]
+            qso[field] = value
+            cursor = value_end
+        field_mo = _field_re.search(adif_string, cursor)
+
+    return [qsos, adif_headers]
+
+#### finditer
+
+_header_tag_re = re.compile(r'<(?:(eoh)|(\w+):(\d+)(?::[^>]+)?)>', re.IGNORECASE)
+_tag_re = re.compile(r'<(?:(eor)|(\w+):(\d+)(?::[^>]+)?)>', re.IGNORECASE)
+
+# Whole tag (e.g. '<CALL:5>') -> (field name, value length), or _END for
+# <eor> or <eoh> (each regular expression matches only one of them).
+_END = object()
+_match_tags = {}
+_TAG_CACHE_LIMIT = 10000
+
+def _match_tag(tag_mo):
+    tag = tag_mo.group(0)
+    entry = _match_tags.get(tag)
+    if entry is None:
+        if tag_mo.group(1):
+            entry = _END
+        else:
+            entry = (canonical_name(tag_mo.group(2)), int(tag_mo.group(3)))
+        if len(_match_tags) < _TAG_CACHE_LIMIT:
+            _match_tags[tag] = entry
+    return entry
+
+def _finditer_header(adif_string, header):
+    """Read the header fields into header; return where the records start."""
+    cursor = 0
+    while True:
+        for tag_mo in _header_tag_re.finditer(adif_string, cursor):
+            entry = _match_tags.get(tag_mo.group(0)) or _match_tag(tag_mo)
+            if entry is _END:
+                return tag_mo.end(0)
+            name, length = entry
+            value_start = tag_mo.end(0)
+            cursor = value_start + length
+            value = adif_string[value_start:cursor]
+            header[name] = value
+            if '<' in value:
+                # Look for the next tag after the value, not in it.
+                break
+        else:
+            raise AdifHeaderWithoutEOH()
+
+def scan_finditer(adif_string):
+    header = {}
+    cursor = 0
+    if adif_string[0] != '<':
+        cursor = _finditer_header(adif_string, header)
+    qsos = []
+    qso = {}
+    tags = _match_tags
+    while True:
+        for tag_mo in _tag_re.finditer(adif_string, cursor):
+            entry = tags.get(tag_mo.group(0)) or _match_tag(tag_mo)
+            if entry is _END:
+                qsos.append(qso)
+                qso = {}
+                continue
+            name, length = entry
+            value_start = tag_mo.end(0)
+            cursor = value_start + length
+            value = adif_string[value_start:cursor]
+            qso[name] = value
+            if '<' in value:
+                break
+        else:
+            return [qsos, header]
+
+#### find
+
+# Text between '<' and '>' (e.g. 'CALL:5') -> (field name, value length),
+# _EOR, _EOH, or _NOT_A_TAG.
+_EOR = object()
+_EOH = object()
+_NOT_A_TAG = object()
+_find_tags = {}
+
+def _is_word(text):
+    # What \w+ matches: letters, digits, and underscores.
+    return text.isalnum() or (text != '' and text.replace('_', 'A').isalnum())
+
+def _find_tag(text):
+    entry = _find_tags.get(text)
+    if entry is None:
+        lower = text.lower() if len(text) == 3 else None
+        if lower == 'eor':
+            entry = _EOR
+        elif lower == 'eoh':
+            entry = _EOH
+        else:
+            name, colon, rest = text.partition(':')
+            length, colon, data_type = rest.partition(':')
+            if _is_word(name) and length.isdecimal() and (data_type or not colon):
+                entry = (canonical_name(name), int(length))
+            else:
+                entry = _NOT_A_TAG
+        if len(_find_tags) < _TAG_CACHE_LIMIT:
+            _find_tags[text] = entry
+    return entry
+
+def _find_header(adif_string, header):
+    """Read the header fields into header; return where the records start."""
+    find = adif_string.find
+    cursor = 0
+    while True:
+        less = find('<', cursor)
+        greater = find('>', less + 1) if less >= 0 else -1
+        if greater < 0:
+            raise AdifHeaderWithoutEOH()
+        text = adif_string[less + 1:greater]
+        entry = _find_tags.get(text) or _find_tag(text)
+        if entry is _EOH:
+            return greater + 1
+        if entry.__class__ is tuple:
+            name, length = entry
+            cursor = greater + 1 + length
+            header[name] = adif_string[greater + 1:cursor]
+        else:
+            # Not a tag (or <eor>); a tag may start after this '<'.
+            cursor = less + 1
+
+def scan_find(adif_string):
+    header = {}
+    cursor = 0
+    if adif_string[0] != '<':
+        cursor = _find_header(adif_string, header)
+    qsos = []
+    qso = {}
+    find = adif_string.find
+    tags = _find_tags
+    while True:
+        less = find('<', cursor)
+        if less < 0:
+            break
+        greater = find('>', less + 1)
+        if greater < 0:
+            break
+        text = adif_string[less + 1:greater]
+        entry = tags.get(text) or _find_tag(text)
+        if entry.__class__ is tuple:
+            name, length = entry
+            cursor = greater + 1 + length
+            qso[name] = adif_string[greater + 1:cursor]
+        elif entry is _EOR:
+            qsos.append(qso)
+            qso = {}
+            cursor = greater + 1
+        else:
+            cursor = less + 1
+    return [qsos, header]
+
+####
+
+SCANNERS = {
+    'search': scan_search,
+    'finditer': scan_finditer,
+    'find': scan_find,
+}
+DEFAULT_SCANNER = 'find'
+
+def scan(adif_string, scanner=None):
+    """Return [qsos, header] of ADIF text, with the named scanner."""
+    try:
+        function = SCANNERS[scanner or DEFAULT_SCANNER]
+    except KeyError:
+        raise ValueError('unknown scanner {!r}; the scanners are {}'.format(
+            scanner, ', '.join(SCANNERS))) from None
+    return function(adif_string)
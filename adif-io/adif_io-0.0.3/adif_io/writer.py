@@ -0,0 +1,181 @@
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Buffered ADIF (.adi) output.
+
+# An AdifWriter writes to a file name or a binary stream through one
+# large buffer.  Each record is built as bytes with a single join, and
+# the length of each value is its length in bytes once encoded.
+# Each field goes on its own line, so the output is easy to diff.
+
+# copy_from() copies a byte range of an input file as it is, with
+# os.copy_file_range() or os.sendfile() where the OS allows it.
+
+import os
+
+from .mapped import AdifRecord
+
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+# Copies smaller than this just go through the buffer.
+_SMALL_COPY = 1 << 16
+
+END_OF_HEADER = b'<EOH>\n'
+END_OF_RECORD = b'<EOR>\n'
+
+class AdifWriter:
+    """Write ADIF text, header fields and records.
+
+    target is a file name (the file is created) or a binary stream
+    (e.g. sys.stdout.buffer, which is flushed but not closed)."""
+
+    def __init__(self, target, buffer_size=DEFAULT_BUFFER_SIZE, encoding='utf-8'):
+        if isinstance(target, (str, bytes, os.PathLike)):
+            self._stream = open(target, 'wb')
+            self._must_close = True
+        else:
+            self._stream = target
+            self._must_close = False
+        self._buffer = bytearray()
+        self._buffer_size = buffer_size
+        self._encoding = encoding
+        self._tag_cache = {}
+
+    def _tag(self, name, data_type=None):
+        """Return b'<NAME:', or (b'<NAME:', b':T>') with a data type."""
+        key = (name, data_type)
+        tag = self._tag_cache.get(key)
+        if tag is None:
+            tag = ('<%s:' % name).encode('ascii')
+            if data_type:
+                tag = (tag, (':%s>' % data_type).encode('ascii'))
+            self._tag_cache[key] = tag
+        return tag
+
+    def _field(self, name, data, data_type=None):
+        tag = self._tag(name, data_type)
+        if data_type:
+            return b'%b%d%b%b\n' % (tag[0], len(data), tag[1], data)
+        return b'%b%d>%b\n' % (tag, len(data), data)
+
+    def _fields(self, record):
+        """Return the fields of a record (a mapping) as a list of bytes."""
+        if isinstance(record, AdifRecord):
+            # Copy the raw bytes; nothing to decode and encode again.
+            return [self._field(name, record.raw(name)) for name in record]
+        encoding = self._encoding
+        return [self._field(name, value.encode(encoding))
+                for name, value in record.items()]
+
+    def _write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def write_text(self, text):
+        """Write a line of free text (e.g. before the header)."""
+        self._write(text.encode(self._encoding) + b'\n')
+
+    def write_field(self, name, value, data_type=None):
+        """Write one field, e.g. a header field."""
+        self._write(self._field(name, value.encode(self._encoding), data_type))
+
+    def write_header(self, header, first=(), ignore=()):
+        """Write the header fields and <EOH>.
+
+        The fields named in first are written first, then all others
+        except those named in ignore, each group in the order of header."""
+        fields = [self._field(name, value.encode(self._encoding))
+                  for name, value in header.items() if name in first]
+        fields.extend(self._field(name, value.encode(self._encoding))
+                      for name, value in header.items()
+                      if not (name in first) and not (name in ignore))
+        fields.append(END_OF_HEADER)
+        self._write(b''.join(fields))
+
+    def write_record(self, record, extra=None):
+        """Write a record (a mapping of field names to values) and <EOR>.
+        The fields of the mapping extra, if any, are written at the end
+        of the record, replacing fields of the same name."""
+        if extra:
+            record = {name: value for name, value in record.items() if not (name in extra)}
+            record.update(extra)
+        fields = self._fields(record)
+        fields.insert(0, b'\n')
+        fields.append(END_OF_RECORD)
+        self._write(b''.join(fields))
+
+    def write_bytes(self, data):
+        """Write bytes as they are (e.g. copied from an input file)."""
+        self._write(data)
+
+    def copy_from(self, source, start, end):
+        """Write bytes start:end of source, an open binary file, as they are."""
+        if end - start < _SMALL_COPY:
+            source.seek(start)
+            self._write(source.read(end - start))
+            return
+        self.flush()
+        try:
+            start = _copy_range(source.fileno(), self._stream.fileno(), start, end)
+        except (OSError, ValueError, AttributeError):
+            # io.UnsupportedOperation (no fileno) or the OS cannot do it here.
+            pass
+        source.seek(start)
+        while start < end:
+            data = source.read(min(end - start, self._buffer_size))
+            if not data:
+                raise EOFError('{} ends before offset {}'.format(source, end))
+            self._stream.write(data)
+            start += len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._stream.write(self._buffer)
+            self._buffer.clear()
+        self._stream.flush()
+
+    def close(self):
+        self.flush()
+        if self._must_close:
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _copy_range(src, dst, start, end):
+    """Copy bytes start:end of file descriptor src to dst in the kernel.
+    Return the offset copied up to, which is end unless the OS gave up."""
+    for copy in (_copy_file_range, _sendfile):
+        try:
+            while start < end:
+                n = copy(src, dst, start, end - start)
+                if n == 0:
+                    break
+                start += n
+            if start >= end:
+                break
+        except (OSError, AttributeError):
+            # Not on this OS or for these files; try the next way.
+            continue
+    return start
+
+def _copy_file_range(src, dst, start, count):
+    return os.copy_file_range(src, dst, count, start)
+
+def _sendfile(src, dst, start, count):
+    return os.sendfile(dst, src, start, count)
@@ -0,0 +1,135 @@
+# conformance.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Check that every adif_io.read_from_string() scanner returns the same
+# QSOs and header as the original one ('search').
+#
+# USAGE (in the top directory, with PYTHONPATH set as in set-env.sh):
+#
+#    python3 -m benchmarks.conformance [--random 2000] [--records 2000]
+#
+# The inputs are the tricky cases below, a synthetic LotW report (see
+# generate.py), and random cuts and splices of both.  If a scanner
+# raises an exception, the original one must raise the same type.
+# It prints one line per difference, and exits with 1 if there are any.
+
+import argparse
+import io
+import random
+import sys
+
+import adif_io
+
+from . import generate
+
+REFERENCE = 'search'
+
+TRICKY = [
+    # No header
+    '<CALL:5>W1AKI<BAND:3>20M<eor>',
+    # Header, lower and mixed case tags, data types
+    'header\n<adif_ver:5>3.1.0<eoh>\n<call:5>W1AKI<Band:3>20M<FREQ:6:N>14.074<EoR>',
+    # <eor> and <eoh> inside values
+    'x<PROGRAMID:9>a <eoh> b<EOH><NOTES:12>a <eor> b <x<CALL:2>K1<EOR>',
+    '<NOTES:20>in <CALL:3>ABC value<CALL:2>K1<EOR>',
+    # A tag-like value that would swallow the next tag if not skipped
+    '<NOTES:5>a<b:1<CALL:2>K1<EOR>',
+    '<NOTES:6>a<b:1:<CALL:2>K1<EOR>',
+    '<NOTES:1><<CALL:2>K1<eor>',
+    # Not tags
+    '<CALL :2>K1<CALL:2:>K2<CALL:>K3<:2>K4<CALL:2x>K5<CALL:2>K6<EOR>',
+    '<<<CALL:2>K1<>eor><eor>',
+    '<EOR:0><CALL:2>K1<EOR><eoh>',
+    # Duplicate fields: the last one wins
+    '<CALL:2>K1<CALL:2>K2<EOR>',
+    # Zero length, long length, value cut off by the end
+    '<CALL:0><BAND:3>20M<EOR><NOTES:99>cut off',
+    '<CALL:2>K1<EOR><CALL:2>K2',
+    '<CALL:2>K1<EOR><CALL',
+    '<CALL:2>K1<EOR><',
+    # Underscores, digits, and non-ASCII in names, lengths and values
+    '<APP_LoTW_OWNCALL:5>W1AKI<_:1>x<USERDEF1:3>abc<NAME:4>Jörg<ÄNDERN:1>x<EOR>',
+    '<CALL:٢>K1<EOR>',
+    # Header without <eoh>
+    'header <CALL:2>K1<EOR>',
+    'header',
+    # Header with <eor> and a field named EOH
+    'h <eor><eoh:0><PROGRAMID:4>LoTW<EOH><CALL:2>K1<EOR>',
+    # Empty records, text between records
+    '<eor><eor> text <CALL:2>K1 text <EOR>\n\n',
+]
+
+def read(text, scanner):
+    """Return ('ok', [qsos, header]) or ('error', exception type)."""
+    try:
+        return ('ok', adif_io.read_from_string(text, scanner))
+    except Exception as exception:
+        return ('error', type(exception))
+
+def check(text, label, problems):
+    expected = read(text, REFERENCE)
+    for scanner in adif_io.SCANNERS:
+        if scanner == REFERENCE:
+            continue
+        got = read(text, scanner)
+        if got != expected:
+            problems.append(label)
+            print('{}: scanner {} differs on {}: {!r}'.format(
+                'conformance', scanner, label, text[:200]))
+
+def splice(rng, texts):
+    """Return random pieces of texts put together."""
+    pieces = []
+    for i in range(rng.randint(1, 4)):
+        text = rng.choice(texts)
+        start = rng.randrange(len(text) + 1)
+        pieces.append(text[start:start + rng.randint(0, 200)])
+    return ''.join(pieces)
+
+def parseArgs(argv):
+    argParser = argparse.ArgumentParser(
+        prog='benchmarks.conformance',
+        description='Check that every adif_io scanner returns the same as the original one.')
+    argParser.add_argument('--random', type=int, default=2000,
+        help='number of random inputs (default: %(default)s)')
+    argParser.add_argument('--records', type=int, default=2000,
+        help='records in the synthetic report (default: %(default)s)')
+    argParser.add_argument('--seed', type=int, default=generate.DEFAULT_SEED,
+        help='random seed (default: %(default)s)')
+    return argParser.parse_args(argv)
+
+def main(argv):
+    args = parseArgs(argv)
+    problems = []
+    for n, text in enumerate(TRICKY):
+        check(text, 'tricky input {}'.format(n), problems)
+
+    synthetic = io.StringIO()
+    generate.generate(synthetic, args.records, seed=args.seed, eor_rate=0.1)
+    synthetic = synthetic.getvalue()
+    check(synthetic, 'the synthetic report', problems)
+
+    rng = random.Random(args.seed)
+    texts = TRICKY + [synthetic[:20000]]
+    for n in range(args.random):
+        check(splice(rng, texts), 'random input {}'.format(n), problems)
+
+    print('{} inputs, {} scanners, {} differences'.format(
+        len(TRICKY) + 1 + args.random, len(adif_io.SCANNERS), len(problems)))
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
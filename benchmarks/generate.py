@@ -0,0 +1,217 @@
+# generate.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Generate a synthetic LotW report (.adi) for benchmarks.
+#
+# USAGE:
+#
+#    python3 -m benchmarks.generate [options] 100000 >synthetic.adi
+#
+# The QSOs are random, but look like what finddups1.py is for: some of
+# them have a duplicate later in the file (a copy that was uploaded
+# again by another program), with the FREQ cut to fewer decimal places
+# and padded with zeros (13.729 -> 13.700), the TIME_ON with or without
+# seconds, and QSL_RCVD N.  See the options for the other knobs.
+# The same seed gives the same file.
+
+import argparse
+import heapq
+import random
+import sys
+
+DEFAULT_SEED = 1
+DEFAULT_DUP_RATE = 0.05
+# FREQ decimal places of the original QSOs: places:weight,...
+DEFAULT_FREQ_MIX = '3:0.6,4:0.3,6:0.1'
+DEFAULT_SECONDS_RATE = 0.5
+DEFAULT_QSL_RATE = 0.3
+DEFAULT_EOR_RATE = 0.01
+DEFAULT_CALLS = 20000
+DEFAULT_BUSY_CALLS = 5
+DEFAULT_BUSY_SHARE = 0.1
+# A duplicate comes up to this many records after the original.
+DEFAULT_DUP_DISTANCE = 1000
+
+# (BAND, lowest kHz, highest kHz)
+BANDS = [
+    ('160M', 1800, 2000), ('80M', 3500, 4000), ('40M', 7000, 7300),
+    ('30M', 10100, 10150), ('20M', 14000, 14350), ('17M', 18068, 18168),
+    ('15M', 21000, 21450), ('12M', 24890, 24990), ('10M', 28000, 29700),
+    ('6M', 50000, 54000),
+]
+MODES = ['FT8', 'FT8', 'FT8', 'CW', 'CW', 'SSB', 'FT4', 'RTTY']
+
+NOTES_WITH_EOR = 'The <eor> marker is data here, not the end of the record.'
+
+_HZ_PER_MHZ = 1000000
+_FIRST_DAY = 16436     # 2015-01-01 in days since 1970-01-01
+_DAYS = 3653           # through 2024
+
+def parseMix(text):
+    """Return ([places, ...], [weight, ...]) for 'places:weight,...'."""
+    places = []
+    weights = []
+    for item in text.split(','):
+        place, weight = item.split(':')
+        places.append(int(place))
+        weights.append(float(weight))
+    return places, weights
+
+def formatFreq(hz, places):
+    """Return hz in MHz, truncated to places decimal places."""
+    mhz, hz = divmod(hz, _HZ_PER_MHZ)
+    if places == 0:
+        return str(mhz)
+    return '{}.{}'.format(mhz, '{:06d}'.format(hz)[:places])
+
+def randomCall(rng):
+    prefix = rng.choice(['K', 'W', 'N', 'AA', 'KD', 'VE', 'G', 'DL', 'JA', 'VK', 'EA', 'I'])
+    suffix = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for i in range(rng.randint(1, 3)))
+    return '{}{}{}'.format(prefix, rng.randint(0, 9), suffix)
+
+def field(name, value):
+    # The generated values are ASCII, so characters are bytes.
+    return '<{}:{}>{}\n'.format(name, len(value), value)
+
+def dateText(day):
+    # Days since 1970-01-01 to YYYYMMDD (civil_from_days, H. Hinnant).
+    z = day + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    d = doy - (153 * mp + 2) // 5 + 1
+    m = mp + 3 if mp < 10 else mp - 9
+    y = yoe + era * 400 + (m <= 2)
+    return '{:04d}{:02d}{:02d}'.format(y, m, d)
+
+def record(qso, freq, time_on, qsl, notes=None):
+    call, day, band, mode, station = qso
+    fields = [
+        field('APP_LoTW_OWNCALL', station),
+        field('STATION_CALLSIGN', station),
+        field('CALL', call),
+        field('BAND', band),
+        field('FREQ', freq),
+        field('MODE', mode),
+        field('QSO_DATE', dateText(day)),
+        field('TIME_ON', time_on),
+        field('QSL_RCVD', qsl),
+    ]
+    if notes:
+        fields.append(field('NOTES', notes))
+    fields.append('<eor>\n\n')
+    return ''.join(fields)
+
+def generate(out, records, seed=DEFAULT_SEED, dup_rate=DEFAULT_DUP_RATE,
+             freq_mix=DEFAULT_FREQ_MIX, seconds_rate=DEFAULT_SECONDS_RATE,
+             qsl_rate=DEFAULT_QSL_RATE, eor_rate=DEFAULT_EOR_RATE,
+             calls=DEFAULT_CALLS, busy_calls=DEFAULT_BUSY_CALLS,
+             busy_share=DEFAULT_BUSY_SHARE, time_jitter=0,
+             dup_distance=DEFAULT_DUP_DISTANCE):
+    """Write a synthetic LotW report of records records to the text stream out.
+    Return the number of duplicates written."""
+    rng = random.Random(seed)
+    places, weights = parseMix(freq_mix)
+    pool = list(dict.fromkeys(randomCall(rng) for i in range(calls)))
+    busy = pool[:busy_calls]
+    stations = ['W1AKI', 'W1AKI/P']
+
+    out.write('ARRL Logbook of the World Status Report\n')
+    out.write('Generated by benchmarks/generate.py for finddups1.py\n')
+    out.write(field('PROGRAMID', 'LoTW'))
+    out.write(field('APP_LoTW_LASTQSORX', '2024-12-31 23:59:59'))
+    out.write(field('APP_LoTW_NUMREC', str(records)))
+    out.write('<eoh>\n\n')
+
+    pending = []        # heap of (record number, text) of duplicates to write
+    chunk = []
+    dups = 0
+    for n in range(records):
+        if pending and pending[0][0] <= n:
+            chunk.append(heapq.heappop(pending)[1])
+            dups += 1
+        else:
+            call = rng.choice(busy) if busy and rng.random() < busy_share else rng.choice(pool)
+            band, low, high = rng.choice(BANDS)
+            qso = (call, _FIRST_DAY + rng.randrange(_DAYS), band, rng.choice(MODES),
+                   rng.choice(stations))
+            hz = rng.randrange(low * 1000, high * 1000)
+            seconds = rng.randrange(86400)
+            hhmm = '{:02d}{:02d}'.format(seconds // 3600, seconds // 60 % 60)
+            hhmmss = hhmm + '{:02d}'.format(seconds % 60)
+            notes = NOTES_WITH_EOR if rng.random() < eor_rate else None
+            freq = formatFreq(hz, rng.choices(places, weights)[0])
+            time_on = hhmmss if rng.random() < seconds_rate else hhmm
+            chunk.append(record(qso, freq, time_on, 'Y' if rng.random() < qsl_rate else 'N', notes))
+            if rng.random() < dup_rate:
+                # The same QSO from another program: FREQ cut to 100 kHz
+                # but with 3 places, maybe another time format or time.
+                dup_seconds = seconds
+                if time_jitter:
+                    dup_seconds = min(86399, max(0, seconds + rng.randint(-time_jitter, time_jitter) * 60))
+                dup_time = '{:02d}{:02d}'.format(dup_seconds // 3600, dup_seconds // 60 % 60)
+                if rng.random() < seconds_rate:
+                    dup_time += '{:02d}'.format(dup_seconds % 60)
+                dup_freq = formatFreq(hz // 100000 * 100000, 1) + '00'
+                heapq.heappush(pending, (n + rng.randint(1, dup_distance),
+                                         record(qso, dup_freq, dup_time, 'N', notes)))
+        if len(chunk) >= 10000:
+            out.write(''.join(chunk))
+            chunk.clear()
+    out.write(''.join(chunk))
+    return dups
+
+def parseArgs(argv):
+    argParser = argparse.ArgumentParser(
+        prog='benchmarks.generate',
+        description='Write a synthetic LotW report for benchmarks to stdout.')
+    argParser.add_argument('records', type=int, help='number of records')
+    argParser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+        help='random seed (default: %(default)s)')
+    argParser.add_argument('--dup-rate', type=float, default=DEFAULT_DUP_RATE,
+        help='fraction of QSOs that get a duplicate (default: %(default)s)')
+    argParser.add_argument('--freq-mix', default=DEFAULT_FREQ_MIX,
+        help='FREQ decimal places of the original QSOs, as places:weight,... '
+             '(default: %(default)s)')
+    argParser.add_argument('--seconds-rate', type=float, default=DEFAULT_SECONDS_RATE,
+        help='fraction of TIME_ONs with seconds, HHMMSS (default: %(default)s)')
+    argParser.add_argument('--qsl-rate', type=float, default=DEFAULT_QSL_RATE,
+        help='fraction of original QSOs with QSL_RCVD Y (default: %(default)s)')
+    argParser.add_argument('--eor-rate', type=float, default=DEFAULT_EOR_RATE,
+        help='fraction of QSOs with <eor> in their NOTES (default: %(default)s)')
+    argParser.add_argument('--calls', type=int, default=DEFAULT_CALLS,
+        help='number of different callsigns (default: %(default)s)')
+    argParser.add_argument('--busy-calls', type=int, default=DEFAULT_BUSY_CALLS,
+        help='number of very busy callsigns (default: %(default)s)')
+    argParser.add_argument('--busy-share', type=float, default=DEFAULT_BUSY_SHARE,
+        help='fraction of QSOs with the busy callsigns (default: %(default)s)')
+    argParser.add_argument('--time-jitter', type=int, default=0, metavar='MINUTES',
+        help='move the TIME_ON of duplicates by up to this many minutes '
+             '(default: %(default)s)')
+    return argParser.parse_args(argv)
+
+def main(argv):
+    args = parseArgs(argv)
+    generate(sys.stdout, args.records, seed=args.seed, dup_rate=args.dup_rate,
+             freq_mix=args.freq_mix, seconds_rate=args.seconds_rate,
+             qsl_rate=args.qsl_rate, eor_rate=args.eor_rate, calls=args.calls,
+             busy_calls=args.busy_calls, busy_share=args.busy_share,
+             time_jitter=args.time_jitter)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
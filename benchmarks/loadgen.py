@@ -0,0 +1,173 @@
+# loadgen.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Measure the lookup latency of finddups1.py --serve (see server.py).
+#
+# USAGE (in the top directory, with PYTHONPATH set as in set-env.sh):
+#
+#    python3 -m benchmarks.loadgen report.adi [--requests 20000] [--clients 1]
+#    python3 -m benchmarks.loadgen report.adi --connect /tmp/finddups.sock
+#
+# Without --connect, it starts a server for report.adi on a Unix socket
+# in a temporary directory, waits until it answers, and stops it at the
+# end.  Each client sends one lookup at a time and waits for the answer;
+# the lookups are QSOs of the report (about half of them with TIME_ON
+# moved, so some do not match) and QSOs with a CALL that is not in it.
+# It prints the number of requests per second and the latency
+# percentiles in microseconds.
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import adif_io
+import qsotable
+
+DEFAULT_REQUESTS = 20000
+DEFAULT_SEED = 1
+PERCENTILES = [50, 90, 99, 99.9]
+
+# Seconds to wait for a server to start answering
+STARTUP_TIMEOUT = 300
+
+_TAGS = [qsotable.TAG_CALL, qsotable.TAG_QSO_DATE, qsotable.TAG_TIME_ON, qsotable.TAG_BAND,
+         qsotable.TAG_RX_BAND, qsotable.TAG_MODE]
+
+def sampleQsos(fileName, count, seed, missRate):
+    """Return count lookup QSOs from the report (see above)."""
+    records = [{tag: record.get(tag, '') for tag in _TAGS}
+               for record in adif_io.MappedAdif(fileName)]
+    rng = random.Random(seed)
+    qsos = []
+    for i in range(count):
+        qso = dict(rng.choice(records))
+        if rng.random() < missRate:
+            if rng.random() < 0.5:
+                qso[qsotable.TAG_CALL] = 'X{}X'.format(rng.randrange(1000000))
+            else:
+                qso[qsotable.TAG_TIME_ON] = '{:02d}{:02d}'.format(rng.randrange(24),
+                                                                  rng.randrange(60))
+        qsos.append(qso)
+    return qsos
+
+async def _open(address):
+    if address[0] == 'unix':
+        return await asyncio.open_unix_connection(address[1])
+    return await asyncio.open_connection(address[1], address[2])
+
+async def _client(address, requests, latencies, answers):
+    reader, writer = await _open(address)
+    for request in requests:
+        started = time.perf_counter_ns()
+        writer.write(request)
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter_ns() - started)
+        if response.get('dup'):
+            answers['dup'] += 1
+    writer.close()
+
+async def _run(address, qsos, clients):
+    requests = [json.dumps({'op': 'lookup', 'qso': qso}).encode('utf-8') + b'\n'
+                for qso in qsos]
+    # Keep the garbage collector's pauses out of the measurements.
+    gc.collect()
+    gc.freeze()
+    latencies = []
+    answers = {'dup': 0}
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(address, requests[n::clients], latencies, answers)
+                           for n in range(clients)))
+    return time.perf_counter() - started, latencies, answers
+
+async def _waitForServer(address, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while True:
+        try:
+            reader, writer = await _open(address)
+            writer.close()
+            return
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError('the server did not start')
+            await asyncio.sleep(0.05)
+
+def percentile(values, p):
+    """Return the p-th percentile of sorted values (nearest rank)."""
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+def report(seconds, latencies, answers, out=sys.stdout):
+    latencies = sorted(latencies)
+    print('requests: {}  ({:.0f}/s, {} dup)'.format(len(latencies), len(latencies) / seconds,
+                                                   answers['dup']), file=out)
+    for p in PERCENTILES:
+        print('p{:<6} {:10.1f} us'.format(p, percentile(latencies, p) / 1000), file=out)
+    print('max     {:10.1f} us'.format(latencies[-1] / 1000), file=out)
+
+def parseArgs(argv):
+    argParser = argparse.ArgumentParser(
+        prog='benchmarks.loadgen',
+        description='Measure the lookup latency of finddups1.py --serve.')
+    argParser.add_argument('fileName', metavar='report.adi',
+        help='the LotW report to take the lookups from (and to serve)')
+    argParser.add_argument('--connect', metavar='ADDRESS',
+        help='a server that is already running (a socket path, PORT or HOST:PORT)')
+    argParser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS,
+        help='number of lookups (default: %(default)s)')
+    argParser.add_argument('--clients', type=int, default=1,
+        help='connections, each with one lookup at a time (default: %(default)s)')
+    argParser.add_argument('--miss-rate', type=float, default=0.5, dest='missRate',
+        help='part of the lookups changed so they may not match (default: %(default)s)')
+    argParser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+        help='random seed (default: %(default)s)')
+    argParser.add_argument('--server-args', default='', dest='serverArgs',
+        help='more finddups1.py options for the server, e.g. "--tolerance lotw"')
+    return argParser.parse_args(argv)
+
+def main(argv):
+    args = parseArgs(argv)
+    # Imported here: server.py imports asyncio.
+    import server
+    qsos = sampleQsos(args.fileName, args.requests, args.seed, args.missRate)
+    if args.connect:
+        address = server.parseAddress(args.connect)
+        seconds, latencies, answers = asyncio.run(_run(address, qsos, args.clients))
+        report(seconds, latencies, answers)
+        return 0
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory(prefix='finddups-') as directory:
+        address = ('unix', os.path.join(directory, 'finddups.sock'))
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(top, 'finddups1.py'), args.fileName,
+             '--serve', address[1], '--reload', '0'] + args.serverArgs.split())
+        try:
+            asyncio.run(_waitForServer(address, process))
+            seconds, latencies, answers = asyncio.run(_run(address, qsos, args.clients))
+        finally:
+            process.terminate()
+            process.wait()
+    report(seconds, latencies, answers)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
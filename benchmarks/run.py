@@ -0,0 +1,341 @@
+# run.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Time finddups1.py and adif_io on synthetic LotW reports.
+#
+# USAGE (in the top directory, with PYTHONPATH set as in set-env.sh):
+#
+#    python3 -m benchmarks.run [--sizes 10k,100k,1M,5M] [--output results.json]
+#    python3 -m benchmarks.run --compare old.json new.json
+#
+# For each size, a report is generated (see generate.py; it is kept in
+# --data-dir and used again next time), and each group of phases below
+# is run in a new process, so that the peak RSS is only its own:
+#
+#    read_from_string   adif_io.read_from_string() of the whole file
+#                       (with the --scanner scanner)
+#    parse_stream       a QsoTable of adif_io.iter_records()
+#    parse_mmap         a QsoTable of an adif_io.MappedAdif (what finddups1 does),
+#    grind              then finddups1.grind(),
+#    output             the munged header and the QSOs to keep,
+#    passthrough        and the --passthrough output (both to /dev/null)
+#    parse_adx          a QsoTable of adif_io.iter_records() of an ADX copy
+#                       of the report (made once with adif_io.AdxWriter,
+#                       and kept next to it),
+#    write_adx          then all of its QSOs as ADX (to /dev/null)
+#
+# For each phase, the seconds, records per second, and the peak RSS of
+# the process so far are printed and saved as JSON along with the git
+# commit, so the results of two commits can be compared.  With
+# --allocations, the peak of the Python allocations of each phase is
+# traced too (tracemalloc; slower, so the seconds are not comparable).
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows
+    resource = None
+
+from . import generate
+
+DEFAULT_SIZES = '10k,100k,1M,5M'
+
+PHASE_GROUPS = [
+    ['read_from_string'],
+    ['parse_stream'],
+    ['parse_mmap', 'grind', 'output', 'passthrough'],
+    ['parse_adx', 'write_adx'],
+]
+PHASES = [phase for group in PHASE_GROUPS for phase in group]
+
+_MULTIPLIERS = {'k': 1000, 'K': 1000, 'm': 1000000, 'M': 1000000}
+
+def parseSize(text):
+    """Return the number of records for e.g. '100k' or '5M'."""
+    if text[-1:] in _MULTIPLIERS:
+        return int(float(text[:-1]) * _MULTIPLIERS[text[-1]])
+    return int(text)
+
+def peakRss():
+    """Return the peak resident set size of this process in bytes, or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives KiB, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def dataFile(dataDir, records, seed):
+    """Return the name of the synthetic report of records records,
+    generating it first if needed."""
+    fileName = os.path.join(dataDir, 'synthetic-{}-seed{}.adi'.format(records, seed))
+    if not os.path.exists(fileName):
+        os.makedirs(dataDir, exist_ok=True)
+        print('# generating {} ...'.format(fileName), file=sys.stderr)
+        temporary = fileName + '.tmp'
+        with open(temporary, 'w', encoding='ascii', newline='') as out:
+            generate.generate(out, records, seed=seed)
+        os.replace(temporary, fileName)
+    return fileName
+
+def adxFileName(fileName):
+    return os.path.splitext(fileName)[0] + '.adx'
+
+def adxFile(fileName):
+    """Return the name of the ADX copy of a report, writing it first if needed."""
+    adxName = adxFileName(fileName)
+    if not os.path.exists(adxName):
+        import adif_io
+        print('# writing {} ...'.format(adxName), file=sys.stderr)
+        temporary = adxName + '.tmp'
+        with adif_io.open_stream(fileName) as stream, adif_io.AdxWriter(temporary) as writer:
+            writer.write_header(stream.read_header())
+            for qso in stream:
+                writer.write_record(qso)
+        os.replace(temporary, adxName)
+    return adxName
+
+#### One group of phases, in its own process (--measure)
+
+def measure(fileName, phases, window, allocations, scanner=None):
+    """Run the phases on a file; return a list of result dicts."""
+    import adif_io
+    import qsotable
+    # Nothing should print to stdout (the results go there); throw away any that does.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        import finddups1
+        state = {}
+
+        def read_from_string():
+            with open(fileName, encoding='utf-8', errors='replace') as adif_file:
+                text = adif_file.read()
+            qsos, header = adif_io.read_from_string(text, scanner)
+            return len(qsos)
+
+        def parse_stream():
+            table = qsotable.QsoTable.fromRecords(adif_io.iter_records(fileName))
+            return len(table)
+
+        def parse_mmap():
+            adif = adif_io.MappedAdif(fileName)
+            state['header'] = adif.header
+            state['table'] = qsotable.QsoTable.fromRecords(adif, source=adif)
+            return len(state['table'])
+
+        def grind():
+            state['qso_map'] = finddups1.grind(state['table'], window)
+            return len(state['table'])
+
+        def output():
+            with adif_io.AdifWriter(os.devnull) as writer:
+                header = dict(state['header'])
+                finddups1.mungHeader(fileName, header, writer)
+                finddups1.printHeader(header, writer)
+                finddups1.printAllQSOs(state['qso_map'], state['table'], writer)
+            return len(state['table'])
+
+        def passthrough():
+            with adif_io.AdifWriter(os.devnull) as writer:
+                finddups1.emitMungedLog(fileName, state['qso_map'], state['table'], writer)
+            return len(state['table'])
+
+        def parse_adx():
+            with adif_io.open_stream(adxFileName(fileName)) as stream:
+                state['header'] = stream.read_header()
+                state['table'] = qsotable.QsoTable.fromRecords(stream)
+            return len(state['table'])
+
+        def write_adx():
+            table = state['table']
+            with adif_io.AdxWriter(os.devnull) as writer:
+                writer.write_header(state['header'])
+                for row in range(len(table)):
+                    writer.write_record(table.record(row))
+            return len(table)
+
+        functions = {function.__name__: function for function in (
+            read_from_string, parse_stream, parse_mmap, grind, output, passthrough,
+            parse_adx, write_adx)}
+        results = []
+        for phase in phases:
+            if allocations:
+                tracemalloc.start()
+            start = time.perf_counter()
+            records = functions[phase]()
+            seconds = time.perf_counter() - start
+            result = {
+                'phase': phase,
+                'records': records,
+                'seconds': seconds,
+                'records_per_second': records / seconds if seconds else None,
+                'peak_rss': peakRss(),
+            }
+            if allocations:
+                result['peak_allocated'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            results.append(result)
+    return results
+
+####
+
+def runSize(fileName, records, phases, tolerance, allocations, scanner=None):
+    """Run each group of phases on a file in a new process; return the results."""
+    results = []
+    for group in PHASE_GROUPS:
+        wanted = [phase for phase in group if phase in phases]
+        if not wanted:
+            continue
+        if wanted != group[:len(wanted)]:
+            # The later phases of a group need the earlier ones.
+            wanted = group[:group.index(wanted[-1]) + 1]
+        command = [sys.executable, '-m', 'benchmarks.run', '--measure', fileName,
+                   '--phases', ','.join(wanted), '--tolerance', tolerance]
+        if allocations:
+            command.append('--allocations')
+        if scanner:
+            command.extend(['--scanner', scanner])
+        done = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True)
+        for result in json.loads(done.stdout):
+            if result['phase'] in phases:
+                result['file_records'] = records
+                results.append(result)
+    return results
+
+def printResults(results):
+    print('{:>10} {:<18} {:>10} {:>12} {:>10} {:>11}'.format(
+        'records', 'phase', 'seconds', 'records/s', 'peak MiB', 'alloc MiB'))
+    for result in results:
+        rss = result['peak_rss']
+        allocated = result.get('peak_allocated')
+        print('{:>10} {:<18} {:>10.3f} {:>12.0f} {:>10} {:>11}'.format(
+            result['file_records'], result['phase'], result['seconds'],
+            result['records_per_second'] or 0,
+            '{:.1f}'.format(rss / (1 << 20)) if rss else '-',
+            '{:.1f}'.format(allocated / (1 << 20)) if allocated is not None else '-'))
+
+def compare(oldName, newName):
+    """Print the seconds and peak RSS of two saved runs side by side."""
+    with open(oldName) as oldFile, open(newName) as newFile:
+        old = json.load(oldFile)
+        new = json.load(newFile)
+    before = {(result['file_records'], result['phase']): result for result in old['results']}
+    print('{} ({}) -> {} ({})'.format(oldName, old.get('commit'), newName, new.get('commit')))
+    print('{:>10} {:<18} {:>10} {:>10} {:>7} {:>9}'.format(
+        'records', 'phase', 'old s', 'new s', 'ratio', 'RSS ratio'))
+    for result in new['results']:
+        was = before.get((result['file_records'], result['phase']))
+        if was is None:
+            continue
+        rss = (result['peak_rss'] / was['peak_rss']
+               if result['peak_rss'] and was['peak_rss'] else None)
+        print('{:>10} {:<18} {:>10.3f} {:>10.3f} {:>7.2f} {:>9}'.format(
+            result['file_records'], result['phase'], was['seconds'], result['seconds'],
+            result['seconds'] / was['seconds'] if was['seconds'] else 0,
+            '{:.2f}'.format(rss) if rss else '-'))
+
+def parseArgs(argv):
+    argParser = argparse.ArgumentParser(
+        prog='benchmarks.run',
+        description='Time finddups1.py and adif_io on synthetic LotW reports.')
+    argParser.add_argument('--sizes', default=DEFAULT_SIZES,
+        help='numbers of records, e.g. 10k,1M (default: %(default)s)')
+    argParser.add_argument('--phases', default=','.join(PHASES),
+        help='phases to run (default: %(default)s)')
+    argParser.add_argument('--tolerance', default='exact',
+        help='finddups1 --tolerance for grind (default: %(default)s)')
+    argParser.add_argument('--seed', type=int, default=generate.DEFAULT_SEED,
+        help='seed of the synthetic reports (default: %(default)s)')
+    argParser.add_argument('--scanner',
+        help='adif_io scanner for read_from_string (default: adif_io.DEFAULT_SCANNER)')
+    argParser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'finddups-benchmarks'),
+        help='where to keep the synthetic reports (default: %(default)s)')
+    argParser.add_argument('--allocations', action='store_true',
+        help='also trace the peak of Python allocations in each phase')
+    argParser.add_argument('-o', '--output', metavar='results.json',
+        help='where to save the results (default: benchmark-<commit>.json)')
+    argParser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+        help='compare two saved results instead of running')
+    argParser.add_argument('--measure', metavar='FILE', help=argparse.SUPPRESS)
+    args = argParser.parse_args(argv)
+    args.phases = args.phases.split(',')
+    for phase in args.phases:
+        if not (phase in PHASES):
+            argParser.error('unknown phase {}; the phases are {}'.format(phase, ', '.join(PHASES)))
+    return args
+
+def main(argv):
+    args = parseArgs(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+    import tolerance
+    window = tolerance.parseTolerance(args.tolerance)
+    if args.measure:
+        json.dump(measure(args.measure, args.phases, window, args.allocations, args.scanner),
+                  sys.stdout)
+        return
+
+    results = []
+    for size in args.sizes.split(','):
+        records = parseSize(size)
+        fileName = dataFile(args.data_dir, records, args.seed)
+        if 'parse_adx' in args.phases or 'write_adx' in args.phases:
+            adxFile(fileName)
+        results.extend(runSize(fileName, records, args.phases, args.tolerance, args.allocations,
+                               args.scanner))
+    printResults(results)
+
+    commit = gitCommit()
+    try:
+        import numpy
+        numpyVersion = numpy.__version__
+    except ImportError:
+        numpyVersion = None
+    saved = {
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': numpyVersion,
+        'tolerance': args.tolerance,
+        'scanner': args.scanner,
+        'seed': args.seed,
+        'results': results,
+    }
+    output = args.output or 'benchmark-{}.json'.format(commit or 'unknown')
+    with open(output, 'w') as outFile:
+        json.dump(saved, outFile, indent=1)
+    print('# saved {}'.format(output))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
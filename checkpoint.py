@@ -0,0 +1,227 @@
+# checkpoint.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# An on-disk checkpoint for re-running finddups1.py on a growing LotW report.
+#
+# The same LotW report is downloaded again and again.  Each time, the
+# records of the last download are still at the start of the file,
+# with the new ones after them; only the header is different
+# (APP_LOTW_LASTQSORX, APP_LOTW_NUMREC).  The checkpoint is a SQLite
+# file next to the input with:
+#
+#    meta      the matching policy, how many rows and bytes of records
+#              were parsed, and a fingerprint (hash) of those bytes
+#    strings   the interned CALL, BAND and MODE strings of the QsoTable
+#    columns   the other columns of the QsoTable, a chunk of rows per run
+#    odd       the values that do not fit in the columns
+#    keys      the index key of every row (see finddups1.indexKey)
+#    groups    the groups of more than one QSO (the keep/dup decisions
+#              are in the flags column)
+#
+# Byte offsets are relative to the end of the header, so it does not
+# matter if the new header is longer or shorter.  If the records parsed
+# last time are not at the start of the file any more, or the policy is
+# not the same, the checkpoint does not fit and is rebuilt.
+
+from array import array
+import hashlib
+import os
+import sqlite3
+
+import qsotable
+
+# Change this when what is stored, or what it means, changes.
+CHECKPOINT_VERSION = 3
+
+CHECKPOINT_SUFFIX = '.finddups.sqlite'
+
+KEY_APP_LOTW_NUMREC = 'APP_LOTW_NUMREC'
+KEY_APP_LOTW_LASTQSORX = 'APP_LOTW_LASTQSORX'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS strings (interner TEXT, code INTEGER, string TEXT,
+                                    PRIMARY KEY (interner, code));
+CREATE TABLE IF NOT EXISTS columns (name TEXT, first INTEGER, data BLOB,
+                                    PRIMARY KEY (name, first));
+CREATE TABLE IF NOT EXISTS odd (row INTEGER, tag TEXT, value TEXT);
+CREATE TABLE IF NOT EXISTS keys (key TEXT, row INTEGER);
+CREATE INDEX IF NOT EXISTS keys_key ON keys (key);
+CREATE TABLE IF NOT EXISTS groups (first INTEGER PRIMARY KEY, key TEXT, rows BLOB);
+'''
+
+_INTERNERS = ('calls', 'bands', 'modes')
+# The columns that only get new rows; the flags of old rows can change,
+# so that column is saved whole each time.
+_CHUNKED_COLUMNS = ('call', 'band', 'rx_band', 'mode', 'mode_group', 'epoch',
+                    'freq_hz', 'freq_places', 'start', 'end')
+_FLAGS = 'flags'
+
+# SQLite limits the number of ? in a statement.
+_IN_BATCH = 500
+
+def checkpointFileName(fileName):
+    """Return the checkpoint file name for an input file: log.adi -> log.finddups.sqlite"""
+    return os.path.splitext(fileName)[0] + CHECKPOINT_SUFFIX
+
+def _fingerprint(adif, start, end, digest=None):
+    """Return a hash object updated with bytes start:end (relative to the
+    end of the header) of a MappedAdif."""
+    if digest is None:
+        digest = hashlib.blake2b(digest_size=16)
+    with memoryview(adif.buffer) as view:
+        with view[adif.header_end + start:adif.header_end + end] as part:
+            digest.update(part)
+    return digest
+
+class Checkpoint:
+    """The checkpoint of one input file."""
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self._db = sqlite3.connect(fileName)
+        self._db.executescript(_SCHEMA)
+        # Hash of the bytes loaded, to add the new bytes to in save().
+        self._digest = None
+        self._length = 0
+        self.meta = dict(self._db.execute('SELECT name, value FROM meta'))
+
+    def load(self, adif, policy):
+        """Return a QsoTable (with its flags) of the records of a MappedAdif
+        that were parsed last time, or None if the checkpoint does not fit."""
+        meta = self.meta
+        if meta.get('version') != CHECKPOINT_VERSION or meta.get('policy') != policy:
+            return None
+        rows = meta['rows']
+        length = meta['length']
+        # LotW reports only grow, so a smaller NUMREC means a different report.
+        numrec = adif.header.get(KEY_APP_LOTW_NUMREC, '')
+        if numrec.isdigit() and int(numrec) < rows:
+            return None
+        if adif.header_end + length > adif.size():
+            return None
+        digest = _fingerprint(adif, 0, length)
+        if digest.hexdigest() != meta['fingerprint']:
+            return None
+
+        table = qsotable.QsoTable(source=adif)
+        for name in _INTERNERS:
+            interner = getattr(table, name)
+            for (string,) in self._db.execute(
+                    'SELECT string FROM strings WHERE interner = ? ORDER BY code', (name,)):
+                interner.code(string)
+        for name in _CHUNKED_COLUMNS + (_FLAGS,):
+            column = getattr(table, name)
+            for (data,) in self._db.execute(
+                    'SELECT data FROM columns WHERE name = ? ORDER BY first', (name,)):
+                if name == _FLAGS:
+                    column.extend(data)
+                else:
+                    column.frombytes(data)
+        if adif.header_end:
+            base = adif.header_end
+            table.start = array('q', [offset + base for offset in table.start])
+            table.end = array('q', [offset + base for offset in table.end])
+        table.file = array('H', bytes(rows * table.file.itemsize))
+        for row, tag, value in self._db.execute('SELECT row, tag, value FROM odd'):
+            table._odd[(row, tag)] = value
+        if any(len(getattr(table, name)) != rows for name in _CHUNKED_COLUMNS + (_FLAGS,)):
+            return None
+        self._digest = digest
+        self._length = length
+        return table
+
+    def rowsWithKeys(self, keys):
+        """Return the set of the rows whose index key is one of keys."""
+        keys = list(keys)
+        rows = set()
+        for i in range(0, len(keys), _IN_BATCH):
+            batch = keys[i:i + _IN_BATCH]
+            rows.update(row for (row,) in self._db.execute(
+                'SELECT row FROM keys WHERE key IN ({})'.format(','.join('?' * len(batch))),
+                batch))
+        return rows
+
+    def groups(self):
+        """Yield (key, rows) for the saved groups of more than one QSO."""
+        for first, key, rows in self._db.execute('SELECT first, key, rows FROM groups'):
+            yield key, array('q', rows).tolist()
+
+    def save(self, table, adif, policy, first, keys, changed, groups):
+        """Save the rows of table from first on, with their index keys,
+        and the flags of all rows.  The groups with a key in changed are
+        replaced by groups, a list of (key, rows) of more than one row.
+        first = 0 starts the checkpoint over."""
+        db = self._db
+        header_end = adif.header_end
+        length = (table.end[-1] - header_end) if len(table) else 0
+        if first == 0:
+            digest = _fingerprint(adif, 0, length)
+        else:
+            digest = _fingerprint(adif, self._length, length, self._digest.copy())
+        with db:
+            if first == 0:
+                for name in ('meta', 'strings', 'columns', 'odd', 'keys', 'groups'):
+                    db.execute('DELETE FROM {}'.format(name))
+            for name in _INTERNERS:
+                strings = getattr(table, name).strings
+                (count,) = db.execute('SELECT COUNT(*) FROM strings WHERE interner = ?',
+                                      (name,)).fetchone()
+                db.executemany('INSERT INTO strings VALUES (?, ?, ?)',
+                               ((name, code, strings[code]) for code in range(count, len(strings))))
+            if first < len(table):
+                for name in _CHUNKED_COLUMNS:
+                    column = getattr(table, name)[first:]
+                    if name in ('start', 'end'):
+                        column = array('q', [offset - header_end for offset in column])
+                    db.execute('INSERT INTO columns VALUES (?, ?, ?)',
+                               (name, first, column.tobytes()))
+            db.execute('DELETE FROM columns WHERE name = ?', (_FLAGS,))
+            db.execute('INSERT INTO columns VALUES (?, 0, ?)', (_FLAGS, bytes(table.flags)))
+            db.executemany('INSERT INTO odd VALUES (?, ?, ?)',
+                           ((row, tag, value) for (row, tag), value in table._odd.items()
+                            if row >= first))
+            db.executemany('INSERT INTO keys VALUES (?, ?)',
+                           zip(keys, range(first, len(table))))
+            changed = list(changed)
+            for i in range(0, len(changed), _IN_BATCH):
+                batch = changed[i:i + _IN_BATCH]
+                db.execute('DELETE FROM groups WHERE key IN ({})'.format(','.join('?' * len(batch))),
+                           batch)
+            db.executemany('INSERT INTO groups VALUES (?, ?, ?)',
+                           ((rows[0], key, array('q', rows).tobytes()) for key, rows in groups))
+            meta = {
+                'version': CHECKPOINT_VERSION,
+                'policy': policy,
+                'rows': len(table),
+                'length': length,
+                'fingerprint': digest.hexdigest(),
+                KEY_APP_LOTW_NUMREC: adif.header.get(KEY_APP_LOTW_NUMREC),
+                KEY_APP_LOTW_LASTQSORX: adif.header.get(KEY_APP_LOTW_LASTQSORX),
+            }
+            db.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', meta.items())
+        self.meta = meta
+        self._digest = digest
+        self._length = length
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
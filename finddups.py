@@ -0,0 +1,287 @@
+# finddups.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Finding duplicate QSOs, as a library.
+#
+#    import adif_io, finddups
+#    qsos, header = adif_io.read_from_file('lotwreport.adi')
+#    for group in finddups.find_duplicates(qsos, finddups.Policy(tolerance='lotw')):
+#        print(group.key, group.keep, group.dups, group.reason)
+#
+# find_duplicates() prints nothing and writes no files; it returns the
+# groups of matching QSOs (see LOTW MATCHING in finddups1.py), which
+# ones to keep, which are the duplicates, and why.  finddups1.py is the
+# command line program around the same grind().  Diagnostics go to the
+# 'finddups' logger, at DEBUG and INFO level.
+#
+# Importing this module is quick: NumPy (packedkeys.py, tolerance.py,
+# adif_io) and multiprocessing (adif_io.parallel_map) are only imported
+# when they are used.
+
+import logging
+
+import adif_io
+import keepers
+# The keep rules, which are also the reasons why a QSO was kept
+from keepers import (KEEP_RULES, REASON_FREQ, REASON_POSITION, REASON_QSL_RCVD,
+                     REASON_SECONDS)
+import modegroups
+import packedkeys
+import qsotable
+from stats import Stats
+import tolerance
+from tolerance import TOLERANCE_EXACT, parseTolerance
+
+log = logging.getLogger('finddups')
+
+# This character is not found anywhere in my .adi files so
+# use it to separate fields when printing a key for a QSO.
+SEP = '|'
+
+def exactKey(table, row, modeGroups=False):
+    """Return the key of a row for exact matching: CALL, QSO_DATE,
+    TIME_ON to the minute, BAND, RX_BAND, and MODE (or mode group)."""
+    epoch = table.epoch[row]
+    if epoch == qsotable.NO_TIME:
+        # Not a valid time: match the strings as they are.
+        # ADIF requires the time to be either 4 or 6 digits.
+        # NOTE: TRUNCATE TIME (clublog doesn't round the time, does it?) TO 4 DIGITS to find matches.
+        # If the time is 6 digits, truncate it to 4 digits.
+        # Otherwise the time was already 4 digits.
+        time_on = table.value(row, qsotable.TAG_TIME_ON)
+        if len(time_on) == 6:
+            time_on = time_on[:4]
+        when = (table.value(row, qsotable.TAG_QSO_DATE), time_on)
+    else:
+        # Same minute is the same as same YYYYMMDD and HHMM.
+        when = epoch // 60
+    return (table.call[row], when, table.band[row], table.rx_band[row],
+            packedkeys.modeKey(table, row, modeGroups))
+
+def keyText(table, row, full_time=False, modeGroups=False):
+    """Return the key of a row as text, for printing
+    (with modeGroups, the mode group, if MODE has one, for MODE)."""
+    time_on = table.value(row, qsotable.TAG_TIME_ON)
+    if not full_time and len(time_on) == 6:
+        time_on = time_on[:4]
+    mode = table.value(row, qsotable.TAG_MODE)
+    if modeGroups and table.mode_group[row]:
+        mode = modegroups.MODE_GROUP_NAMES[table.mode_group[row]]
+    return SEP.join([table.value(row, qsotable.TAG_CALL), table.value(row, qsotable.TAG_QSO_DATE),
+                     time_on, table.value(row, qsotable.TAG_BAND),
+                     table.value(row, qsotable.TAG_RX_BAND), mode])
+
+def groupText(table, matches, window):
+    """Return the key of a group of rows as text, for printing.
+    A group matched with a time tolerance is named after its earliest QSO."""
+    if window and table.epoch[matches[0]] != qsotable.NO_TIME:
+        earliest = min(matches, key=lambda row: (table.epoch[row], row))
+        return keyText(table, earliest, full_time=True)
+    return keyText(table, matches[0])
+
+# window is the time tolerance in seconds (see tolerance.py).
+# 0 means only QSOs with the same key, with TIME_ON truncated to HHMM, match.
+# Otherwise QSOs match if they have the same CALL, BAND, RX_BAND, and MODE
+# and start within window seconds of each other: a group starts with
+# its earliest QSO and holds the QSOs within window seconds of it (see
+# tolerance.clusters()), so a pair across the start of a group is not
+# reported (tolerance.matchingPairs() finds every pair).  QSOs with a
+# bad date or time only match exactly.
+# modeGroups (--mode-groups) matches modes in the same LotW mode group.
+
+def bucketKey(table, row, modeGroups=False):
+    """Return the key of a row for matching with a time tolerance:
+    CALL, BAND, RX_BAND, and MODE (or mode group)."""
+    return (table.call[row], table.band[row], table.rx_band[row],
+            packedkeys.modeKey(table, row, modeGroups))
+
+def rowKeys(table, window=0, rows=None, modeGroups=False):
+    """Return a list of the keys of the rows (all of them if rows is None):
+    the exact key, or with a time tolerance, the bucket key of the rows
+    with a good time (groupRows() splits a bucket by time).  They are
+    packed ints (see packedkeys.py), but for the rows with a bad time,
+    whose keys are exactKey() tuples."""
+    if rows is None:
+        rows = range(len(table))
+    keys, bad = packedkeys.packKeys(table, rows, not window, modeGroups)
+    for i in bad:
+        keys[i] = exactKey(table, rows[i], modeGroups)
+    return keys
+
+def groupRows(table, window=0, rows=None, keys=None, modeGroups=False):
+    """Return qso_map: key -> list of the rows (in file order) that match.
+    The keys are in the order of their first row.
+    rows, if given, are the rows to group (in file order), not all of them,
+    and keys, if given, are their keys from rowKeys()."""
+    if rows is None:
+        rows = range(len(table))
+    if keys is None:
+        keys = rowKeys(table, window, rows, modeGroups)
+    qso_map = {}
+    buckets = {}
+    epochs = table.epoch
+    for row, key in zip(rows, keys):
+        if window and epochs[row] != qsotable.NO_TIME:
+            if not (key in buckets):
+                buckets[key] = []
+            buckets[key].append( (epochs[row], row) )
+            continue
+        if not (key in qso_map):
+            qso_map[key] = []
+        qso_map[key].append(row)
+
+    if window:
+        groups = [(matches[0], key, matches) for key, matches in qso_map.items()]
+        for key, bucket in buckets.items():
+            bucket.sort()
+            for cluster in tolerance.clusters(bucket, window):
+                matches = sorted(row for epoch, row in cluster)
+                groups.append( (matches[0], (key, cluster[0][0]), matches) )
+        groups.sort(key=lambda group: group[0])
+        qso_map = {key: matches for first, key, matches in groups}
+    return qso_map
+
+# grind() sets FLAG_KEEP on the rows of the table to keep,
+# and FLAG_DUP on the other rows of groups with more than one row;
+# keepRules (see keepers.py) choose the QSO to keep.
+# It logs each group at DEBUG level (-vv), and the groups with
+# duplicates at INFO level (-v); when those levels are off, the loops
+# do not format anything.
+
+def grind(table, window=0, rows=None, stats=None, modeGroups=False, keepRules=KEEP_RULES):
+    if stats is None:
+        stats = Stats(enabled=False)
+    with stats.phase('keys'):
+        keys = rowKeys(table, window, rows, modeGroups)
+    with stats.phase('grouping'):
+        qso_map = groupRows(table, window, rows, keys, modeGroups)
+    del keys
+    flags = table.flags
+    debug = log.isEnabledFor(logging.DEBUG)
+    info = log.isEnabledFor(logging.INFO)
+
+    ####
+    ####TODO: also QSL_SENT & submitted for awards/credits?
+    ####
+    with stats.phase('decision'):
+        keepers.selectKeepers(table, qso_map.values(), keepRules, rows)
+
+    if debug or info:
+        if debug:
+            log.debug('---- grinding ----')
+        for key, matches in qso_map.items():
+            n = len(matches)
+            if not debug and n == 1:
+                continue
+            text = groupText(table, matches, window)
+            if debug:
+                log.debug('## key =  %s', text)
+                for row in matches:
+                    log.debug('##     qso freq =  %s  time on =  %s  keep =  %s',
+                              table.value(row, qsotable.TAG_FREQ),
+                              table.value(row, qsotable.TAG_TIME_ON),
+                              bool(flags[row] & qsotable.FLAG_KEEP))
+            if n > 1:
+                log.info('%s  %s  n matching QSOs =  %s  kept by %s',
+                         '####' if n == 2 else '########', text, n,
+                         keepers.groupReason(table, matches))
+
+    if debug:
+        log.debug('---- checking ----')
+        for key, matches in qso_map.items():
+            n_keep = 0
+            log.debug('## key =  %s', groupText(table, matches, window))
+            # Ignore the QSOs with no duplicates
+            n = len(matches)
+            if n > 1:
+                for row in matches:
+                    keep = bool(flags[row] & qsotable.FLAG_KEEP)
+                    if (keep):
+                        n_keep += 1
+                        log.debug('##     qso freq =  %s  time on =  %s  keep =  %s',
+                                  table.value(row, qsotable.TAG_FREQ),
+                                  table.value(row, qsotable.TAG_TIME_ON), keep)
+            log.debug('##   n =  %s n_keep =  %s', n, n_keep)
+
+    ####
+    #### look for keys that might match
+    #### count number of  kept and un-kept qsos for each key
+    #### add PROP_MODE=IRL to the ones that aren't being kept
+    ####
+
+    return qso_map
+
+
+#### LIBRARY API ####
+
+class Policy:
+    """How QSOs match: tolerance is a --tolerance preset name ('exact',
+    'clublog', 'lotw') or a number of minutes, and mode_groups matches
+    modes in the same LotW mode group (see modegroups.py).  keep_rules
+    (REASON_*, see keepers.py) choose the QSO of a group to keep."""
+
+    def __init__(self, tolerance=TOLERANCE_EXACT, mode_groups=False, keep_rules=KEEP_RULES):
+        self.tolerance = tolerance
+        self.window = parseTolerance(tolerance)
+        self.mode_groups = mode_groups
+        self.keep_rules = keepers.checkRules(keep_rules)
+
+    def __repr__(self):
+        return 'Policy(tolerance={!r}, mode_groups={!r}, keep_rules={!r})'.format(
+            self.tolerance, self.mode_groups, self.keep_rules)
+
+class DuplicateGroup:
+    """QSOs that match: key (as text, see keyText()), keep and dups (the
+    indexes of the QSOs in the records, in order), and reason (REASON_*)."""
+
+    __slots__ = ('key', 'keep', 'dups', 'reason')
+
+    def __init__(self, key, keep, dups, reason):
+        self.key = key
+        self.keep = keep
+        self.dups = dups
+        self.reason = reason
+
+    def __repr__(self):
+        return 'DuplicateGroup(key={!r}, keep={!r}, dups={!r}, reason={!r})'.format(
+            self.key, self.keep, self.dups, self.reason)
+
+def duplicateGroups(table, qso_map, window=0):
+    """Return a DuplicateGroup for each group of qso_map (from grind())
+    with more than one row."""
+    flags = table.flags
+    groups = []
+    for matches in qso_map.values():
+        if len(matches) < 2:
+            continue
+        keep = [row for row in matches if flags[row] & qsotable.FLAG_KEEP]
+        dups = [row for row in matches if flags[row] & qsotable.FLAG_DUP]
+        groups.append(DuplicateGroup(groupText(table, matches, window), keep, dups,
+                                     keepers.groupReason(table, matches)))
+    return groups
+
+def find_duplicates(records, policy=None):
+    """Return a list of DuplicateGroup, in the order of their first QSO,
+    for the QSOs of records that have duplicates.  records are dicts or
+    adif_io.AdifRecords (a list, or an iterator), or an adif_io.MappedAdif;
+    the indexes in the groups are their positions in it."""
+    if policy is None:
+        policy = Policy()
+    source = records if isinstance(records, adif_io.MappedAdif) else None
+    table = qsotable.QsoTable.fromRecords(records, source)
+    qso_map = grind(table, policy.window, modeGroups=policy.mode_groups,
+                    keepRules=policy.keep_rules)
+    return duplicateGroups(table, qso_map, policy.window)
@@ -62,6 +62,9 @@ PROGRAM_VERSION = '0.1'
 # -or-
 # Execute set-env.sh to set PYTHONPATH to find a copy of it that's under this
 #    directory.
+# -or-
+# pip install . (in this directory) to install this program, finddups.py,
+#    and that copy of adif_io (see pyproject.toml).
 #
 # Python >= 3.7 guarantees that the dict class preserves key order
 #    which is a big aid to diffing the output against the input
@@ -69,7 +72,65 @@ PROGRAM_VERSION = '0.1'
 
 # USAGE:
 #
-# TBS
+#    python3 finddups1.py [options] lotwreport.adi >new.adi
+#    python3 finddups1.py [options] 'logs/*.adi'
+#
+#    With more than one file (or a wildcard), duplicates are found across
+#    all of the files, and the output for each file goes to a file next
+#    to it: logs/w1aki-2023.adi -> logs/w1aki-2023.dedup.adi
+#
+#    ADX (XML) files, log.adx, are read with --parser pipeline or stream
+#    (the default is pipeline), and their output goes to log.dedup.adx.
+#
+#    -o new.adi       write the ADIF output to new.adi instead of stdout
+#                     (-o new.adx writes ADX)
+#    --passthrough    copy the input as it is, except for PROP_MODE=IRL
+#                     on the duplicates
+#    --parser mmap    memory-map the file and decode only the tags we use
+#                     (the default)
+#    --parser stream  read the file in chunks with adif_io.iter_records()
+#    --parser pipeline  read, parse and write in separate threads with
+#                     bounded queues between them (see pipeline.py; --stats
+#                     shows how long each one waited).  The default for
+#                     .gz, .bz2 and .xz files, which are decompressed as
+#                     they are read, for .adx files, and for - (stdin)
+#    --tolerance T    match QSOs whose start times are within T of each other:
+#                     exact (the default; HHMM must be equal), clublog
+#                     (15 minutes), lotw (30 minutes), or a number of minutes
+#    --checkpoint     keep the QSOs, keys and decisions in lotwreport.finddups.sqlite;
+#                     next time, if the file starts with the same records,
+#                     only the new ones are parsed and matched
+#    --snapshot       keep the parsed QSOs in lotwreport.finddups.snap, and
+#                     load them from it (in milliseconds) instead of parsing
+#                     the file while it has not changed; with any options
+#    --max-memory SIZE  if the QSOs need more memory than SIZE (e.g. 2G),
+#                     split them by CALL into temporary files and find the
+#                     duplicates one part at a time; the output is the same
+#    --join mylog.adi compare the ADIF export of your logger with the LotW
+#                     report: the output is a copy of mylog.adi with
+#                     APP_FINDDUPS_LOTW set to DUP, CONFIRMED, UNCONFIRMED
+#                     or NONE on each QSO, and mylog.join.csv (--report)
+#                     has the same for each QSO; with --tolerance, a QSO
+#                     matches the LotW QSOs within the tolerance of it
+#    --mode-groups    also match QSOs whose modes are in the same LotW mode
+#                     group (CW, PHONE, DATA, IMAGE), e.g. SSB and FM
+#    --two-pass       read the input twice: first count the hashes of the
+#                     keys, then keep only the QSOs with a repeated key in
+#                     memory; the output is the same
+#    --serve ADDRESS  keep the QSOs in memory and answer "is this QSO a
+#                     duplicate?" requests on a Unix socket (a path) or a
+#                     localhost TCP port, re-reading the file when it
+#                     changes (every --reload SECONDS, 0 for never); see
+#                     server.py, and benchmarks/loadgen.py to measure it
+#    -j N, --jobs N   parse a big file in N processes (0 = one per CPU);
+#                     the output is the same as with -j 1 (the default).
+#                     With many files, parse N files at once, biggest
+#                     first (the default is one per CPU).
+#    --stats          report the time and peak memory of each phase (parse,
+#                     keys, grouping, decision, write) and counts of the
+#                     records, keys and group sizes, on stderr
+#    -v, -vv          log the groups with duplicates (-v), or every group
+#                     and QSO (-vv), on stderr; -q logs only errors
 
 # Reminders for myself:
 #    mo = re.search(string, cursor) # mo = match object, a common abbreviation
@@ -78,11 +139,31 @@ PROGRAM_VERSION = '0.1'
 #    MatchObject.group(n1, n2, ...) # tuple of paren groups in regex
 #    '<br/>'.join([f'{key}:: {value}' for key, value in d.items()])
 
-import fileinput, sys, string
-# import os
+import argparse, fileinput, sys, string
+from array import array
+import csv
+import glob
+import heapq
+import itertools
+import logging
+import os
 import adif_io
+import checkpoint
+from finddups import SEP, bucketKey, exactKey, grind, keyText
+import join
+import modegroups
+import partition
+import pipeline
+import prepass
+import qsotable
+import snapshot
+from stats import Stats
+import tolerance
 from datetime import datetime, timedelta, timezone
 
+# Diagnostics go to stderr; see -v and -q.
+log = logging.getLogger(PROGRAM_NAME)
+
 #### CLUBLOG MATCHING ####
 
 # https://clublog.freshdesk.com/support/solutions/articles/55757-log-matching
@@ -112,22 +193,28 @@ from datetime import datetime, timedelta, timezone
 #        must specify modes belonging to the same mode group
 #    for satellite QSOs, both QSO descriptions must specify the same satellite, and
 #        a propagation mode of SAT
+#
+# With --tolerance, the QSOs that match are grouped by their earliest
+# QSO: a group holds the QSOs within the tolerance of it, and the next
+# group starts with the first QSO after those.  So the QSOs of a group
+# all match each other, but two QSOs on either side of the start of a
+# group are not reported as a match even if they are within the
+# tolerance of each other (e.g. with lotw, QSOs at 0000, 0025 and 0050
+# make the groups [0000, 0025] and [0050]; see tolerance.py).
 #TODO Also:
 #    LoTW stores times to the second.
 #    Unrelated to matching, LoTW keeps frequencies to 4 decimal digits
 #        (0.0001 MHz, 0.1 kHz).
 
-# So the "key" for our hashmap is (see SEP below):
+# So the "key" for our hashmap is (printed with finddups.SEP):
 #    <CALL>|<QSO_DATE>|<TIME_ON>|<BAND>|<RX_BAND>|<MODE>
+# packed into one int (see packedkeys.py), with the mode group in place
+# of MODE with --mode-groups (see modegroups.py).
 ####TODO: only hhmm of time_on? for search only
 
 
 #### MANIFEST CONSTANTS ####
 
-# This character is not found anywhere in my .adi files so
-# use it to separate fields in a key for a QSO.
-SEP = '|'
-
 # ADIF tags are supposed to be case-insensitive!
 # For simplicity, we will only support the case that LoTW generates,
 # which is upper case except for *_LoTW_* tags (see below).
@@ -139,9 +226,7 @@ SEP = '|'
 #      https://stackoverflow.com/questions/3296499/case-insensitive-dictionary-search
 #      (and elsewhere, no doubt).
 
-# We use these End tag strings when writing the output.
-END_OF_RECORD = '<EOR>'
-END_OF_HEADER = '<EOH>'
+# (The End tag strings used when writing the output are in adif_io.AdifWriter.)
 
 # Header tags (dict keys) that we create instead of inherit from the input
 # (excluding USERDEFn because those dict keys are only referenced once)
@@ -161,6 +246,7 @@ KEY_MODE = 'MODE'
 # Other QSO_TAGS
 KEY_FREQ = 'FREQ'
 KEY_QSL_RCVD = 'QSL_RCVD'
+KEY_PROP_MODE = 'PROP_MODE'
 
 
 TAG_NAMES_IN_KEY = [KEY_CALL, KEY_QSO_DATE, KEY_TIME_ON, KEY_BAND, KEY_RX_BAND, KEY_MODE]
@@ -178,47 +264,32 @@ KEY_APP_FINDDUPS_KEEP = 'APP_FINDDUPS_KEEP'
 # disused (AFAIK) propagation mode, used in output to identify duplicates
 UNUSED_PROP_MODE = 'IRL'    # IRLP
 
-####TODO: matching mode groups with modes, or modes in the same group
-
 
 ####
 
-def printText(text):
-    """Print text (hopefully not starting with '<')
-    into ADIF file to indicate there is a header"""
-
-    print(text)
-
-def printTag(name, value):
-    """Print an ADIF tag"""
-    print('<%s:%d>%s' % (name, len(value), value))
+# All output goes through an adif_io.AdifWriter ("writer" below),
+# which buffers it and writes each record with a single join, or an
+# adif_io.AdxWriter, with the same methods, for an ADX output file.
 
-def printUserStringTag(name, value):
-    """Print a user-defined ADIF tag with a string value"""
-    print('<%s:%d:S>%s' % (name, len(value), value))
-
-def printEndTag(endTag):
-    """Print an ADIF End of Header or End of Record tag"""
-    print(endTag)
-
-def printQSO(qso):
-    print()
-    #####FIXME: ValueError: too many values to unpack (expected 2)
-    #for name, value in qso:
-    #    printTags(name, value)
-    printEndTag(END_OF_RECORD)
+def newWriter(output, adx=None):
+    """Return a writer to output, a file name or a binary stream: an
+    ADX one if adx, or by default, if output is the name of an ADX file."""
+    if adx is None:
+        adx = isinstance(output, str) and adif_io.is_adx(output)
+    return adif_io.AdxWriter(output) if adx else adif_io.AdifWriter(output)
 
 ####FIXME: do we print ones to keep, with more digits, or ones to ignore, or both?
 ####FIXME: ignore the QSOs with no duplicates either way
 
-def printAllQSOs(qso_map, qsos):
+def printAllQSOs(qso_map, table, writer, file=0):
+    # Only the QSOs from one input file (see table.file) go to each output.
     for key, matches in qso_map.items():
         #FIXME: MAKE IT AN OPTION TO IGNORE THEM IN QSOs TO KEEP!
         # Ignore the QSOs with no duplicates
         if len(matches) > 1:
-            for qso, keep in matches:
-                if keep:
-                    printQSO(qso)
+            for row in matches:
+                if table.flags[row] & qsotable.FLAG_KEEP and table.file[row] == file:
+                    writer.write_record(table.record(row))
 
 
 ####
@@ -238,13 +309,13 @@ def currentTimestamp():
 #TODO: Make adif_io save text from start of input and print it first in Step 1.
 
 
-def mungHeader(fileName, header):
+def mungHeader(fileName, header, writer):
 
     # Step 1: We need to put something into the output that
     # doesn't start with '<' to indicate there is a header
-    printText('Munged ADIF file to try to add PROPMODE {} to duplicates created by clublog'.format(UNUSED_PROP_MODE))
-    printText('(This text is necessary because an ADIF file header cannot start with a tag.)')
-    printText('Program written by Aron W1AKI but you are using it at your own risk!')
+    writer.write_text('Munged ADIF file to try to add PROP_MODE {} to duplicates created by clublog'.format(UNUSED_PROP_MODE))
+    writer.write_text('(This text is necessary because an ADIF file header cannot start with a tag.)')
+    writer.write_text('Program written by Aron W1AKI but you are using it at your own risk!')
 
     # Step 2: Move old header tags into USERDEFn tags
     # These keys are assumed to be in upper case; see printHeader.
@@ -260,7 +331,7 @@ def mungHeader(fileName, header):
     header[KEY_PROGRAM_VERSION] = PROGRAM_VERSION
     header[KEY_CREATED_TIMESTAMP] = currentTimestamp()
 
-def printHeader(header):
+def printHeader(header, writer):
     # Print the header tags.
     # (If the ADIF version was in the input, we will print it here.)
 
@@ -275,121 +346,397 @@ def printHeader(header):
 
     # Print tags that were in the original file and not modified above in their
     # original case.  Tags modified above are all in upper case
+    # (The writer also ends the header.)
 
-    for k in header:
-        if k in headerTagsToWriteFirst:
-            #DEBUG:print('#   {} in headerTagsToWriteFirst: {}'.format(k, k in headerTagsToWriteFirst));
-            printTag(k, header[k])
-    for k in header:
-        #DEBUG:print('#   {} in headerTagsToIgnore: {}'.format(k, k in headerTagsToIgnore));
-        #DEBUG:print('#   {} in headerTagsToWriteFirst: {}'.format(k, k in headerTagsToWriteFirst));
-        #DEBUG:print('#   {} not in either: {}'.format(k, not (k in headerTagsToWriteFirst) and not (k in headerTagsToIgnore)));
-        if not (k in headerTagsToWriteFirst) and not (k in headerTagsToIgnore):
-            printTag(k, header[k])
+    writer.write_header(header, first=headerTagsToWriteFirst, ignore=headerTagsToIgnore)
 
-    # End the header
-    printEndTag(END_OF_HEADER)
 
-####
+# The matching (the keys, groupRows() and grind()) is in finddups.py,
+# which can be used as a library without this command line program.
 
-def grind(qsos):
-    qso_map = {}
-
-    # Ensure that all keys are present in all QSOs.
-    # (We could use get(key, default) but mostly
-    # it would re-write the same value that's already there.)
-    for qso in qsos:
-        for tag in TAG_NAMES_IN_KEY:
-            if not tag in qso:
-                qso[tag]=''
-
-        # ADIF requires the time to be either 4 or 6 digits.
-        # NOTE: TRUNCATE TIME (clublog doesn't round the time, does it?) TO 4 DIGITS to find matches.
-        # If the time is 6 digits, truncate it to 4 digits.
-        # Otherwise the time was already 4 digits.
-        time_on = qso[KEY_TIME_ON]
-        if len(time_on) == 6:
-            time_on = time_on[:4]
-
-        key = (f'{qso[KEY_CALL]}{SEP}{qso[KEY_QSO_DATE]}{SEP}{time_on}{SEP}'
-               f'{qso[KEY_BAND]}{SEP}{qso[KEY_RX_BAND]}{SEP}{qso[KEY_MODE]}')
-
-        # enter the qso and the initial 'keep' flag into qso_map
-        ####
-        ####TODO: also QSL_SENT & submitted for awards/credits?
-        ####
-        keep = (KEY_QSL_RCVD in qso) and (qso[KEY_QSL_RCVD] == 'Y')
-        #print(f'#### keep: {keep}')
-        if not (key in qso_map):
-            qso_map[key] = []
-        qso_map[key].append( (qso, keep) )
-        #print('####', key, len(qso_map[key]))
-
-    print('---- grinding ----')
-    for key, matches in qso_map.items():
-        print('## key = ', key)
-        n_keep = 0
-        for qso, keep in matches:
-            if (keep):
-                n_keep += 1
-            #print('##     qso = ', qso)
-            #print('##     keep = ', keep)
-            print('##     qso freq = ', qso[KEY_FREQ], ' time on = ', qso[KEY_TIME_ON], ' keep = ', keep)
-        n = len(matches)
-        print('##   n = ', n, 'n_keep = ', n_keep)
-        choice = -1
-        if n == 1:
-            # set keep on the only match (index 0)
-            choice = 0
-        elif n == 2:
-            #TODO: see if more than 1 have keep set
-            print('#### ', key, ' n matching QSOs = ', n)
-            if n_keep == 0:
-                choice = 1    # decide which one of the 2 to keep (index 0 or 1), assume 1 for now (TODO: check for most resolution in the frequency?)
-        else:
-            if n > 2:
-                print('######## ', key, ' n matching QSOs = ', n)
-            choice = 2    # decide which one of the 3 or more to keep (index 0 or 1 or something greater), assume 2 for now
-        if choice >= 0:
-            matches[choice] = (qso, True)
+##SEP.join([f'{key}:: {value}' for key, value in d.items()])
 
-    ####DEBUG: look at precision of freq and time (and what partner says??)
-    ####DEBUG: say WHY the choice was selected
 
-    print('---- checking ----')
-    for key, matches in qso_map.items():
-        n_keep = 0
-        print('## key = ', key)
-        # Ignore the QSOs with no duplicates
-        n = len(matches)
-        if n > 1:
-            for qso, keep in matches:
-                if (keep):
-                    n_keep += 1
-                    print('##     qso freq = ', qso[KEY_FREQ], ' time on = ', qso[KEY_TIME_ON], ' keep = ', keep)
-        print('##   n = ', n, 'n_keep = ', n_keep)
-
-    ####
-    #### look for keys that might match
-    #### count number of  kept and un-kept qsos for each key
-    #### add PROPMODE=IRL to the ones that aren't being kept
-    ####
+#### CHECKPOINT (--checkpoint) ####
+
+# A new QSO can only change the groups of QSOs with the same index key:
+# the exact key, or with a time tolerance, the bucket (CALL, BAND,
+# RX_BAND, MODE) that groupRows() splits into clusters.  So a re-run
+# parses the new records, and re-grinds only the QSOs with their index
+# keys (see checkpoint.py).
+
+def indexKey(table, row, window=0, modeGroups=False):
+    """Return the index key of a row, as text."""
+    if window and table.epoch[row] != qsotable.NO_TIME:
+        return repr(bucketKey(table, row, modeGroups))
+    return repr(exactKey(table, row, modeGroups))
+
+def checkpointPolicy(window, modeGroups=False):
+    """Return what a checkpoint's decisions depend on, as text."""
+    policy = 'tolerance={}'.format(window)
+    if modeGroups:
+        policy += ',mode-groups'
+    return policy
+
+def readWithCheckpoint(fileName, window=0, jobs=1, stats=None, modeGroups=False):
+    """Return the header dict, the QsoTable, and qso_map (only the groups
+    of more than one row) of the file, like readInput() and grind(),
+    using and then updating the checkpoint next to the file."""
+    if stats is None:
+        stats = Stats(enabled=False)
+    policy = checkpointPolicy(window, modeGroups)
+    with checkpoint.Checkpoint(checkpoint.checkpointFileName(fileName)) as store:
+        adif = adif_io.MappedAdif(fileName)
+        lastQsoRx = store.meta.get(checkpoint.KEY_APP_LOTW_LASTQSORX)
+        with stats.phase('parse'):
+            table = store.load(adif, policy)
+        if table is None:
+            log.info('---- checkpoint: starting over ----')
+            with stats.phase('parse'):
+                header, table = readInput(fileName, PARSER_MMAP, jobs)
+            qso_map = grind(table, window, stats=stats, modeGroups=modeGroups)
+            keys = [indexKey(table, row, window, modeGroups) for row in range(len(table))]
+            groups = [(keys[matches[0]], matches) for matches in qso_map.values()
+                      if len(matches) > 1]
+            store.save(table, table.source, policy, 0, keys, (), groups)
+            return header, table, qso_map
+
+        first = len(table)
+        start = table.end[first - 1] if first else adif.header_end
+        with stats.phase('parse'):
+            table.extend(adif.records(start, adif.size()))
+        log.info('---- checkpoint: %s QSOs from before (LotW last QSL rx %s), %s new ----',
+                 first, lastQsoRx, len(table) - first)
+        keys = [indexKey(table, row, window, modeGroups) for row in range(first, len(table))]
+        changed = set(keys)
+        rows = sorted(store.rowsWithKeys(changed).union(range(first, len(table))))
+        for row in rows:
+            table.flags[row] &= ~(qsotable.FLAG_KEEP | qsotable.FLAG_DUP
+                                  | qsotable.FLAG_REASON_MASK)
+        new_map = grind(table, window, rows, stats, modeGroups)
+        groups = [(indexKey(table, matches[0], window, modeGroups), matches)
+                  for matches in new_map.values() if len(matches) > 1]
+        # The groups that did not change and the new ones, by first row
+        # (the order grind() would have them in).
+        qso_map = {}
+        for key, matches in sorted(
+                [group for group in store.groups() if not (group[0] in changed)] + groups,
+                key=lambda group: group[1][0]):
+            qso_map[matches[0]] = matches
+        store.save(table, adif, policy, first, keys, changed, groups)
+        return adif.header, table, qso_map
 
-    return qso_map
 
-##SEP.join([f'{key}:: {value}' for key, value in d.items()])
+####
 
+# Passthrough output (--passthrough): the input file is copied as it is,
+# except that the duplicates get PROP_MODE set to UNUSED_PROP_MODE.
+# This needs the byte offsets of the records, i.e. --parser mmap.
+# So the output differs from the input only in the duplicate records.
+
+def mungedRecord(table, row):
+    """Return the bytes of the record of a row from the input file,
+    with PROP_MODE set to UNUSED_PROP_MODE."""
+    return mungedBytes(table.sources[table.file[row]], table.record(row))
+
+def mungedBytes(adif, record):
+    """Return the bytes of an AdifRecord of a MappedAdif,
+    with PROP_MODE set to UNUSED_PROP_MODE."""
+    return recordBytesWith(adif, record, KEY_PROP_MODE, UNUSED_PROP_MODE)
+
+def recordBytesWith(adif, record, name, value):
+    """Return the bytes of an AdifRecord of a MappedAdif, with the field
+    name (in upper case) set to value."""
+    buffer = adif.buffer
+    start = record.start
+    end = record.end
+    value = value.encode(adif.encoding)
+    tag = '<{}:{}>'.format(name, len(value)).encode('ascii') + value
+    if name in record:
+        # Replace the old tag and value.
+        value_start, length = record.span(name)
+        tag_start = buffer.rfind(b'<', start, value_start)
+        return buffer[start:tag_start] + tag + buffer[value_start + length:end]
+    # Add the tag on its own line before the <eor> (the last 5 bytes).
+    eor = end - len('<eor>')
+    return buffer[start:eor] + tag + b'\n' + buffer[eor:end]
+
+def emitMungedLog(fileName, qso_map, table, writer, file=0):
+    """Write an input file with PROP_MODE set on the duplicates.
+    The records between two duplicates are copied with one copy."""
+    dups = sorted(row for matches in qso_map.values() if len(matches) > 1
+                  for row in matches
+                  if table.flags[row] & qsotable.FLAG_DUP and table.file[row] == file)
+    copyMunged(fileName, table.sources[file], (table.record(row) for row in dups), writer)
+
+def copyMunged(fileName, adif, dups, writer):
+    """Copy the file of a MappedAdif, with PROP_MODE set on dups,
+    its AdifRecords to change, in file order."""
+    copyChanged(fileName, adif, ((record, mungedBytes(adif, record)) for record in dups), writer)
+
+def copyChanged(fileName, adif, changes, writer):
+    """Copy the file of a MappedAdif, with the records of changes,
+    (AdifRecord, new bytes) in file order, replaced."""
+    with open(fileName, 'rb') as source:
+        position = 0
+        for record, data in changes:
+            writer.copy_from(source, position, record.start)
+            writer.write_bytes(data)
+            position = record.end
+        writer.copy_from(source, position, adif.size())
 
 ####
 
 ####
 
-def main(fileName):
-    qsos, header =  adif_io.read_from_file(fileName)
-
-    mungHeader(fileName, header)
-
-    qso_map = grind(qsos)
+# Input parsers (see --parser)
+PARSER_MMAP = 'mmap'
+PARSER_STREAM = 'stream'
+PARSER_PIPELINE = 'pipeline'
+PARSERS = [PARSER_MMAP, PARSER_STREAM, PARSER_PIPELINE]
+
+def readInput(fileName, parser, jobs=1, stats=None):
+    """Return the header dict and a QsoTable of the QSOs.
+    The QSOs are streamed into the table instead of reading the whole file
+    and building a list of all of them first."""
+    # With --parser mmap, the records are lazy: only the tags in the
+    # table's columns get decoded, and the table keeps only their byte
+    # offsets in the map.
+    if parser == PARSER_MMAP and jobs != 1:
+        # Each worker process builds a table of part of the file;
+        # join them in file order, so the rows are the same as with 1 job.
+        adif = adif_io.MappedAdif(fileName)
+        table = qsotable.QsoTable(source=adif)
+        for part in adif_io.parallel_map(adif, qsotable.tableOfRecords, jobs):
+            table.extendTable(part)
+        return adif.header, table
+    if parser == PARSER_PIPELINE:
+        return pipeline.readTable(fileName, stats)
+    return qsotable.tableOfFile(fileName, parser == PARSER_MMAP)
+
+def readSnapshot(fileName, jobs=1):
+    """Like readInput() with --parser mmap, but from the snapshot of the
+    file if it is up to date; if not, parse the file and write it."""
+    adif = adif_io.MappedAdif(fileName)
+    snapshotFileName = snapshot.snapshotFileName(fileName)
+    table = snapshot.load(snapshotFileName, adif, fileName)
+    if table is not None:
+        log.info('---- snapshot: %s QSOs from %s ----', len(table), snapshotFileName)
+        return adif.header, table
+    header, table = readInput(fileName, PARSER_MMAP, jobs)
+    snapshot.save(snapshotFileName, table, fileName)
+    log.info('---- snapshot: wrote %s ----', snapshotFileName)
+    return header, table
+
+def readInputs(fileNames, parser, jobs=1, useSnapshot=False, stats=None):
+    """Return a list of the header dicts of the files and one QsoTable
+    of all of their QSOs, where table.file[row] is the index in fileNames
+    of the file of a row.  The rows are in the order of fileNames."""
+    if len(fileNames) == 1:
+        if useSnapshot:
+            header, table = readSnapshot(fileNames[0], jobs)
+        else:
+            header, table = readInput(fileNames[0], parser, jobs, stats)
+        return [header], table
+    mapped = parser == PARSER_MMAP
+    if useSnapshot:
+        # Most of them load from their snapshots, in no time.
+        parts = [readSnapshot(fileName) for fileName in fileNames]
+    elif parser == PARSER_PIPELINE:
+        # Each file has its own stage threads.
+        parts = [pipeline.readTable(fileName, stats) for fileName in fileNames]
+    elif jobs == 1:
+        parts = [qsotable.tableOfFile(fileName, mapped) for fileName in fileNames]
+    else:
+        # Start the biggest files first, so that the run takes about as
+        # long as the biggest file does, not a big file started last.
+        bySize = sorted(range(len(fileNames)), key=lambda i: -os.path.getsize(fileNames[i]))
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(jobs) as executor:
+            futures = {i: executor.submit(qsotable.tableOfFile, fileNames[i], mapped)
+                       for i in bySize}
+        parts = [futures[i].result() for i in range(len(fileNames))]
+    headers = []
+    table = None
+    for fileName, (header, part) in zip(fileNames, parts):
+        headers.append(header)
+        source = part.source
+        if source is None and mapped:
+            # The table came from a worker process; map the file here too.
+            source = adif_io.MappedAdif(fileName)
+        if table is None:
+            table = qsotable.QsoTable(source)
+            file = 0
+        else:
+            file = table.addSource(source)
+        table.extendTable(part, file)
+    return headers, table
+
+# With --two-pass, the first pass over the inputs keeps only a hash of
+# the key of each QSO (see prepass.py), and the second one puts only the
+# QSOs whose hash is repeated into the QsoTable.  The others can only
+# be groups of one, which are not in the output, so the keep/dup
+# decisions and the output are the same with much less memory.
+
+def readRepeated(fileNames, parser, window, modeGroups=False):
+    """Return the header dicts of the files, a QsoTable of only their
+    QSOs whose key hash occurs more than once, and how many QSOs were
+    left out (like readInputs())."""
+    mapped = parser == PARSER_MMAP
+    sources = [adif_io.MappedAdif(fileName) if mapped else None for fileName in fileNames]
+
+    def records(file):
+        if mapped:
+            return iter(sources[file])
+        return adif_io.iter_records(fileNames[file])
+
+    hashes = array('q')
+    counts = [prepass.hashKeys(records(file), window, hashes, modeGroups) for file in range(len(fileNames))]
+    repeated = prepass.repeatedMask(hashes)
+    del hashes
+
+    table = qsotable.QsoTable(sources[0])
+    for source in sources[1:]:
+        table.addSource(source)
+    first = 0
+    for file, count in enumerate(counts):
+        table.extend(itertools.compress(records(file), repeated[first:first + count]), file)
+        first += count
+    headers = [source.header if mapped else adif_io.read_header(fileName)
+               for fileName, source in zip(fileNames, sources)]
+    return headers, table, len(repeated) - len(table)
+
+# With more than one input file, the QSOs of all of them are matched
+# together, and the output for each file goes to a file next to it.
+
+DEDUP_SUFFIX = '.dedup.adi'
+DEDUP_ADX_SUFFIX = '.dedup.adx'
+
+def dedupFileName(fileName):
+    """Return the output file name for an input file: log.adi -> log.dedup.adi
+    (and log.adi.gz -> log.dedup.adi, log.adx -> log.dedup.adx)"""
+    base = os.path.splitext(fileName)
+    if base[1].lower() in adif_io.COMPRESSED_SUFFIXES:
+        base = os.path.splitext(base[0])
+    return base[0] + (DEDUP_ADX_SUFFIX if adif_io.is_adx(fileName) else DEDUP_SUFFIX)
+
+# Counts for --stats
+_KEEP_BITS = bytes(1 if flags & qsotable.FLAG_KEEP else 0 for flags in range(256))
+_DUP_BITS = bytes(1 if flags & qsotable.FLAG_DUP else 0 for flags in range(256))
+
+def newCounts():
+    return {'records': 0, 'keep': 0, 'dup': 0, 'sizes': {}}
+
+def resultCounts(table, qso_map, counts=None):
+    """Add the counts of the rows of table and the groups of qso_map
+    (only the ones with more than one row matter; the other rows are
+    groups of one) to counts, and return it."""
+    if counts is None:
+        counts = newCounts()
+    sizes = counts['sizes']
+    grouped = 0
+    for matches in qso_map.values():
+        n = len(matches)
+        if n > 1:
+            sizes[n] = sizes.get(n, 0) + 1
+            grouped += n
+    sizes[1] = sizes.get(1, 0) + len(table) - grouped
+    counts['records'] += len(table)
+    counts['keep'] += table.flags.translate(_KEEP_BITS).count(1)
+    counts['dup'] += table.flags.translate(_DUP_BITS).count(1)
+    return counts
+
+def countResults(stats, counts):
+    """Set the counters of stats from resultCounts()."""
+    sizes = counts['sizes']
+    stats.count('records', counts['records'])
+    stats.count('distinct keys', sum(sizes.values()))
+    stats.count('keys with n > 2', sum(count for n, count in sizes.items() if n > 2))
+    stats.count('keep', counts['keep'])
+    stats.count('dup', counts['dup'])
+    stats.count('keys by number of QSOs (n, keys)', dict(sorted(sizes.items())))
+
+def main(fileNames, parser=PARSER_MMAP, window=0, output=None, passthrough=False, jobs=1,
+         useCheckpoint=False, showStats=False, maxMemory=None, joinFileName=None,
+         reportFileName=None, twoPass=False, modeGroups=False, serveAddress=None,
+         reloadInterval=None, useSnapshot=False):
+    if isinstance(fileNames, str):
+        fileNames = [fileNames]
+    if serveAddress:
+        # Imported here: only the server needs asyncio.
+        import server
+        if reloadInterval is None:
+            reloadInterval = server.DEFAULT_RELOAD_INTERVAL
+        server.serve(fileNames[0], server.parseAddress(serveAddress),
+                     lambda fileName: readInputs([fileName], parser, jobs, useSnapshot)[1],
+                     window, modeGroups, reloadInterval)
+        return
+    stats = Stats(enabled=showStats)
+    if joinFileName:
+        joinMain(fileNames[0], joinFileName, window, output, reportFileName, maxMemory, stats,
+                 modeGroups)
+        if showStats:
+            stats.report(sys.stderr)
+        return
+    if maxMemory and outOfCore(fileNames, window, output, passthrough, maxMemory, stats,
+                               modeGroups):
+        if showStats:
+            stats.report(sys.stderr)
+        return
+    # QSOs that are not in the table: groups of one (see --two-pass)
+    leftOut = 0
+    if useCheckpoint:
+        header, table, qso_map = readWithCheckpoint(fileNames[0], window, jobs, stats, modeGroups)
+        headers = [header]
+    elif twoPass:
+        with stats.phase('parse'):
+            headers, table, leftOut = readRepeated(fileNames, parser, window, modeGroups)
+        log.info('---- two passes: %s QSOs with a repeated key, %s left out ----',
+                 len(table), leftOut)
+        qso_map = grind(table, window, stats=stats, modeGroups=modeGroups)
+    else:
+        with stats.phase('parse'):
+            headers, table = readInputs(fileNames, parser, jobs, useSnapshot, stats)
+        qso_map = grind(table, window, stats=stats, modeGroups=modeGroups)
+
+    # Write to the output file, or else to stdout.
+    with stats.phase('write'):
+        if len(fileNames) == 1:
+            writeOutput(fileNames[0], headers[0], qso_map, table, 0,
+                        output if output else sys.stdout.buffer, passthrough,
+                        parser == PARSER_PIPELINE, stats)
+        else:
+            for file, (fileName, header) in enumerate(zip(fileNames, headers)):
+                writeOutput(fileName, header, qso_map, table, file,
+                            dedupFileName(fileName), passthrough,
+                            parser == PARSER_PIPELINE, stats)
+    if showStats:
+        counts = resultCounts(table, qso_map)
+        for name in ('records', 'keep'):
+            counts[name] += leftOut
+        counts['sizes'][1] += leftOut
+        countResults(stats, counts)
+        stats.report(sys.stderr)
+
+def writeOutput(fileName, header, qso_map, table, file, output, passthrough=False,
+                pipelined=False, stats=None, adx=None):
+    """Write the output for input file number file to output, a file
+    name or a binary stream; if pipelined, in another thread.  adx is
+    as for newWriter()."""
+    if pipelined:
+        if adx is None:
+            adx = isinstance(output, str) and adif_io.is_adx(output)
+        with pipeline.writeStage(output, stats) as stream:
+            writeOutput(fileName, header, qso_map, table, file, stream, passthrough, adx=adx)
+        return
+    writer = newWriter(output, adx)
+
+    if passthrough:
+        emitMungedLog(fileName, qso_map, table, writer, file)
+        writer.close()
+        return
+
+    mungHeader(fileName, header, writer)
 
     #print('# --header--')
     #print('# ', header)
@@ -399,22 +746,443 @@ def main(fileName):
     #print('# ', qsos)
     #print('# ----')
 
-    printHeader(header)
+    printHeader(header, writer)
 
     #print('# --qso_map--')
     #print('# ', qso_map)
     #print('# ----')
 
-    printAllQSOs(qso_map, qsos)
-
-    #TODO: emitMungedLog()
-    #TODO:WAS: f.close()
-
+    printAllQSOs(qso_map, table, writer, file)
+
+    writer.close()
+
+
+#### OUT OF CORE (--max-memory) ####
+
+# For inputs too big to hold all of their QSOs in memory, the QSOs are
+# hash-partitioned by CALL into spill files (see partition.py), and the
+# partitions are ground one at a time.  From each partition, the QSOs
+# to keep (of groups with more than one QSO) are spilled with the first
+# row of their group, and the duplicates with their own row; merging
+# those by row over all of the partitions gives the output in the same
+# order as grinding all of the QSOs at once.
+
+def spillPartitions(adifs, spills):
+    """Pass 1: append (row, file, start, end) of every record of the
+    MappedAdifs to the spill of its partition; return the number of rows."""
+    partitions = len(spills)
+    row = 0
+    for file, adif in enumerate(adifs):
+        for record in adif:
+            spills[partition.partitionOf(record.get(KEY_CALL, ''), partitions)].append(
+                row, file, record.start, record.end)
+            row += 1
+    return row
+
+def partitionTable(adifs, spill):
+    """Return a QsoTable of the records of a partition, and the rows (over
+    all of the inputs) of its rows."""
+    rows, files, starts, ends = spill.columns()
+    table = qsotable.QsoTable(adifs[0])
+    for adif in adifs[1:]:
+        table.addSource(adif)
+    # The rows are in order, so the rows of each file are together.
+    i = 0
+    while i < len(rows):
+        file = files[i]
+        j = i
+        while j < len(rows) and files[j] == file:
+            j += 1
+        adif = adifs[file]
+        table.extend((next(adif.records(starts[k], ends[k])) for k in range(i, j)), file)
+        i = j
+    return table, rows
+
+def grindPartitions(adifs, spills, spillDir, window, stats, counts, modeGroups=False):
+    """Grind each partition; return the spills of the QSOs to keep,
+    (first row of the group, row, file, start, end), and of the
+    duplicates, (row, file, start, end)."""
+    keepSpills = []
+    dupSpills = []
+    for n, spill in enumerate(spills):
+        with stats.phase('parse'):
+            table, rows = partitionTable(adifs, spill)
+        qso_map = grind(table, window, stats=stats, modeGroups=modeGroups)
+        keeps = spillDir.spillFile('keep{}'.format(n), 5)
+        dups = []
+        flags = table.flags
+        for matches in qso_map.values():
+            if len(matches) > 1:
+                first = rows[matches[0]]
+                for row in matches:
+                    if flags[row] & qsotable.FLAG_KEEP:
+                        keeps.append(first, rows[row], table.file[row], table.start[row],
+                                     table.end[row])
+                    elif flags[row] & qsotable.FLAG_DUP:
+                        dups.append((rows[row], table.file[row], table.start[row], table.end[row]))
+        dups.sort()
+        dupSpill = spillDir.spillFile('dup{}'.format(n), 4)
+        for dup in dups:
+            dupSpill.append(*dup)
+        keeps.close()
+        dupSpill.close()
+        keepSpills.append(keeps)
+        dupSpills.append(dupSpill)
+        resultCounts(table, qso_map, counts)
+    return keepSpills, dupSpills
+
+def writeSpilledOutput(fileName, adif, file, keepSpills, dupSpills, output, passthrough):
+    """Write the output for input file number file, like writeOutput(),
+    from the spills of grindPartitions()."""
+    writer = newWriter(output)
+    if passthrough:
+        copyMunged(fileName, adif, (next(adif.records(start, end))
+                                    for row, dupFile, start, end in heapq.merge(*dupSpills)
+                                    if dupFile == file), writer)
+        writer.close()
+        return
+    header = dict(adif.header)
+    mungHeader(fileName, header, writer)
+    printHeader(header, writer)
+    for first, row, keepFile, start, end in heapq.merge(*keepSpills):
+        if keepFile == file:
+            writer.write_record(next(adif.records(start, end)))
+    writer.close()
+
+def outOfCore(fileNames, window, output, passthrough, maxMemory, stats, modeGroups=False):
+    """Find the duplicates partition by partition, if the QSOs of the
+    files need more than maxMemory; return False if they do not."""
+    adifs = [adif_io.MappedAdif(fileName) for fileName in fileNames]
+    qsos = sum(partition.estimateQsos(adif) for adif in adifs)
+    partitions = partition.partitionCount(qsos, maxMemory)
+    if partitions == 1:
+        return False
+    log.info('---- out of core: about %s QSOs in %s partitions ----', qsos, partitions)
+    counts = newCounts()
+    with partition.SpillDirectory() as spillDir:
+        with stats.phase('partition'):
+            spills = [spillDir.spillFile('qsos{}'.format(n), 4) for n in range(partitions)]
+            spillPartitions(adifs, spills)
+            for spill in spills:
+                spill.close()
+        keepSpills, dupSpills = grindPartitions(adifs, spills, spillDir, window, stats, counts,
+                                                   modeGroups)
+        with stats.phase('write'):
+            if len(fileNames) == 1:
+                writeSpilledOutput(fileNames[0], adifs[0], 0, keepSpills, dupSpills,
+                                   output if output else sys.stdout.buffer, passthrough)
+            else:
+                for file, (fileName, adif) in enumerate(zip(fileNames, adifs)):
+                    writeSpilledOutput(fileName, adif, file, keepSpills, dupSpills,
+                                       dedupFileName(fileName), passthrough)
+    countResults(stats, counts)
+    return True
+
+#### JOIN (--join) ####
+
+# Compare a logger's ADIF export with the LotW report.  The LotW report
+# is ground as usual, and then each logger QSO is joined to the LotW
+# QSOs with the same key (TAG_NAMES_IN_KEY, the time to the minute, and
+# with --mode-groups, the mode group for MODE; see keyText()), with a
+# hash join, or a sort-merge join if the hash index would need more
+# than --max-memory (see join.py).  With --tolerance, it is joined to
+# the LotW QSOs with the same CALL, BAND, RX_BAND and MODE that start
+# within the tolerance of it (a band join, on joinKeys()); QSOs with a
+# bad date or time still only match exactly.  Each logger QSO gets a status:
+#
+#    DUP          it matches a LotW QSO of a group with duplicates: the
+#                 extra copies are only in LotW (e.g. uploaded again
+#                 by another program)
+#    CONFIRMED    it matches a LotW QSO with QSL_RCVD Y
+#    UNCONFIRMED  it matches a LotW QSO without QSL_RCVD Y
+#    NONE         it is not in the LotW report
+#
+# The output is a copy of the logger file with the status in an
+# APP_FINDDUPS_LOTW field of each QSO, and a CSV report of each QSO.
+
+KEY_APP_FINDDUPS_LOTW = 'APP_FINDDUPS_LOTW'
+
+JOIN_DUP = 'DUP'
+JOIN_CONFIRMED = 'CONFIRMED'
+JOIN_UNCONFIRMED = 'UNCONFIRMED'
+JOIN_NONE = 'NONE'
+
+# Bits of what a logger QSO matched
+_MATCHED = 0x01
+_MATCHED_CONFIRMED = 0x02
+_MATCHED_DUP_GROUP = 0x04
+
+JOIN_REPORT_SUFFIX = '.join.csv'
+
+JOIN_REPORT_COLUMNS = ['record', KEY_CALL, KEY_QSO_DATE, KEY_TIME_ON, KEY_BAND, KEY_RX_BAND,
+                       KEY_MODE, KEY_FREQ, 'status', 'lotw_matches', 'lotw_record']
+
+def joinReportFileName(fileName):
+    """Return the report file name for a logger file: log.adi -> log.join.csv"""
+    return os.path.splitext(fileName)[0] + JOIN_REPORT_SUFFIX
+
+def joinStatus(matched):
+    if matched & _MATCHED_DUP_GROUP:
+        return JOIN_DUP
+    if matched & _MATCHED_CONFIRMED:
+        return JOIN_CONFIRMED
+    if matched & _MATCHED:
+        return JOIN_UNCONFIRMED
+    return JOIN_NONE
+
+def joinKeys(table, window=0, modeGroups=False):
+    """Yield (key, row) for every row of a table: the key text, or with a
+    window, (the text of the bucket key, epoch) for join.joinPairs() band
+    joins.  A row with a bad date or time has (its key text, NO_TIME)."""
+    epochs = table.epoch
+    value = table.value
+    for row in range(len(table)):
+        if not window:
+            yield keyText(table, row, modeGroups=modeGroups), row
+        elif epochs[row] == qsotable.NO_TIME:
+            yield (keyText(table, row, modeGroups=modeGroups), qsotable.NO_TIME), row
+        else:
+            mode = value(row, qsotable.TAG_MODE)
+            if modeGroups and table.mode_group[row]:
+                mode = modegroups.MODE_GROUP_NAMES[table.mode_group[row]]
+            text = SEP.join([value(row, qsotable.TAG_CALL), value(row, qsotable.TAG_BAND),
+                             value(row, qsotable.TAG_RX_BAND), mode])
+            yield (text, epochs[row]), row
+
+def joinLogs(lotw, qso_map, logger, method, maxMemory=None, modeGroups=False, window=0):
+    """Return (matched, counts, firsts): for each row of the logger
+    QsoTable, the _MATCHED* bits of the rows of the lotw QsoTable it
+    matches (within window seconds, if not 0), how many those are, and
+    the first of them (-1 if none)."""
+    inDupGroup = bytearray(len(lotw))
+    for matches in qso_map.values():
+        if len(matches) > 1:
+            for row in matches:
+                inDupGroup[row] = 1
+    matched = bytearray(len(logger))
+    counts = array('I', bytes(4 * len(logger)))
+    firsts = array('q', [-1]) * len(logger)
+    lotwFlags = lotw.flags
+    with partition.SpillDirectory() as spillDir:
+        for loggerRow, lotwRow in join.joinPairs(joinKeys(logger, window, modeGroups), len(logger),
+                                                 joinKeys(lotw, window, modeGroups), len(lotw),
+                                                 method, spillDir, maxMemory, window or None):
+            bits = _MATCHED
+            if lotwFlags[lotwRow] & qsotable.FLAG_QSL_RCVD:
+                bits |= _MATCHED_CONFIRMED
+            if inDupGroup[lotwRow]:
+                bits |= _MATCHED_DUP_GROUP
+            matched[loggerRow] |= bits
+            counts[loggerRow] += 1
+            if firsts[loggerRow] < 0 or lotwRow < firsts[loggerRow]:
+                firsts[loggerRow] = lotwRow
+    return matched, counts, firsts
+
+def writeJoinReport(reportFileName, logger, matched, counts, firsts):
+    """Write the CSV report of the logger QSOs (record numbers from 1)."""
+    with open(reportFileName, 'w', newline='', encoding='utf-8') as reportFile:
+        report = csv.writer(reportFile)
+        report.writerow(JOIN_REPORT_COLUMNS)
+        for row in range(len(logger)):
+            report.writerow([row + 1] + [logger.value(row, tag) for tag in JOIN_REPORT_COLUMNS[1:8]]
+                            + [joinStatus(matched[row]), counts[row],
+                               firsts[row] + 1 if firsts[row] >= 0 else ''])
+
+def joinMain(lotwFileName, loggerFileName, window, output, reportFileName, maxMemory, stats,
+             modeGroups=False):
+    with stats.phase('parse'):
+        lotwHeader, lotw = readInput(lotwFileName, PARSER_MMAP)
+        loggerHeader, logger = readInput(loggerFileName, PARSER_MMAP)
+    qso_map = grind(lotw, window, stats=stats, modeGroups=modeGroups)
+    method = join.joinMethod(len(logger), len(lotw), maxMemory)
+    log.info('---- join: %s logger QSOs, %s LotW QSOs, %s join ----',
+             len(logger), len(lotw), method)
+    with stats.phase('join'):
+        matched, counts, firsts = joinLogs(lotw, qso_map, logger, method, maxMemory, modeGroups,
+                                           window)
+    with stats.phase('write'):
+        writeJoinReport(reportFileName or joinReportFileName(loggerFileName),
+                        logger, matched, counts, firsts)
+        # The rows of the logger table are its records in file order.
+        adif = logger.source
+        writer = adif_io.AdifWriter(output if output else sys.stdout.buffer)
+        copyChanged(loggerFileName, adif,
+                    ((record, recordBytesWith(adif, record, KEY_APP_FINDDUPS_LOTW,
+                                              joinStatus(matched[row])))
+                     for row, record in enumerate(adif)), writer)
+        writer.close()
+    if stats.enabled:
+        totals = {}
+        for bits in set(matched):
+            status = joinStatus(bits)
+            totals[status] = totals.get(status, 0) + matched.count(bits)
+        stats.count('logger records', len(logger))
+        stats.count('LotW records', len(lotw))
+        stats.count('logger records by status', dict(sorted(totals.items())))
+
+def parseArgs(argv):
+    argParser = argparse.ArgumentParser(
+        prog=PROGRAM_NAME,
+        description='Find duplicate, unconfirmed QSOs in a LotW report.')
+    argParser.add_argument('fileNames', metavar='lotwreport.adi', nargs='+',
+        help='ADIF files (or wildcards) to read; duplicates are found across '
+             'all of them, and with more than one, the output for each goes '
+             'to a .dedup.adi file next to it')
+    argParser.add_argument('--parser', choices=PARSERS,
+        help='how to read the ADIF file (default: {}, or {} for {} and {} files and - for '
+             'stdin)'.format(PARSER_MMAP, PARSER_PIPELINE,
+                             '/'.join(adif_io.COMPRESSED_SUFFIXES), adif_io.ADX_SUFFIX))
+    argParser.add_argument('-o', '--output', metavar='out.adi',
+        help='ADIF file to write, ADX if it is a {} file (default: stdout; only for one '
+             'input file)'.format(adif_io.ADX_SUFFIX))
+    argParser.add_argument('--passthrough', action='store_true',
+        help='copy the input as it is, setting PROP_MODE {} on the duplicates '
+             '(needs --parser {})'.format(UNUSED_PROP_MODE, PARSER_MMAP))
+    argParser.add_argument('--tolerance', metavar='T', type=tolerance.parseTolerance,
+        default=tolerance.TOLERANCE_EXACT,
+        help='match start times within T: {} or a number of minutes '
+             '(default: %(default)s)'.format(', '.join(tolerance.TOLERANCE_PRESETS)))
+    argParser.add_argument('--mode-groups', action='store_true', dest='modeGroups',
+        help='also match modes in the same LotW mode group ({})'.format(
+            ', '.join(modegroups.MODE_GROUP_NAMES[1:])))
+    argParser.add_argument('-j', '--jobs', metavar='N', type=int,
+        help='parse in N processes, 0 for one per CPU (default: 1 for one file, '
+             'which needs --parser {} to be more, else one per CPU)'.format(PARSER_MMAP))
+    argParser.add_argument('--checkpoint', action='store_true',
+        help='keep what was found in a {} file next to the input, and next time '
+             'only parse and match the QSOs added to the end of the file '
+             '(one input file; needs --parser {})'.format(checkpoint.CHECKPOINT_SUFFIX, PARSER_MMAP))
+    argParser.add_argument('--snapshot', action='store_true',
+        help='keep the parsed QSOs in a {} file next to each input, and load them '
+             'from it while the input has not changed (needs --parser {})'.format(
+                 snapshot.SNAPSHOT_SUFFIX, PARSER_MMAP))
+    argParser.add_argument('--max-memory', metavar='SIZE', type=partition.parseMemory,
+        help='if the QSOs need more memory than SIZE (e.g. 512M, 2G), split them by '
+             'CALL into temporary files and find the duplicates one part at a time '
+             '(needs --parser {})'.format(PARSER_MMAP))
+    argParser.add_argument('--join', metavar='logger.adi', dest='joinFileName',
+        help='compare an ADIF export of your logger with the LotW report: write a copy '
+             'of logger.adi with {} set on each QSO, and a CSV report (one LotW '
+             'report; needs --parser {})'.format(KEY_APP_FINDDUPS_LOTW, PARSER_MMAP))
+    argParser.add_argument('--report', metavar='report.csv', dest='reportFileName',
+        help='where --join writes its report (default: logger{})'.format(JOIN_REPORT_SUFFIX))
+    argParser.add_argument('--two-pass', action='store_true', dest='twoPass',
+        help='read the input twice: first count the keys, then keep only the QSOs '
+             'with a repeated key in memory (the output is the same)')
+    argParser.add_argument('--serve', metavar='ADDRESS', dest='serveAddress',
+        help='answer duplicate lookups on a Unix socket (a path) or a localhost '
+             'TCP port (PORT or HOST:PORT) until interrupted (one input file)')
+    argParser.add_argument('--reload', metavar='SECONDS', type=float, dest='reloadInterval',
+        help='with --serve, how often to look for changes to the file, 0 for never '
+             '(default: 2)')
+    argParser.add_argument('--stats', action='store_true',
+        help='report the time and peak memory of each phase, and counts, on stderr')
+    argParser.add_argument('-v', '--verbose', action='count', default=0,
+        help='log the groups with duplicates on stderr; -vv: all groups and QSOs')
+    argParser.add_argument('-q', '--quiet', action='store_true',
+        help='log only errors')
+    args = argParser.parse_args(argv)
+    args.fileNames = expandFileNames(args.fileNames, argParser)
+    notMapped = [fileName for fileName in args.fileNames
+                  if adif_io.is_stream_only(fileName) or adif_io.is_adx(fileName)]
+    if args.parser is None:
+        args.parser = PARSER_PIPELINE if notMapped else PARSER_MMAP
+    if notMapped and args.parser == PARSER_MMAP:
+        argParser.error('{} cannot be memory-mapped; use --parser {} or {}'.format(
+            notMapped[0], PARSER_PIPELINE, PARSER_STREAM))
+    if adif_io.STDIN in args.fileNames and (len(args.fileNames) > 1 or args.twoPass
+                                            or args.serveAddress):
+        argParser.error('- (stdin) must be the only input, with no --two-pass or --serve')
+    if args.passthrough and args.parser != PARSER_MMAP:
+        argParser.error('--passthrough needs --parser {}'.format(PARSER_MMAP))
+    if args.passthrough and args.output and adif_io.is_adx(args.output):
+        argParser.error('--passthrough copies the .adi input; it cannot write {}'.format(
+            args.output))
+    if args.checkpoint and (len(args.fileNames) > 1 or args.parser != PARSER_MMAP):
+        argParser.error('--checkpoint needs one input file and --parser {}'.format(PARSER_MMAP))
+    if args.max_memory and (args.checkpoint or args.parser != PARSER_MMAP):
+        argParser.error('--max-memory needs --parser {} and no --checkpoint'.format(PARSER_MMAP))
+    if args.max_memory and not (args.jobs in (None, 1)):
+        argParser.error('--max-memory reads the files in one process; no --jobs')
+    if args.joinFileName and (len(args.fileNames) > 1 or args.parser != PARSER_MMAP
+                              or args.checkpoint or args.passthrough):
+        argParser.error('--join needs one LotW report, --parser {}, and no --checkpoint '
+                        'or --passthrough'.format(PARSER_MMAP))
+    if args.joinFileName and any(adif_io.is_stream_only(fileName) or adif_io.is_adx(fileName)
+                                 for fileName in [args.joinFileName, args.output or '']):
+        argParser.error('--join reads and writes .adi files that can be memory-mapped')
+    if args.twoPass and (args.checkpoint or args.max_memory or args.joinFileName
+                         or not (args.jobs in (None, 1))):
+        argParser.error('--two-pass cannot be used with --checkpoint, --max-memory, '
+                        '--join or --jobs')
+    if args.serveAddress and (len(args.fileNames) > 1 or args.output or args.passthrough
+                              or args.checkpoint or args.max_memory or args.joinFileName
+                              or args.twoPass):
+        argParser.error('--serve needs one input file, and no --output, --passthrough, '
+                        '--checkpoint, --max-memory, --join or --two-pass')
+    if args.snapshot and (args.parser != PARSER_MMAP or args.checkpoint or args.max_memory
+                          or args.joinFileName or args.twoPass):
+        argParser.error('--snapshot needs --parser {}, and cannot be used with --checkpoint, '
+                        '--max-memory, --join or --two-pass'.format(PARSER_MMAP))
+    if args.reloadInterval is not None and not args.serveAddress:
+        argParser.error('--reload is only for --serve')
+    if args.reloadInterval is not None and args.reloadInterval < 0:
+        argParser.error('--reload must not be negative')
+    if args.reportFileName and not args.joinFileName:
+        argParser.error('--report is only for --join')
+    if args.output and len(args.fileNames) > 1:
+        argParser.error('--output is only for one input file')
+    if args.jobs is None:
+        args.jobs = 1 if len(args.fileNames) == 1 else 0
+    if args.jobs < 0:
+        argParser.error('--jobs must not be negative')
+    if args.jobs != 1 and len(args.fileNames) == 1 and args.parser != PARSER_MMAP:
+        argParser.error('--jobs with one file needs --parser {}'.format(PARSER_MMAP))
+    args.jobs = args.jobs or None
+    return args
+
+def expandFileNames(patterns, argParser):
+    """Return the files named by the arguments, expanding wildcards
+    (the shell may not have, e.g. on Windows), each file only once."""
+    fileNames = []
+    for pattern in patterns:
+        if glob.escape(pattern) == pattern:
+            fileNames.append(pattern)
+            continue
+        # Not our own output from an earlier run.
+        matches = sorted(fileName for fileName in glob.glob(pattern)
+                         if not fileName.endswith((DEDUP_SUFFIX, DEDUP_ADX_SUFFIX)))
+        if not matches:
+            argParser.error('no files match {}'.format(pattern))
+        fileNames.extend(matches)
+    # The same file twice would match all of its QSOs with themselves.
+    fileNames = list(dict.fromkeys(fileNames))
+    if len(fileNames) > 1:
+        for fileName in fileNames:
+            if dedupFileName(fileName) in fileNames:
+                argParser.error('{} would be overwritten by the output for {}'.format(
+                    dedupFileName(fileName), fileName))
+    return fileNames
+
+def logLevel(verbose, quiet):
+    if quiet:
+        return logging.ERROR
+    return [logging.WARNING, logging.INFO, logging.DEBUG][min(verbose, 2)]
+
+def run(argv=None):
+    """Run the command line program (argv defaults to sys.argv[1:])."""
+    args = parseArgs(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=logLevel(args.verbose, args.quiet), format='%(message)s',
+                        stream=sys.stderr)
+    main(args.fileNames, parser=args.parser, window=args.tolerance, output=args.output,
+         passthrough=args.passthrough, jobs=args.jobs, useCheckpoint=args.checkpoint,
+         showStats=args.stats, maxMemory=args.max_memory, joinFileName=args.joinFileName,
+         reportFileName=args.reportFileName, twoPass=args.twoPass, modeGroups=args.modeGroups,
+         serveAddress=args.serveAddress, reloadInterval=args.reloadInterval,
+         useSnapshot=args.snapshot)
 
 if __name__ == '__main__':
-    main(sys.argv[1])
-else:
-    print('Usage: {}: lotwreport.adi >new.adi'.format(sys.argv[0]))
+    run()
 
 
 # end
@@ -0,0 +1,182 @@
+# join.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Equi-joins of two inputs for finddups1.py --join.
+#
+# Each side is an iterable of (key, row).  The result is every
+# (left row, right row) pair with equal keys.
+#
+#    hash         the smaller side goes into a dict of key -> rows, and
+#                 the bigger side is streamed past it
+#    sort-merge   if that dict would not fit in the memory allowed, each
+#                 side is sorted in runs that do fit, the runs are
+#                 spilled to temporary files (see partition.SpillDirectory)
+#                 and merged back with heapq.merge, and the two sorted
+#                 streams are walked together
+#
+# The keys must be sortable (and picklable) for the sort-merge join.
+#
+# With a window, the joins are band joins: each key is (equal part,
+# position), and the pairs are those with equal parts and positions no
+# more than window apart (e.g. the bucket key of a QSO and its epoch,
+# for finddups1.py --join --tolerance).  The hash index then holds the
+# items of each equal part sorted by position, and is bisected.
+
+import bisect
+import heapq
+import itertools
+import os
+import pickle
+
+JOIN_HASH = 'hash'
+JOIN_SORT_MERGE = 'sort-merge'
+
+# Memory per entry of the hash index, and of a sorted run, in bytes
+# (measured with tracemalloc for finddups1.keyText() keys).
+BYTES_PER_INDEX_ENTRY = 250
+BYTES_PER_SORT_ENTRY = 200
+
+# Entries per pickle in a run file.
+RUN_CHUNK_ITEMS = 4096
+
+def joinMethod(leftSize, rightSize, maxMemory=None):
+    """Return JOIN_HASH if the index of the smaller side fits in
+    maxMemory bytes (or there is no limit), else JOIN_SORT_MERGE."""
+    if maxMemory is None or min(leftSize, rightSize) * BYTES_PER_INDEX_ENTRY <= maxMemory:
+        return JOIN_HASH
+    return JOIN_SORT_MERGE
+
+def hashJoin(build, probe, window=None):
+    """Yield (build row, probe row) for the pairs with equal keys (or
+    with a window, keys that match as in a band join), in the order of
+    probe."""
+    if window is not None:
+        yield from _hashBandJoin(build, probe, window)
+        return
+    index = {}
+    for key, row in build:
+        if not (key in index):
+            index[key] = []
+        index[key].append(row)
+    for key, row in probe:
+        rows = index.get(key)
+        if rows:
+            for buildRow in rows:
+                yield buildRow, row
+
+def _hashBandJoin(build, probe, window):
+    # equal part -> ([position, ...], [row, ...]), sorted by position
+    index = {}
+    for (part, position), row in build:
+        if not (part in index):
+            index[part] = []
+        index[part].append((position, row))
+    for part, entries in index.items():
+        entries.sort()
+        index[part] = ([entry[0] for entry in entries], [entry[1] for entry in entries])
+    for (part, position), row in probe:
+        entries = index.get(part)
+        if entries:
+            positions, rows = entries
+            low = bisect.bisect_left(positions, position - window)
+            high = bisect.bisect_right(positions, position + window)
+            for buildRow in rows[low:high]:
+                yield buildRow, row
+
+def _readRun(fileName):
+    with open(fileName, 'rb') as run:
+        while True:
+            try:
+                chunk = pickle.load(run)
+            except EOFError:
+                return
+            yield from chunk
+
+def _writeRun(fileName, items):
+    with open(fileName, 'wb') as run:
+        for i in range(0, len(items), RUN_CHUNK_ITEMS):
+            pickle.dump(items[i:i + RUN_CHUNK_ITEMS], run, pickle.HIGHEST_PROTOCOL)
+
+def sortedRuns(items, spillDir, name, runSize):
+    """Return an iterator of the (key, row) items sorted, sorting runSize
+    items at a time in memory and merging the runs from spill files."""
+    runs = []
+    run = []
+    for item in items:
+        run.append(item)
+        if len(run) >= runSize:
+            run.sort()
+            fileName = os.path.join(spillDir.name, '{}{}'.format(name, len(runs)))
+            _writeRun(fileName, run)
+            runs.append(fileName)
+            run = []
+    run.sort()
+    if not runs:
+        return iter(run)
+    return heapq.merge(iter(run), *(_readRun(fileName) for fileName in runs))
+
+def sortMergeJoin(left, right, spillDir, runSize, window=None):
+    """Yield (left row, right row) for the pairs with equal keys (or with
+    a window, keys that match as in a band join), by key."""
+    if window is None:
+        key = lambda item: item[0]
+    else:
+        key = lambda item: item[0][0]
+    lefts = itertools.groupby(sortedRuns(left, spillDir, 'left', runSize), key)
+    rights = itertools.groupby(sortedRuns(right, spillDir, 'right', runSize), key)
+    leftGroup = next(lefts, None)
+    rightGroup = next(rights, None)
+    while leftGroup is not None and rightGroup is not None:
+        if leftGroup[0] < rightGroup[0]:
+            leftGroup = next(lefts, None)
+        elif rightGroup[0] < leftGroup[0]:
+            rightGroup = next(rights, None)
+        else:
+            if window is None:
+                rightRows = [row for key, row in rightGroup[1]]
+                for item in leftGroup[1]:
+                    for rightRow in rightRows:
+                        yield item[1], rightRow
+            else:
+                # Both sides are sorted by position: slide the window
+                # along the right side.
+                rightItems = [(key[1], row) for key, row in rightGroup[1]]
+                low = 0
+                for (part, position), leftRow in leftGroup[1]:
+                    while low < len(rightItems) and rightItems[low][0] < position - window:
+                        low += 1
+                    high = low
+                    while high < len(rightItems) and rightItems[high][0] <= position + window:
+                        yield leftRow, rightItems[high][1]
+                        high += 1
+            leftGroup = next(lefts, None)
+            rightGroup = next(rights, None)
+
+def joinPairs(left, leftSize, right, rightSize, method, spillDir=None, maxMemory=None,
+              window=None):
+    """Yield (left row, right row) for the pairs of items of left and right,
+    iterables of leftSize and rightSize (key, row) items, with equal keys
+    (or with a window, keys that match as in a band join).
+    method is JOIN_HASH or JOIN_SORT_MERGE (see joinMethod())."""
+    if method == JOIN_HASH:
+        if leftSize <= rightSize:
+            yield from hashJoin(left, right, window)
+        else:
+            for rightRow, leftRow in hashJoin(right, left, window):
+                yield leftRow, rightRow
+        return
+    runSize = max(1, maxMemory // BYTES_PER_SORT_ENTRY)
+    yield from sortMergeJoin(left, right, spillDir, runSize, window)
@@ -0,0 +1,166 @@
+# keepers.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Which QSO of each group of matching QSOs to keep, for grind() in finddups.py.
+#
+# The QSOs of a group are ranked by an ordered list of rules; the first
+# rule that tells two QSOs apart decides between them:
+#
+#    QSL_RCVD   a confirmed QSO (QSL_RCVD Y)
+#    FREQ       the FREQ with the most decimal places
+#    seconds    a TIME_ON with seconds (HHMMSS) over one without (HHMM)
+#    position   the earliest in the file (always the last rule)
+#
+# The best QSO is kept, and so is every other confirmed QSO: only
+# unconfirmed QSOs are marked as duplicates.  The rule that put the
+# best QSO ahead of the next best one is the group's reason, kept in the
+# FLAG_REASON bits of the best QSO's flags (see groupReason()).
+#
+# With NumPy, all of the groups are ranked at once: the rows of the
+# groups of more than one QSO go in one array, with their group number
+# and a rank column per rule; one np.lexsort() puts each group's best
+# row first.  Without NumPy, each group is sorted by the same ranks.
+
+import itertools
+
+import qsotable
+
+# Rules, which are also the reasons
+REASON_POSITION = 'position'    # none of the other rules told them apart
+REASON_QSL_RCVD = 'QSL_RCVD'    # it is confirmed (QSL_RCVD Y)
+REASON_FREQ = 'FREQ'            # it has the most decimal places in FREQ
+REASON_SECONDS = 'seconds'      # its TIME_ON has seconds
+
+# Reason codes in the FLAG_REASON bits
+REASONS = [REASON_POSITION, REASON_QSL_RCVD, REASON_FREQ, REASON_SECONDS]
+
+KEEP_RULES = (REASON_QSL_RCVD, REASON_FREQ, REASON_SECONDS, REASON_POSITION)
+
+_numpy = None
+
+def _import_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+def checkRules(rules):
+    """Return rules as a tuple, with position last."""
+    rules = [rule for rule in rules if rule != REASON_POSITION]
+    for rule in rules:
+        if not (rule in REASONS):
+            raise ValueError('not a keep rule: {!r}'.format(rule))
+    return tuple(rules) + (REASON_POSITION,)
+
+def _rank(table, rule, row):
+    """Return the rank of a row by a rule: lower is better."""
+    if rule == REASON_QSL_RCVD:
+        return 0 if table.flags[row] & qsotable.FLAG_QSL_RCVD else 1
+    if rule == REASON_FREQ:
+        return -table.freq_places[row]
+    if rule == REASON_SECONDS:
+        return 0 if table.flags[row] & qsotable.FLAG_SECONDS else 1
+    return row
+
+def selectKeepers(table, groups, rules=KEEP_RULES, rows=None):
+    """Set FLAG_KEEP on the rows to keep of each of groups (lists of rows,
+    e.g. the values of a qso_map), FLAG_DUP on the others of groups of
+    more than one row, and the reason on the best row of each of those.
+    rows are the rows of all of the groups (all of them if None)."""
+    rules = checkRules(rules)
+    np = _import_numpy()
+    if np:
+        _selectNumpy(np, table, groups, rules, rows)
+    else:
+        _selectRows(table, groups, rules)
+
+def _selectRows(table, groups, rules):
+    flags = table.flags
+    for matches in groups:
+        if len(matches) == 1:
+            flags[matches[0]] |= qsotable.FLAG_KEEP
+            continue
+        ranks = {row: [_rank(table, rule, row) for rule in rules] for row in matches}
+        best, second = sorted(matches, key=ranks.get)[:2]
+        reason = 0
+        for rule, rank, other in zip(rules, ranks[best], ranks[second]):
+            if rank != other:
+                reason = REASONS.index(rule)
+                break
+        for row in matches:
+            if row == best or flags[row] & qsotable.FLAG_QSL_RCVD:
+                flags[row] |= qsotable.FLAG_KEEP
+            else:
+                flags[row] |= qsotable.FLAG_DUP
+        flags[best] |= reason << qsotable.FLAG_REASON_SHIFT
+
+def _selectNumpy(np, table, groups, rules, rows):
+    # A view of the bytearray: the flags are set in place.
+    flags = np.frombuffer(table.flags, dtype=np.uint8)
+    # Most groups have one row; rather than list all of their rows,
+    # keep every row, then look at only the groups with duplicates.
+    if rows is None:
+        flags |= qsotable.FLAG_KEEP
+    else:
+        flags[np.asarray(rows, dtype=np.intp)] |= qsotable.FLAG_KEEP
+    groups = [matches for matches in groups if len(matches) > 1]
+    if not groups:
+        return
+    sizes = np.fromiter(map(len, groups), dtype=np.intp, count=len(groups))
+    rows = np.fromiter(itertools.chain.from_iterable(groups), dtype=np.intp,
+                       count=int(sizes.sum()))
+
+    rowFlags = flags[rows]
+    confirmed = (rowFlags & qsotable.FLAG_QSL_RCVD) != 0
+    columns = {
+        REASON_QSL_RCVD: ~confirmed,
+        REASON_FREQ: -np.frombuffer(table.freq_places, dtype=np.int8)[rows].astype(np.int16),
+        REASON_SECONDS: (rowFlags & qsotable.FLAG_SECONDS) == 0,
+        REASON_POSITION: rows,
+    }
+    ranks = [columns[rule] for rule in rules]
+    group = np.repeat(np.arange(len(sizes)), sizes)
+    # np.lexsort() sorts by the last key first.
+    order = np.lexsort(ranks[::-1] + [group])
+    starts = np.cumsum(sizes) - sizes
+    best = order[starts]
+    second = order[starts + 1]
+
+    reasons = np.zeros(len(sizes), dtype=np.uint8)
+    decided = np.zeros(len(sizes), dtype=bool)
+    for rule, rank in zip(rules, ranks):
+        differ = (rank[best] != rank[second]) & ~decided
+        reasons[differ] = REASONS.index(rule)
+        decided |= differ
+
+    keep = confirmed.copy()
+    keep[best] = True
+    dups = rows[~keep]
+    flags[dups] = (flags[dups] & ~np.uint8(qsotable.FLAG_KEEP)) | qsotable.FLAG_DUP
+    flags[rows[best]] |= reasons << qsotable.FLAG_REASON_SHIFT
+
+def groupReason(table, matches):
+    """Return the reason of a group of more than one row from selectKeepers()."""
+    flags = table.flags
+    for row in matches:
+        code = (flags[row] & qsotable.FLAG_REASON_MASK) >> qsotable.FLAG_REASON_SHIFT
+        if code:
+            return REASONS[code]
+    return REASON_POSITION
@@ -0,0 +1,58 @@
+# modegroups.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# LotW mode groups, for finddups1.py --mode-groups.
+#
+# LotW matches QSOs with the same mode, or with modes in the same mode
+# group (see LOTW MATCHING in finddups1.py): CW, PHONE, DATA, or IMAGE.
+# MODE_GROUPS gives the group of each ADIF MODE (and of the SUBMODEs
+# that are used as modes by some programs).  A QSO whose MODE is not in
+# the table gets the group of its SUBMODE, if that is; otherwise it has
+# no group, and only matches the same MODE.
+
+# Group codes (in the mode_group column of a QsoTable)
+MODE_GROUP_NONE = 0
+MODE_GROUP_CW = 1
+MODE_GROUP_PHONE = 2
+MODE_GROUP_DATA = 3
+MODE_GROUP_IMAGE = 4
+
+MODE_GROUP_NAMES = ['', 'CW', 'PHONE', 'DATA', 'IMAGE']
+
+_CW = ['CW']
+_PHONE = ['PHONE', 'AM', 'FM', 'SSB', 'USB', 'LSB', 'DIGITALVOICE', 'C4FM', 'DMR',
+          'DSTAR', 'FREEDV', 'M17']
+_IMAGE = ['IMAGE', 'ATV', 'FAX', 'SSTV']
+_DATA = ['DATA', 'ARDOP', 'CHIP', 'CLO', 'CONTESTI', 'DOMINO', 'DYNAMIC', 'FSK441',
+         'FST4', 'FST4W', 'FT4', 'FT8', 'HELL', 'ISCAT', 'JS8', 'JT4', 'JT44', 'JT6M',
+         'JT65', 'JT9', 'MFSK', 'MSK144', 'MT63', 'OLIVIA', 'OPERA', 'PAC', 'PAX',
+         'PKT', 'PSK', 'PSK2K', 'PSK31', 'PSK63', 'Q15', 'Q65', 'QPSK31', 'QRA64',
+         'ROS', 'RTTY', 'RTTYM', 'T10', 'THOR', 'THRB', 'TOR', 'V4', 'VARA', 'VOI',
+         'WINMOR', 'WSPR']
+
+MODE_GROUPS = {}
+for _group, _modes in ((MODE_GROUP_CW, _CW), (MODE_GROUP_PHONE, _PHONE),
+                       (MODE_GROUP_IMAGE, _IMAGE), (MODE_GROUP_DATA, _DATA)):
+    for _mode in _modes:
+        MODE_GROUPS[_mode] = _group
+del _group, _modes, _mode
+
+def modeGroup(mode, submode=None):
+    """Return the group code of a MODE (and SUBMODE), or MODE_GROUP_NONE."""
+    group = MODE_GROUPS.get(mode.upper(), MODE_GROUP_NONE)
+    if group == MODE_GROUP_NONE and submode:
+        group = MODE_GROUPS.get(submode.upper(), MODE_GROUP_NONE)
+    return group
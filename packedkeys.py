@@ -0,0 +1,143 @@
+# packedkeys.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Grouping keys of the rows of a QsoTable, packed into one int per row.
+#
+# The key columns are already small integers (codes of interned strings,
+# see qsotable.py), so a key is their bits put side by side:
+#
+#    CALL | BAND | RX_BAND | MODE (or mode group) | minute
+#
+# Each field gets just enough bits for the codes in the table's interner
+# (the minute, for exact matching only, is counted from the earliest
+# one), so the keys are usually less than 64 bits and are packed for the
+# whole table at once with NumPy; without it (or if they need more bits)
+# the same ints are built one row at a time.  An int hashes and compares
+# faster than a tuple, and the dict of groups keeps one int per key.
+#
+# The bit widths depend on the table, so packed keys are only compared
+# within one call; finddups1.indexKey() is the key that is kept in a
+# checkpoint.  Rows with a bad date or time have no packed key.
+
+import modegroups
+import qsotable
+
+_numpy = None
+
+def _import_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+# Mode keys with mode groups: the group, or if the mode has none,
+# the mode code after the group codes.
+MODE_KEY_BASE = len(modegroups.MODE_GROUP_NAMES)
+
+_SECONDS_PER_MINUTE = 60
+
+def bitsFor(count):
+    """Return the bits needed for the numbers 0 .. count - 1."""
+    return max(1, (count - 1).bit_length())
+
+def modeKey(table, row, modeGroups=False):
+    """Return the mode part of the key of a row: the MODE code, or with
+    modeGroups, its mode group (see modegroups.py)."""
+    return modeKeyOf(table.mode[row], table.mode_group[row], modeGroups)
+
+def modeKeyOf(mode, group, modeGroups=False):
+    """Return the mode part of a key for a MODE code and mode group."""
+    if modeGroups:
+        return group if group else MODE_KEY_BASE + mode
+    return mode
+
+def _widths(table, modeGroups):
+    bandBits = bitsFor(len(table.bands))
+    modeBits = bitsFor(len(table.modes) + (MODE_KEY_BASE if modeGroups else 0))
+    return [bitsFor(len(table.calls)), bandBits, bandBits, modeBits]
+
+def packKeys(table, rows, exact, modeGroups=False):
+    """Return (keys, bad): a list of the packed key of each of the rows
+    (a range or a list of rows in file order), with the minute if exact,
+    and the indexes in rows of the rows with a bad date or time, whose
+    keys are None."""
+    widths = _widths(table, modeGroups)
+    np = _import_numpy()
+    if np and len(rows):
+        return _packNumpy(np, table, rows, exact, modeGroups, widths)
+    return _packRows(table, rows, exact, modeGroups, widths)
+
+def _minuteRange(minutes):
+    first = min(minutes, default=0)
+    return first, bitsFor(max(minutes, default=0) - first + 1)
+
+def _packRows(table, rows, exact, modeGroups, widths):
+    call, band, rx_band, epoch = table.call, table.band, table.rx_band, table.epoch
+    callBits, bandBits, rxBits, modeBits = widths
+    bad = [i for i, row in enumerate(rows) if epoch[row] == qsotable.NO_TIME]
+    first = minuteBits = 0
+    if exact:
+        first, minuteBits = _minuteRange(
+            [epoch[row] // _SECONDS_PER_MINUTE for row in rows if epoch[row] != qsotable.NO_TIME])
+    keys = []
+    for row in rows:
+        key = (((call[row] << bandBits | band[row]) << rxBits | rx_band[row]) << modeBits
+               | modeKey(table, row, modeGroups))
+        if exact:
+            key = key << minuteBits | (epoch[row] // _SECONDS_PER_MINUTE - first)
+        keys.append(key)
+    for i in bad:
+        keys[i] = None
+    return keys, bad
+
+def _packNumpy(np, table, rows, exact, modeGroups, widths):
+    def column(values, dtype):
+        values = np.frombuffer(values, dtype=dtype)
+        if not (isinstance(rows, range) and rows == range(len(table))):
+            values = values[np.asarray(rows, dtype=np.intp)]
+        return values.astype(np.int64)
+
+    epochs = column(table.epoch, np.int64)
+    isBad = epochs == qsotable.NO_TIME
+    minutes = epochs[~isBad] // _SECONDS_PER_MINUTE
+    first = minuteBits = 0
+    if exact and len(minutes):
+        first = int(minutes.min())
+        minuteBits = bitsFor(int(minutes.max()) - first + 1)
+    if sum(widths) + minuteBits > 63:
+        return _packRows(table, rows, exact, modeGroups, widths)
+
+    modes = column(table.mode, np.uint32)
+    if modeGroups:
+        groups = column(table.mode_group, np.uint8)
+        modes = np.where(groups != 0, groups, modes + MODE_KEY_BASE)
+    keys = np.zeros(len(epochs), dtype=np.int64)
+    for values, width in zip((column(table.call, np.uint32), column(table.band, np.uint32),
+                              column(table.rx_band, np.uint32), modes), widths):
+        keys <<= width
+        keys |= values
+    if exact:
+        keys <<= minuteBits
+        keys[~isBad] |= minutes - first
+    keys = keys.tolist()
+    bad = np.flatnonzero(isBad).tolist()
+    for i in bad:
+        keys[i] = None
+    return keys, bad
@@ -0,0 +1,157 @@
+# partition.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Hash partitions of the QSOs of inputs too big for memory, for
+# finddups1.py --max-memory.
+#
+# QSOs only match if they have the same CALL, so the QSOs can be split
+# into partitions by a hash of the CALL and each partition ground on
+# its own.  The first pass over the input reads only the CALL of each
+# record and appends (row, file, start, end) to the spill file of its
+# partition: the row number over all of the inputs, and where the
+# record is (see adif_io.MappedAdif).  Then one partition at a time is
+# read back into a QsoTable from the memory map and ground, and what
+# the output needs is spilled again (see finddups1.grindPartitions).
+#
+# Spill files are flat arrays of 64-bit integers, a fixed number per
+# item, in a temporary directory that is removed at the end.
+
+from array import array
+import os
+import tempfile
+import zlib
+
+# Peak memory of a partition while it is parsed and ground, in bytes
+# per QSO (measured with tracemalloc; a time tolerance needs the most).
+BYTES_PER_QSO = 600
+
+# Do not open more spill files than this at once.
+MAX_PARTITIONS = 512
+
+# The records at the start of a file that are counted to estimate
+# how many QSOs it has.
+SAMPLE_BYTES = 1 << 20
+
+# Items buffered per spill file before writing them.
+SPILL_BUFFER_ITEMS = 1 << 14
+
+_MEMORY_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+def parseMemory(text):
+    """Return the bytes for a size like 512M, 2G, or 1000000."""
+    number = text.upper().rstrip('B').rstrip('I')
+    unit = number[-1:] if number[-1:] in _MEMORY_UNITS else ''
+    try:
+        size = float(number[:len(number) - len(unit)]) * _MEMORY_UNITS[unit]
+    except ValueError:
+        raise ValueError('memory must be a number of bytes, optionally with K, M, or G: {!r}'.format(
+            text)) from None
+    if size <= 0:
+        raise ValueError('memory must be more than 0: {!r}'.format(text))
+    return int(size)
+
+def estimateQsos(adif):
+    """Return about how many QSOs a MappedAdif has, from the length of
+    the records in its first SAMPLE_BYTES."""
+    start = adif.header_end
+    count = 0
+    end = start
+    for record in adif.records(start, min(start + SAMPLE_BYTES, adif.size())):
+        count += 1
+        end = record.end
+    if count == 0:
+        # One record bigger than the sample, or none at all.
+        return 1 if adif.size() > start else 0
+    return int((adif.size() - start) * count / (end - start)) + 1
+
+def partitionCount(qsos, maxMemory):
+    """Return how many partitions qsos QSOs need to be ground in maxMemory."""
+    needed = -(-qsos * BYTES_PER_QSO // maxMemory)
+    return max(1, min(needed, MAX_PARTITIONS))
+
+def partitionOf(call, partitions):
+    """Return the partition of a CALL (the same in every run)."""
+    return zlib.crc32(call.encode('utf-8', 'surrogatepass')) % partitions
+
+class SpillFile:
+    """A temporary file of items of width integers each."""
+
+    def __init__(self, directory, name, width):
+        self.fileName = os.path.join(directory, name)
+        self.width = width
+        self.items = 0
+        self._buffer = array('q')
+        self._file = open(self.fileName, 'wb')
+
+    def append(self, *values):
+        self._buffer.extend(values)
+        self.items += 1
+        if len(self._buffer) >= SPILL_BUFFER_ITEMS * self.width:
+            self._flush()
+
+    def _flush(self):
+        self._buffer.tofile(self._file)
+        del self._buffer[:]
+
+    def close(self):
+        """Finish writing; the items can be read after this."""
+        if self._file is not None:
+            self._flush()
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return self.items
+
+    def __iter__(self):
+        """Yield the items as tuples, in the order they were appended."""
+        self.close()
+        width = self.width
+        with open(self.fileName, 'rb') as spill:
+            while True:
+                chunk = array('q')
+                chunk.frombytes(spill.read(SPILL_BUFFER_ITEMS * width * chunk.itemsize))
+                if not chunk:
+                    return
+                for i in range(0, len(chunk), width):
+                    yield tuple(chunk[i:i + width])
+
+    def columns(self):
+        """Return the items as width arrays, one per value."""
+        self.close()
+        values = array('q')
+        with open(self.fileName, 'rb') as spill:
+            values.frombytes(spill.read())
+        return [values[i::self.width] for i in range(self.width)]
+
+class SpillDirectory:
+    """A temporary directory of SpillFiles, removed by close()."""
+
+    def __init__(self, dir=None):
+        self._directory = tempfile.TemporaryDirectory(prefix='finddups-', dir=dir)
+        self.name = self._directory.name
+
+    def spillFile(self, name, width):
+        return SpillFile(self.name, name, width)
+
+    def close(self):
+        self._directory.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
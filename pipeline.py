@@ -0,0 +1,295 @@
+# pipeline.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Reading and writing in stages, for finddups1.py --parser pipeline.
+#
+# Each stage is a thread, connected to the next by a Channel, a queue
+# that holds only a few items, so a fast stage waits for a slow one
+# (back-pressure) and the chunks and batches in flight stay a few MiB
+# however big the input is:
+#
+#    read     read the file (or stdin) in chunks, decompressing .gz,
+#             .bz2 and .xz files (see adif_io.open_input)
+#    parse    turn the chunks into QSO dicts, a batch at a time (from
+#             .adi text, or ADX with adif_io.AdxStream)
+#    table    add the batches to the QsoTable (the key columns); this
+#             is the thread that called readTable()
+#    write    write the output, formatted by the calling thread
+#
+# Decompressing, reading and writing let go of the GIL, so they overlap
+# with the parsing; grinding needs all of the QSOs, so it is between
+# the table stage and the write stage.  For --stats, each stage adds up
+# the time it waited for input (its upstream is the bottleneck) and for
+# room in its output channel (downstream is).
+
+import contextlib
+import io
+import queue
+import threading
+import time
+
+import adif_io
+import qsotable
+
+# Bytes read at a time
+CHUNK_SIZE = 1 << 20
+# QSO dicts passed on at a time
+BATCH_SIZE = 1024
+# Items that a channel holds
+CHANNEL_SIZE = 4
+
+# How often a waiting stage looks whether another one has failed, in seconds
+_POLL = 0.1
+
+# The last item put in a channel
+_END = object()
+
+class _Cancelled(Exception):
+    """Another stage has failed; stop."""
+    pass
+
+class Stage:
+    """Where the time of one stage went."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self.inputWait = 0.0
+        self.outputWait = 0.0
+
+    def done(self):
+        self.seconds = time.perf_counter() - self.started
+
+class Pipeline:
+    """The stage threads of one run; use it as a context manager, which
+    waits for them and raises the first exception of any of them."""
+
+    def __init__(self, stats=None):
+        self.stats = stats
+        self.stages = []
+        self._threads = []
+        self._failed = threading.Event()
+        self._error = None
+
+    def channel(self, size=CHANNEL_SIZE):
+        return Channel(self, size)
+
+    def stage(self, name):
+        stage = Stage(name)
+        self.stages.append(stage)
+        return stage
+
+    def start(self, name, function, *args):
+        """Run function(stage, *args) in a new thread."""
+        stage = self.stage(name)
+
+        def run():
+            try:
+                function(stage, *args)
+            except _Cancelled:
+                pass
+            except BaseException as error:
+                self.fail(error)
+            finally:
+                stage.done()
+
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        self._threads.append(thread)
+        thread.start()
+        return stage
+
+    def fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._failed.set()
+
+    def check(self):
+        if self._failed.is_set():
+            raise _Cancelled()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        if exc is not None:
+            self._failed.set()
+        for thread in self._threads:
+            thread.join()
+        if self.stats is not None:
+            for stage in self.stages:
+                self.stats.stage(stage.name, stage.seconds, stage.inputWait, stage.outputWait)
+        # The calling thread stops (_Cancelled) when a stage fails;
+        # raise what that stage raised.
+        if self._error is not None and (exc is None or isinstance(exc, _Cancelled)):
+            raise self._error
+        return False
+
+class Channel:
+    """A bounded queue between two stages that times their waits."""
+
+    def __init__(self, pipeline, size):
+        self._pipeline = pipeline
+        self._queue = queue.Queue(size)
+
+    def put(self, stage, item):
+        if self._queue.full():
+            started = time.perf_counter()
+            while True:
+                try:
+                    self._queue.put(item, timeout=_POLL)
+                    break
+                except queue.Full:
+                    self._pipeline.check()
+            stage.outputWait += time.perf_counter() - started
+        else:
+            self._queue.put(item)
+
+    def close(self, stage):
+        self.put(stage, _END)
+
+    def get(self, stage):
+        """Return the next item, or _END."""
+        if self._queue.empty():
+            started = time.perf_counter()
+            while True:
+                try:
+                    item = self._queue.get(timeout=_POLL)
+                    break
+                except queue.Empty:
+                    self._pipeline.check()
+            stage.inputWait += time.perf_counter() - started
+            return item
+        return self._queue.get()
+
+    def items(self, stage):
+        """Yield the items up to _END."""
+        item = self.get(stage)
+        while item is not _END:
+            yield item
+            item = self.get(stage)
+
+class _ChannelReader(io.RawIOBase):
+    """A binary file of the chunks of a channel."""
+
+    def __init__(self, channel, stage):
+        self._chunks = channel.items(stage)
+        self._chunk = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._chunk = memoryview(chunk)
+        n = min(len(buffer), len(self._chunk))
+        buffer[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
+
+class _ChannelWriter(io.RawIOBase):
+    """A binary file that puts what is written into a channel."""
+
+    def __init__(self, channel, stage):
+        self._channel = channel
+        self._stage = stage
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        # adif_io.AdifWriter reuses its buffer, so put a copy.
+        self._channel.put(self._stage, bytes(data))
+        return len(data)
+
+#### Stages
+
+def _read(stage, source, chunks):
+    adif_file, mustClose = adif_io.open_input(source, binary=True)
+    try:
+        # read1() passes on what a pipe has so far, not waiting for a whole chunk.
+        read = getattr(adif_file, 'read1', adif_file.read)
+        data = read(CHUNK_SIZE)
+        while data:
+            chunks.put(stage, data)
+            data = read(CHUNK_SIZE)
+    finally:
+        if mustClose:
+            adif_file.close()
+    chunks.close(stage)
+
+def _parse(stage, chunks, batches, adx):
+    adif_file = io.BufferedReader(_ChannelReader(chunks, stage), CHUNK_SIZE)
+    stream = adif_io.AdxStream(adif_file) if adx else adif_io.AdifStream(adif_file)
+    batches.put(stage, stream.read_header())
+    batch = []
+    for qso in stream:
+        batch.append(qso)
+        if len(batch) >= BATCH_SIZE:
+            batches.put(stage, batch)
+            batch = []
+    if batch:
+        batches.put(stage, batch)
+    batches.close(stage)
+
+def _write(stage, blocks, target):
+    if isinstance(target, (str, bytes)):
+        out = open(target, 'wb')
+    else:
+        out = target
+    try:
+        for block in blocks.items(stage):
+            out.write(block)
+    finally:
+        if out is not target:
+            out.close()
+        else:
+            out.flush()
+
+def readTable(source, stats=None):
+    """Return the header dict and a QsoTable of the QSOs of a file name
+    (.adi, or ADX; see adif_io.is_adx) or STDIN (see adif_io.open_input),
+    read and parsed in other threads."""
+    with Pipeline(stats) as pipeline:
+        chunks = pipeline.channel()
+        batches = pipeline.channel()
+        pipeline.start('read', _read, source, chunks)
+        pipeline.start('parse', _parse, chunks, batches, adif_io.is_adx(source))
+        stage = pipeline.stage('table')
+        header = batches.get(stage)
+        table = qsotable.QsoTable()
+        for batch in batches.items(stage):
+            table.extend(batch)
+        stage.done()
+    return header, table
+
+@contextlib.contextmanager
+def writeStage(target, stats=None):
+    """Return a binary file whose data is written to target (a file name
+    or a binary stream) in another thread."""
+    with Pipeline(stats) as pipeline:
+        blocks = pipeline.channel()
+        stage = pipeline.stage('format')
+        pipeline.start('write', _write, blocks, target)
+        try:
+            yield _ChannelWriter(blocks, stage)
+        finally:
+            stage.done()
+            # Also when this thread failed, so that the write stage ends.
+            blocks.close(stage)
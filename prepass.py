@@ -0,0 +1,130 @@
+# prepass.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# The counting pass of finddups1.py --two-pass.
+#
+# Most QSOs in a log have no duplicate, and a QSO with no other QSO of
+# the same key can only be a group of one.  The first pass keeps only a
+# 64-bit hash of the key of each record (8 bytes per QSO, in file
+# order), and repeatedMask() finds the hashes that occur more than once:
+#
+#    with NumPy     sort a copy of the hashes, and look them up in the
+#                   sorted repeats (exact, but for 64-bit collisions)
+#    without        a counting Bloom filter of 2-bit counters; it may
+#                   say that a few hashes are repeated that are not
+#
+# Either way, every QSO that has a duplicate is marked, and a few that
+# do not may be too; those are just groups of one in the second pass.
+#
+# The key hashed must be the same or coarser than grind's: with a time
+# tolerance, the bucket (CALL, BAND, RX_BAND, MODE), and otherwise that
+# and QSO_DATE and TIME_ON to the minute, as the strings in the file.
+# With mode groups, MODE is replaced by its group (if it has one) as in
+# the mode_group column of qsotable.QsoTable.
+
+from array import array
+
+import modegroups
+import qsotable
+
+# Counters per hash in the counting Bloom filter, and hashes per key.
+FILTER_COUNTERS_PER_KEY = 8
+FILTER_HASHES = 3
+
+_numpy = None
+
+def _import_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+def modeOf(record):
+    """Return the name of the mode group of a record, or its MODE."""
+    mode = record.get(qsotable.TAG_MODE, '')
+    group = modegroups.modeGroup(mode, record.get(qsotable.TAG_SUBMODE))
+    return modegroups.MODE_GROUP_NAMES[group] if group else mode
+
+def hashKeys(records, window, hashes, modeGroups=False):
+    """Append the hash of the key of each record (dicts or AdifRecords)
+    to hashes, an array('q'); return the number of records."""
+    count = 0
+    append = hashes.append
+    for record in records:
+        get = record.get
+        mode = modeOf(record) if modeGroups else get(qsotable.TAG_MODE, '')
+        if window:
+            key = (get(qsotable.TAG_CALL, ''), get(qsotable.TAG_BAND, ''),
+                   get(qsotable.TAG_RX_BAND, ''), mode)
+        else:
+            key = (get(qsotable.TAG_CALL, ''), get(qsotable.TAG_QSO_DATE, ''),
+                   get(qsotable.TAG_TIME_ON, '')[:4], get(qsotable.TAG_BAND, ''),
+                   get(qsotable.TAG_RX_BAND, ''), mode)
+        append(hash(key))
+        count += 1
+    return count
+
+def repeatedMask(hashes):
+    """Return a bytearray with a 1 for each hash of hashes (an array('q'))
+    that occurs more than once (see above)."""
+    np = _import_numpy()
+    if np:
+        return _repeatedNumpy(np, hashes)
+    return _repeatedFilter(hashes)
+
+def _repeatedNumpy(np, hashes):
+    values = np.frombuffer(hashes, dtype=np.int64)
+    ordered = np.sort(values)
+    repeats = ordered[1:][ordered[1:] == ordered[:-1]]
+    del ordered
+    mask = np.isin(values, np.unique(repeats))
+    return bytearray(mask.view(np.uint8).tobytes())
+
+class CountingFilter:
+    """A counting Bloom filter of 2-bit (0, 1, or 2 or more) counters."""
+
+    def __init__(self, keys):
+        self.size = max(1, keys * FILTER_COUNTERS_PER_KEY)
+        self.counters = bytearray(self.size)
+
+    def _positions(self, value):
+        # Double hashing: h1 + i * h2 for the two 32-bit halves.
+        value &= 0xFFFFFFFFFFFFFFFF
+        h1 = value & 0xFFFFFFFF
+        h2 = (value >> 32) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(FILTER_HASHES)]
+
+    def add(self, value):
+        counters = self.counters
+        for position in self._positions(value):
+            if counters[position] < 2:
+                counters[position] += 1
+
+    def count(self, value):
+        """Return 0, 1, or 2 (2 or more; it may be more than it really is)."""
+        counters = self.counters
+        return min(counters[position] for position in self._positions(value))
+
+def _repeatedFilter(hashes):
+    counts = CountingFilter(len(hashes))
+    for value in hashes:
+        counts.add(value)
+    return bytearray(1 if counts.count(value) > 1 else 0 for value in hashes)
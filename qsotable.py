@@ -0,0 +1,383 @@
+# qsotable.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# A compact, columnar store of QSOs for finddups1.py.
+#
+# A dict per QSO (plus the (qso, keep) tuples and lists in grind's
+# qso_map) costs several hundred bytes per QSO before counting the
+# strings.  A QsoTable keeps the fields that finddups1 works with in
+# columns, one array element per QSO (a "row"):
+#
+#    call, band, rx_band, mode   codes of interned strings
+#    mode_group                  LotW mode group of MODE/SUBMODE (see modegroups.py)
+#    epoch                       QSO_DATE + TIME_ON in epoch seconds
+#    freq_hz, freq_places        FREQ in Hz, and its number of decimal places
+#    flags                       one byte of FLAG_* bits per row
+#    start, end                  byte offsets of the record in the input
+#    file                        which input file the QSO is from
+#
+# The other tags are in a side store looked up by row: for records from
+# an adif_io.MappedAdif they are re-read from the map when needed (only
+# the byte offsets are kept); for dicts, a tuple of a shared tuple of tag
+# names followed by the values (None for the values in the columns).
+#
+# A column value must give back exactly the original string.  The few
+# values that do not fit their column (bad dates, FREQ like '014.07')
+# are kept as strings in a dict by (row, tag).
+#
+# A table loaded from a snapshot (see snapshot.py) has memoryviews of
+# the snapshot's map as its columns instead of arrays; they are copied
+# into arrays only if rows are added.
+
+from array import array
+import sys
+import time
+
+import adif_io
+import modegroups
+
+TAG_CALL = 'CALL'
+TAG_QSO_DATE = 'QSO_DATE'
+TAG_TIME_ON = 'TIME_ON'
+TAG_BAND = 'BAND'
+TAG_RX_BAND = 'RX_BAND'
+TAG_MODE = 'MODE'
+TAG_SUBMODE = 'SUBMODE'
+TAG_FREQ = 'FREQ'
+TAG_QSL_RCVD = 'QSL_RCVD'
+
+# Tags whose values can be rebuilt from the columns
+COLUMN_TAGS = frozenset([TAG_CALL, TAG_QSO_DATE, TAG_TIME_ON, TAG_BAND,
+                         TAG_RX_BAND, TAG_MODE, TAG_FREQ])
+
+# Bits in the flags column
+FLAG_KEEP = 0x01        # grind: keep this QSO
+FLAG_DUP = 0x02         # grind: this QSO is a duplicate
+FLAG_QSL_RCVD = 0x04    # QSL_RCVD is 'Y'
+FLAG_SECONDS = 0x08     # TIME_ON is HHMMSS (not HHMM)
+FLAG_BAD_TIME = 0x10    # QSO_DATE or TIME_ON is not a valid time
+# grind: why the best QSO of its group was kept (see keepers.py)
+FLAG_REASON_MASK = 0x60
+FLAG_REASON_SHIFT = 5
+
+# epoch of a row with a bad (or missing) date or time
+NO_TIME = -(1 << 62)
+# freq_hz of a row with no FREQ (or a FREQ kept as a string)
+NO_FREQ = -1
+
+_HZ_PER_MHZ = 1000000
+
+# The columns of one fixed-width value per row (besides flags)
+ARRAY_COLUMNS = ('call', 'band', 'rx_band', 'mode', 'mode_group', 'epoch',
+                 'freq_hz', 'freq_places', 'start', 'end', 'file')
+
+# QSO_DATE and TIME_ON are converted to epoch seconds this many rows
+# at a time, with adif_io.time_on_epochs().
+TIME_BATCH_SIZE = 8192
+
+class Interner:
+    """Map strings to small integer codes and back."""
+
+    def __init__(self):
+        self.codes = {}
+        self.strings = []
+
+    def code(self, string):
+        code = self.codes.get(string)
+        if code is None:
+            code = len(self.strings)
+            self.codes[string] = code
+            self.strings.append(string)
+        return code
+
+    def __getitem__(self, code):
+        return self.strings[code]
+
+    def __len__(self):
+        return len(self.strings)
+
+def parseFreq(freq):
+    """Return (Hz, decimal places) for FREQ in MHz,
+    or None if it does not turn back into the same string."""
+    whole, dot, fraction = freq.partition('.')
+    if not (whole.isdigit() and whole.isascii() and len(fraction) <= 6
+            and (not dot or (fraction.isdigit() and fraction.isascii()))):
+        return None
+    hz = int(whole) * _HZ_PER_MHZ + (int(fraction.ljust(6, '0')) if fraction else 0)
+    places = len(fraction)
+    if formatFreq(hz, places) != freq:
+        return None
+    return hz, places
+
+def formatFreq(hz, places):
+    """Return FREQ in MHz with the given number of decimal places."""
+    mhz, hz = divmod(hz, _HZ_PER_MHZ)
+    if places == 0:
+        return str(mhz)
+    return '{}.{}'.format(mhz, '{:06d}'.format(hz)[:places])
+
+class QsoTable:
+    """QSOs in columns; a QSO is identified by its row number."""
+
+    def __init__(self, source=None):
+        # sources[file] is the adif_io.MappedAdif the records of a file
+        # come from, or None for dicts.  Most tables have one file.
+        self.sources = [source]
+        self.calls = Interner()
+        self.bands = Interner()     # for BAND and RX_BAND
+        self.modes = Interner()
+        self.call = array('I')
+        self.band = array('I')
+        self.rx_band = array('I')
+        self.mode = array('I')
+        self.mode_group = array('B')
+        self.epoch = array('q')
+        self.freq_hz = array('q')
+        self.freq_places = array('b')
+        self.flags = bytearray()
+        self.start = array('q')
+        self.end = array('q')
+        self.file = array('H')
+        self._rest = []
+        self._odd = {}
+        self._layouts = {}
+        # MODE -> mode group, or None if SUBMODE decides
+        self._modeGroups = {}
+
+    def __len__(self):
+        return len(self.flags)
+
+    @property
+    def source(self):
+        """The source of the first (usually the only) file."""
+        return self.sources[0]
+
+    def addSource(self, source):
+        """Add another input file; return its number, for extend()."""
+        self.sources.append(source)
+        return len(self.sources) - 1
+
+    def append(self, qso, file=0):
+        """Add a QSO (a dict or an adif_io.AdifRecord); return its row."""
+        self.extend([qso], file)
+        return len(self.flags) - 1
+
+    def extend(self, qsos, file=0):
+        """Add QSOs (dicts or adif_io.AdifRecords) of a file."""
+        self._unmap()
+        dates = []
+        times = []
+        for qso in qsos:
+            self._appendRow(qso, file, dates, times)
+            if len(dates) >= TIME_BATCH_SIZE:
+                self._appendTimes(dates, times)
+        self._appendTimes(dates, times)
+
+    def _unmap(self):
+        """Copy the columns that are views of a snapshot into arrays."""
+        for name in ARRAY_COLUMNS:
+            column = getattr(self, name)
+            if not isinstance(column, array):
+                copy = array(column.format)
+                copy.frombytes(column.cast('B'))
+                setattr(self, name, copy)
+
+    def _appendRow(self, qso, file, dates, times):
+        """Add a QSO to all columns except epoch; add its QSO_DATE and
+        TIME_ON to dates and times for _appendTimes()."""
+        row = len(self.flags)
+        get = qso.get
+        flags = 0
+
+        self.call.append(self.calls.code(get(TAG_CALL, '')))
+        self.band.append(self.bands.code(get(TAG_BAND, '')))
+        self.rx_band.append(self.bands.code(get(TAG_RX_BAND, '')))
+        mode = get(TAG_MODE, '')
+        self.mode.append(self.modes.code(mode))
+        group = self._modeGroups.get(mode, -1)
+        if group == -1:
+            group = modegroups.modeGroup(mode) or None
+            self._modeGroups[mode] = group
+        if group is None:
+            group = modegroups.modeGroup(mode, get(TAG_SUBMODE))
+        self.mode_group.append(group)
+
+        time_on = get(TAG_TIME_ON, '')
+        dates.append(get(TAG_QSO_DATE, ''))
+        times.append(time_on)
+        if len(time_on) == 6:
+            flags |= FLAG_SECONDS
+
+        freq = get(TAG_FREQ, '')
+        parsed = parseFreq(freq) if freq else None
+        if parsed is None:
+            self.freq_hz.append(NO_FREQ)
+            self.freq_places.append(-1)
+            if freq:
+                self._odd[(row, TAG_FREQ)] = freq
+        else:
+            self.freq_hz.append(parsed[0])
+            self.freq_places.append(parsed[1])
+
+        if get(TAG_QSL_RCVD) == 'Y':
+            flags |= FLAG_QSL_RCVD
+        self.flags.append(flags)
+
+        self.file.append(file)
+        if self.sources[file] is not None:
+            self.start.append(qso.start)
+            self.end.append(qso.end)
+        else:
+            self.start.append(-1)
+            self.end.append(-1)
+            names = tuple(qso)
+            names = self._layouts.setdefault(names, names)
+            self._rest.append((names,) + tuple(
+                None if name in COLUMN_TAGS else qso[name] for name in names))
+
+    def _appendTimes(self, dates, times):
+        """Convert the pending dates and times in one batch, add them to
+        the epoch column, and clear the lists."""
+        if not dates:
+            return
+        epochs, bad = adif_io.time_on_epochs(dates, times)
+        first = len(self.epoch)
+        i = bad.find(1)
+        while i >= 0:
+            row = first + i
+            epochs[i] = NO_TIME
+            self._odd[(row, TAG_QSO_DATE)] = dates[i]
+            self._odd[(row, TAG_TIME_ON)] = times[i]
+            self.flags[row] |= FLAG_BAD_TIME
+            i = bad.find(1, i + 1)
+        self.epoch.extend(epochs)
+        dates.clear()
+        times.clear()
+
+    @classmethod
+    def fromRecords(cls, qsos, source=None):
+        table = cls(source)
+        table.extend(qsos)
+        return table
+
+    #### Tables built in parallel (see adif_io.parallel_map)
+
+    def __getstate__(self):
+        # A table is pickled without its sources (memory maps); the
+        # receiver has its own maps of the same files.
+        state = self.__dict__.copy()
+        state['sources'] = [None] * len(self.sources)
+        return state
+
+    def extendTable(self, other, file=0):
+        """Add the rows of another QsoTable after the rows of this one.
+        The codes of other's strings are changed to this table's codes,
+        and the rows of its file n are in this table's file + n."""
+        self._unmap()
+        base = len(self.flags)
+        for interner, other_interner, columns in (
+                (self.calls, other.calls, ((self.call, other.call),)),
+                (self.bands, other.bands, ((self.band, other.band),
+                                           (self.rx_band, other.rx_band))),
+                (self.modes, other.modes, ((self.mode, other.mode),))):
+            remap = [interner.code(string) for string in other_interner.strings]
+            if remap == list(range(len(remap))):
+                for column, other_column in columns:
+                    column.extend(other_column)
+            else:
+                for column, other_column in columns:
+                    column.extend(array('I', [remap[code] for code in other_column]))
+        self.mode_group.extend(other.mode_group)
+        self.epoch.extend(other.epoch)
+        self.freq_hz.extend(other.freq_hz)
+        self.freq_places.extend(other.freq_places)
+        self.flags.extend(other.flags)
+        self.start.extend(other.start)
+        self.end.extend(other.end)
+        if file == 0:
+            self.file.extend(other.file)
+        else:
+            self.file.extend(array('H', [file + n for n in other.file]))
+        for rest in other._rest:
+            names = self._layouts.setdefault(rest[0], rest[0])
+            self._rest.append((names,) + rest[1:])
+        for (row, tag), value in other._odd.items():
+            self._odd[(base + row, tag)] = value
+
+    #### Column values as strings
+
+    def value(self, row, tag):
+        """Return the value of one of the COLUMN_TAGS as a string ('' if missing)."""
+        if tag == TAG_CALL:
+            return self.calls[self.call[row]]
+        if tag == TAG_BAND:
+            return self.bands[self.band[row]]
+        if tag == TAG_RX_BAND:
+            return self.bands[self.rx_band[row]]
+        if tag == TAG_MODE:
+            return self.modes[self.mode[row]]
+        if tag == TAG_FREQ:
+            hz = self.freq_hz[row]
+            if hz == NO_FREQ:
+                return self._odd.get((row, tag), '')
+            return formatFreq(hz, self.freq_places[row])
+        if tag in (TAG_QSO_DATE, TAG_TIME_ON):
+            epoch = self.epoch[row]
+            if epoch == NO_TIME:
+                return self._odd[(row, tag)]
+            t = time.gmtime(epoch)
+            if tag == TAG_QSO_DATE:
+                return time.strftime('%Y%m%d', t)
+            if self.flags[row] & FLAG_SECONDS:
+                return time.strftime('%H%M%S', t)
+            return time.strftime('%H%M', t)
+        raise KeyError(tag)
+
+    #### The whole record
+
+    def record(self, row):
+        """Return the QSO of a row as a mapping of all of its tags."""
+        source = self.sources[self.file[row]]
+        if source is not None:
+            return next(source.records(self.start[row], self.end[row]))
+        rest = self._rest[row]
+        return {name: self.value(row, name) if value is None else value
+                for name, value in zip(rest[0], rest[1:])}
+
+    def nbytes(self):
+        """Return the approximate memory used by the columns and side store."""
+        size = sum(column.itemsize * len(column) for column in (
+            self.call, self.band, self.rx_band, self.mode, self.mode_group, self.epoch,
+            self.freq_hz, self.freq_places, self.start, self.end, self.file))
+        size += len(self.flags)
+        size += sys.getsizeof(self._rest) + sum(sys.getsizeof(rest) for rest in self._rest)
+        size += sys.getsizeof(self._odd)
+        return size
+
+def tableOfRecords(adif, records):
+    """Return a QsoTable of some AdifRecords of adif, for adif_io.parallel_map()."""
+    return QsoTable.fromRecords(records, source=adif)
+
+def tableOfFile(fileName, mapped=True):
+    """Return the header dict and a QsoTable of an ADIF file, read with
+    an adif_io.MappedAdif if mapped, else with adif_io.open_stream()
+    (which also reads ADX files)."""
+    if mapped:
+        adif = adif_io.MappedAdif(fileName)
+        return adif.header, QsoTable.fromRecords(adif, source=adif)
+    # One stream for both, so that stdin (see adif_io.open_input) works.
+    with adif_io.open_stream(fileName) as stream:
+        return stream.read_header(), QsoTable.fromRecords(stream)
@@ -0,0 +1,338 @@
+# server.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# The duplicate-checking server of finddups1.py --serve.
+#
+# The LotW report is read and ground once, and its QSOs are kept in a
+# DupIndex: a dict of bucket keys (CALL, BAND, RX_BAND, MODE or mode
+# group; see finddups.bucketKey()) to the QSOs of the bucket, sorted by
+# time.  A lookup finds the bucket of a QSO and bisects it for the QSOs
+# that start in the same minute (exact matching) or within the time
+# tolerance, so it costs about the same however big the report is.
+#
+# Clients connect to a Unix socket or a localhost TCP port and send one
+# JSON request per line; each gets one JSON response line:
+#
+#    {"op": "lookup", "qso": {"CALL": "W1AKI", "QSO_DATE": "20240101",
+#                             "TIME_ON": "1234", "BAND": "20M", "MODE": "FT8"}}
+#        -> {"ok": true, "dup": true, "confirmed": false, "matches": [...]}
+#    {"op": "insert", "qso": {...}}
+#        -> the same, and the QSO is added for later lookups
+#    {"op": "stats"}, {"op": "ping"}
+#
+# Each match is {"row", "QSO_DATE", "TIME_ON", "FREQ", "QSL_RCVD", "status"},
+# row being the record number in the report from 0 (inserted QSOs come
+# after the report) and status 'keep' or 'dup' from grind().  A request
+# may have an "id", which is sent back.  A bad request gets
+# {"ok": false, "error": "..."}.
+#
+# When the file changes (its size or time), it is read again in a
+# thread while the old index goes on answering, and then the new index
+# replaces it.  QSOs inserted before that are dropped: the new report
+# has them if they were uploaded.
+
+import asyncio
+import bisect
+import gc
+import json
+import logging
+import os
+import signal
+import stat
+import time
+
+import adif_io
+import finddups
+import modegroups
+import packedkeys
+import qsotable
+
+log = logging.getLogger('finddups')
+
+# Seconds between looks at the file, for --reload
+DEFAULT_RELOAD_INTERVAL = 2.0
+
+DEFAULT_HOST = '127.0.0.1'
+
+STATUS_KEEP = 'keep'
+STATUS_DUP = 'dup'
+
+def parseAddress(text):
+    """Return ('tcp', host, port) for PORT or HOST:PORT, else ('unix', path)."""
+    host, colon, port = text.rpartition(':')
+    if port.isdigit() and port.isascii() and not os.sep in host:
+        return ('tcp', host or DEFAULT_HOST, int(port))
+    return ('unix', text)
+
+class DupIndex:
+    """The QSOs of a QsoTable (ground with grind()) by bucket key."""
+
+    def __init__(self, table, window=0, modeGroups=False):
+        self.table = table
+        self.window = window
+        self.modeGroups = modeGroups
+        # bucket key -> ([epoch, ...], [row, ...]), sorted by (epoch, row)
+        self._buckets = {}
+        # exactKey() -> [row, ...], for the QSOs with a bad date or time
+        self._exact = {}
+        # Inserted QSOs are dicts, in a file of their own.
+        self._file = None
+        epochs = table.epoch
+        for row in range(len(table)):
+            self._add(row, epochs[row], sort=False)
+        for times, rows in self._buckets.values():
+            if len(rows) > 1 and any(a > b for a, b in zip(times, times[1:])):
+                entries = sorted(zip(times, rows))
+                times[:] = [entry[0] for entry in entries]
+                rows[:] = [entry[1] for entry in entries]
+
+    def _add(self, row, epoch, sort=True):
+        table = self.table
+        if epoch == qsotable.NO_TIME:
+            key = finddups.exactKey(table, row, self.modeGroups)
+            if not (key in self._exact):
+                self._exact[key] = []
+            self._exact[key].append(row)
+            return
+        key = finddups.bucketKey(table, row, self.modeGroups)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = ([], [])
+        times, rows = bucket
+        i = bisect.bisect_right(times, epoch) if sort else len(times)
+        times.insert(i, epoch)
+        rows.insert(i, row)
+
+    def _codes(self, qso):
+        """Return the codes of CALL, BAND, RX_BAND and the mode key of a
+        QSO dict, or None if no QSO of the table can match it."""
+        table = self.table
+        get = qso.get
+        call = table.calls.codes.get(get(qsotable.TAG_CALL, ''))
+        band = table.bands.codes.get(get(qsotable.TAG_BAND, ''))
+        rx_band = table.bands.codes.get(get(qsotable.TAG_RX_BAND, ''))
+        mode = get(qsotable.TAG_MODE, '')
+        group = modegroups.modeGroup(mode, get(qsotable.TAG_SUBMODE)) if self.modeGroups else 0
+        code = table.modes.codes.get(mode)
+        if code is None:
+            if not group:
+                return None
+            # Only the group is in the key.
+            code = 0
+        if call is None or band is None or rx_band is None:
+            return None
+        return call, band, rx_band, packedkeys.modeKeyOf(code, group, self.modeGroups)
+
+    def matches(self, qso):
+        """Return the rows of the QSOs that a QSO dict matches, in order."""
+        codes = self._codes(qso)
+        if codes is None:
+            return []
+        call, band, rx_band, mode = codes
+        date = qso.get(qsotable.TAG_QSO_DATE, '')
+        time_on = qso.get(qsotable.TAG_TIME_ON, '')
+        epochs, bad = adif_io.time_on_epochs([date], [time_on])
+        if bad[0]:
+            if len(time_on) == 6:
+                time_on = time_on[:4]
+            return list(self._exact.get((call, (date, time_on), band, rx_band, mode), ()))
+        bucket = self._buckets.get((call, band, rx_band, mode))
+        if bucket is None:
+            return []
+        epoch = epochs[0]
+        if self.window:
+            low, high = epoch - self.window, epoch + self.window
+        else:
+            low = epoch - epoch % 60
+            high = low + 59
+        times, rows = bucket
+        return sorted(rows[bisect.bisect_left(times, low):bisect.bisect_right(times, high)])
+
+    def insert(self, qso):
+        """Add a QSO dict; return its row."""
+        table = self.table
+        if self._file is None:
+            self._file = table.addSource(None)
+        row = table.append(qso, self._file)
+        self._add(row, table.epoch[row])
+        return row
+
+    def describe(self, row):
+        """Return a match for a response."""
+        table = self.table
+        flags = table.flags[row]
+        status = ''
+        if flags & qsotable.FLAG_DUP:
+            status = STATUS_DUP
+        elif flags & qsotable.FLAG_KEEP:
+            status = STATUS_KEEP
+        return {'row': row,
+                qsotable.TAG_QSO_DATE: table.value(row, qsotable.TAG_QSO_DATE),
+                qsotable.TAG_TIME_ON: table.value(row, qsotable.TAG_TIME_ON),
+                qsotable.TAG_FREQ: table.value(row, qsotable.TAG_FREQ),
+                qsotable.TAG_QSL_RCVD: bool(flags & qsotable.FLAG_QSL_RCVD),
+                'status': status}
+
+def fileState(fileName):
+    """Return what tells that a file has changed."""
+    status = os.stat(fileName)
+    return (status.st_size, status.st_mtime_ns, status.st_ino)
+
+def _isSocket(path):
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+class DupServer:
+    """Answers requests (see above) from an index of one file."""
+
+    def __init__(self, fileName, load, window=0, modeGroups=False,
+                 reloadInterval=DEFAULT_RELOAD_INTERVAL):
+        # load(fileName) returns a QsoTable of the file.
+        self.fileName = fileName
+        self.load = load
+        self.window = window
+        self.modeGroups = modeGroups
+        self.reloadInterval = reloadInterval
+        self.index = None
+        self.counts = {'lookups': 0, 'inserts': 0, 'errors': 0, 'reloads': 0}
+        self.started = time.time()
+
+    def buildIndex(self):
+        """Read the file; return (its state, a DupIndex of it)."""
+        state = fileState(self.fileName)
+        table = self.load(self.fileName)
+        finddups.grind(table, self.window, modeGroups=self.modeGroups)
+        index = DupIndex(table, self.window, self.modeGroups)
+        # The index is hundreds of thousands of objects that live as
+        # long as it does; leave them out of the garbage collector's
+        # full collections, which would otherwise stop the server for
+        # milliseconds now and then.  On a reload, first unfreeze the
+        # objects frozen by the last load, so that the garbage of the
+        # indexes replaced since then is collected, not kept for good.
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+        return state, index
+
+    def respond(self, line):
+        """Return the response line (bytes) to a request line."""
+        request = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('a request must be a JSON object')
+            op = request.get('op')
+            if op in ('lookup', 'insert'):
+                qso = request.get('qso')
+                if not isinstance(qso, dict):
+                    raise ValueError('{} needs a "qso" object'.format(op))
+                qso = {str(name).upper(): str(value) for name, value in qso.items()}
+                index = self.index
+                rows = index.matches(qso)
+                response = {'ok': True, 'dup': bool(rows),
+                            'confirmed': any(index.table.flags[row] & qsotable.FLAG_QSL_RCVD
+                                             for row in rows),
+                            'matches': [index.describe(row) for row in rows]}
+                if op == 'insert':
+                    response['row'] = index.insert(qso)
+                    self.counts['inserts'] += 1
+                else:
+                    self.counts['lookups'] += 1
+            elif op == 'stats':
+                response = dict(self.counts, ok=True, records=len(self.index.table),
+                                uptime=round(time.time() - self.started, 3))
+            elif op == 'ping':
+                response = {'ok': True}
+            else:
+                raise ValueError('unknown op: {!r}'.format(op))
+        except ValueError as error:
+            # (json.JSONDecodeError is a ValueError too.)
+            self.counts['errors'] += 1
+            response = {'ok': False, 'error': str(error)}
+        if isinstance(request, dict) and 'id' in request:
+            response['id'] = request['id']
+        return json.dumps(response).encode('utf-8') + b'\n'
+
+    async def _client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(self.respond(line))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _watch(self, state):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reloadInterval)
+            try:
+                if fileState(self.fileName) == state:
+                    continue
+                log.info('---- %s changed: reading it again ----', self.fileName)
+                state, index = await loop.run_in_executor(None, self.buildIndex)
+            except (OSError, adif_io.AdifException) as error:
+                # Maybe caught half written; try again next time.
+                log.warning('%s: %s', self.fileName, error)
+                continue
+            self.index = index
+            self.counts['reloads'] += 1
+            log.info('---- serving %s QSOs ----', len(index.table))
+
+    async def serve(self, address):
+        state, self.index = self.buildIndex()
+        if address[0] == 'unix':
+            server = await asyncio.start_unix_server(self._client, address[1])
+        else:
+            server = await asyncio.start_server(self._client, address[1], address[2])
+        log.info('---- serving %s QSOs on %s ----', len(self.index.table),
+                 ' '.join(str(part) for part in address[1:]))
+        loop = asyncio.get_running_loop()
+        stop = loop.create_future()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.cancel)
+            except (NotImplementedError, RuntimeError):
+                # Not on Windows: KeyboardInterrupt stops it there.
+                pass
+        async with server:
+            if self.reloadInterval:
+                self._watcher = asyncio.ensure_future(self._watch(state))
+            try:
+                await stop
+            except asyncio.CancelledError:
+                pass
+
+def serve(fileName, address, load, window=0, modeGroups=False,
+          reloadInterval=DEFAULT_RELOAD_INTERVAL):
+    """Serve lookups in the QSOs of a file until interrupted (SIGINT or
+    SIGTERM).  address is from parseAddress()."""
+    if address[0] == 'unix' and _isSocket(address[1]):
+        # Left by a server that was killed.
+        os.unlink(address[1])
+    try:
+        asyncio.run(DupServer(fileName, load, window, modeGroups, reloadInterval).serve(address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if address[0] == 'unix' and _isSocket(address[1]):
+            os.unlink(address[1])
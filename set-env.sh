@@ -1 +1 @@
-export PYTHONPATH="./adif-io/adif_io-0.0.3/adif_io/:$PYTHONPATH"
+export PYTHONPATH="./adif-io/adif_io-0.0.3:$PYTHONPATH"
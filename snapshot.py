@@ -0,0 +1,143 @@
+# snapshot.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# A binary snapshot of the QsoTable of an ADIF file, for finddups1.py --snapshot.
+#
+# Parsing a big report takes seconds; loading its snapshot takes
+# milliseconds.  Unlike a checkpoint (see checkpoint.py), a snapshot
+# has only what was parsed, not the keep/dup decisions, so it serves
+# any tolerance or other matching option.  The file (log.finddups.snap
+# next to log.adi) is:
+#
+#    MAGIC, and the length of the meta data (8 bytes, little-endian)
+#    meta data (JSON): the version, the source file's size and time,
+#        where each column is, and the strings of the interners and
+#        the values that do not fit the columns (QsoTable._odd)
+#    the columns of qsotable.ARRAY_COLUMNS and flags, each as the
+#        bytes of its array, starting at a multiple of 8 bytes
+#
+# The columns are not read: the file is memory-mapped, and the table's
+# columns are memoryviews of the map, so the pages are read (from the
+# page cache, usually) only when they are used.  The flags are copied,
+# since grinding changes them.
+#
+# A snapshot is stale when its source file's size or modification time
+# is not what it was when the snapshot was written, or it was written
+# by another version or on a machine with other sizes or byte order.
+
+from array import array
+import json
+import mmap
+import os
+import sys
+
+import qsotable
+
+# Change this when what is stored, or what it means, changes.
+SNAPSHOT_VERSION = 1
+
+SNAPSHOT_SUFFIX = '.finddups.snap'
+
+MAGIC = b'FDSNAP\r\n'
+
+_LENGTH_BYTES = 8
+_ALIGN = 8
+
+_INTERNERS = ('calls', 'bands', 'modes')
+# The flags that come from parsing (not from grinding)
+_PARSED_FLAGS = qsotable.FLAG_QSL_RCVD | qsotable.FLAG_SECONDS | qsotable.FLAG_BAD_TIME
+_PARSED_BITS = bytes(flags & _PARSED_FLAGS for flags in range(256))
+
+def snapshotFileName(fileName):
+    """Return the snapshot file name for an input file: log.adi -> log.finddups.snap"""
+    return os.path.splitext(fileName)[0] + SNAPSHOT_SUFFIX
+
+def sourceState(fileName):
+    """Return what tells that a source file has changed."""
+    status = os.stat(fileName)
+    return [status.st_size, status.st_mtime_ns]
+
+def _platform():
+    return {'byteorder': sys.byteorder,
+            'itemsizes': {name: array(code).itemsize for name, code in _typecodes().items()}}
+
+def _typecodes():
+    table = qsotable.QsoTable()
+    return {name: getattr(table, name).typecode for name in qsotable.ARRAY_COLUMNS}
+
+def save(fileName, table, sourceFileName):
+    """Write the snapshot of a QsoTable of the records of one MappedAdif
+    (of sourceFileName), replacing the file at the end."""
+    if any(source is None for source in table.sources) or len(table.sources) != 1:
+        raise ValueError('a snapshot is of the records of one mapped file')
+    columns = [(name, getattr(table, name)) for name in qsotable.ARRAY_COLUMNS]
+    columns.append(('flags', table.flags.translate(_PARSED_BITS)))
+    layout = {}
+    position = 0
+    for name, column in columns:
+        nbytes = memoryview(column).nbytes
+        layout[name] = [position, nbytes]
+        position += -(-nbytes // _ALIGN) * _ALIGN
+    meta = dict(_platform(), version=SNAPSHOT_VERSION, source=sourceState(sourceFileName),
+                header_end=table.source.header_end, rows=len(table), columns=layout,
+                strings={name: getattr(table, name).strings for name in _INTERNERS},
+                odd=[[row, tag, value] for (row, tag), value in table._odd.items()])
+    data = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    data += b' ' * (-(len(MAGIC) + _LENGTH_BYTES + len(data)) % _ALIGN)
+    temporary = fileName + '.tmp'
+    with open(temporary, 'wb') as out:
+        out.write(MAGIC)
+        out.write(len(data).to_bytes(_LENGTH_BYTES, 'little'))
+        out.write(data)
+        for name, column in columns:
+            out.write(column)
+            out.write(bytes(-out.tell() % _ALIGN))
+    os.replace(temporary, fileName)
+
+def load(fileName, adif, sourceFileName):
+    """Return a QsoTable of the records of a MappedAdif (of sourceFileName)
+    from its snapshot, or None if there is none or it is stale."""
+    try:
+        with open(fileName, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            length = int.from_bytes(f.read(_LENGTH_BYTES), 'little')
+            meta = json.loads(f.read(length))
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if (meta.get('version') != SNAPSHOT_VERSION
+            or meta.get('source') != sourceState(sourceFileName)
+            or meta.get('header_end') != adif.header_end
+            or any(meta.get(name) != value for name, value in _platform().items())):
+        mapped.close()
+        return None
+
+    base = len(MAGIC) + _LENGTH_BYTES + length
+    view = memoryview(mapped)
+    table = qsotable.QsoTable(source=adif)
+    for name, code in list(_typecodes().items()) + [('flags', 'B')]:
+        position, nbytes = meta['columns'][name]
+        column = view[base + position:base + position + nbytes].cast(code)
+        if name == 'flags':
+            column = bytearray(column)
+        setattr(table, name, column)
+    for name in _INTERNERS:
+        interner = getattr(table, name)
+        interner.strings = meta['strings'][name]
+        interner.codes = {string: code for code, string in enumerate(interner.strings)}
+    table._odd = {(row, tag): value for row, tag, value in meta['odd']}
+    return table
@@ -0,0 +1,138 @@
+# stats.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Phase timing and counters for finddups1.py --stats.
+#
+# Each phase (parse, keys, grouping, decision, write) gets its wall
+# time and the peak memory (resident set size) while it ran.  On Linux
+# the peak is reset at the start of each phase (/proc/self/clear_refs),
+# so it is the phase's own; elsewhere it is the peak of the process so
+# far.  With stats off, phase() does nothing but run the code.
+#
+# With --parser pipeline, each stage thread (see pipeline.py) also
+# reports how long it ran and how long it waited for its input and
+# for room for its output.
+
+import contextlib
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows
+    resource = None
+
+_CLEAR_REFS = '/proc/self/clear_refs'
+_STATUS = '/proc/self/status'
+
+def _resetPeak():
+    """Reset the peak RSS of this process; return True if that worked."""
+    try:
+        with open(_CLEAR_REFS, 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+def _peak():
+    """Return the peak RSS of this process in bytes, or None."""
+    try:
+        with open(_STATUS) as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives KiB, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Stats:
+    """Wall time and peak memory of phases, and named counters."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        # (name, seconds, peak bytes or None, peak is the phase's own);
+        # a phase that runs more than once is added up.
+        self.phases = []
+        self.counters = {}      # name -> value, in the order first set
+        # name -> [seconds, waiting for input, waiting for output] of the
+        # stages of --parser pipeline; a stage that runs more than once
+        # is added up.
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        own = _resetPeak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = _peak()
+            for i, (was, wasSeconds, wasPeak, wasOwn) in enumerate(self.phases):
+                if was == name:
+                    # The same phase again: add the time, keep the higher peak.
+                    if wasPeak is not None and (peak is None or wasPeak > peak):
+                        peak = wasPeak
+                    self.phases[i] = (name, wasSeconds + seconds, peak, own and wasOwn)
+                    break
+            else:
+                self.phases.append((name, seconds, peak, own))
+
+    def stage(self, name, seconds, inputWait, outputWait):
+        if self.enabled:
+            total = self.stages.setdefault(name, [0.0, 0.0, 0.0])
+            for i, value in enumerate((seconds, inputWait, outputWait)):
+                total[i] += value
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counters[name] = value
+
+    def report(self, out=sys.stderr):
+        """Write the phases and counters as text."""
+        print('---- stats ----', file=out)
+        print('{:<12} {:>10} {:>10}'.format('phase', 'seconds', 'peak MiB'), file=out)
+        total = 0.0
+        for name, seconds, peak, own in self.phases:
+            total += seconds
+            print('{:<12} {:>10.3f} {:>10}'.format(
+                name, seconds,
+                '-' if peak is None else '{:.1f}{}'.format(peak / (1 << 20), '' if own else '*')),
+                file=out)
+        print('{:<12} {:>10.3f}'.format('total', total), file=out)
+        if any(not own for name, seconds, peak, own in self.phases):
+            print('(* peak of the process so far)', file=out)
+        if self.stages:
+            print('{:<12} {:>10} {:>10} {:>10}'.format('stage', 'seconds', 'wait in', 'wait out'),
+                  file=out)
+            for name, (seconds, inputWait, outputWait) in self.stages.items():
+                print('{:<12} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+                    name, seconds, inputWait, outputWait), file=out)
+        for name, value in self.counters.items():
+            if isinstance(value, dict):
+                print('{}:'.format(name), file=out)
+                for key, n in value.items():
+                    print('    {:>8} {:>10}'.format(key, n), file=out)
+            else:
+                print('{}: {}'.format(name, value), file=out)
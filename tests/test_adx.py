@@ -0,0 +1,73 @@
+# test_adx.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Tests that adif_io.AdxWriter writes what adif_io.AdxStream reads back.
+#
+# USAGE (in the top directory, with PYTHONPATH set as in set-env.sh):
+#
+#    python3 -m unittest discover tests
+
+import io
+import subprocess
+import sys
+import unittest
+
+import adif_io
+
+HEADER = {'ADIF_VER': '3.1.0', 'USERDEF1': 'EPC', 'PROGRAMID': 'a "quoted" & <odd> one'}
+QSOS = [{'CALL': 'W1AW', 'APP_LOTW_MODEGROUP': 'DATA', 'EPC': '32',
+         'NOTES': 'AT&T <eor> & > "ok"'},
+        {'CALL': 'K1A', 'APP_N1MM_EXCHANGE1': '5NN', 'COMMENT': ''}]
+
+class AdxTest(unittest.TestCase):
+
+    def write(self, header, qsos):
+        output = io.BytesIO()
+        with adif_io.AdxWriter(output) as writer:
+            writer.write_text('made by <test> & --more')
+            writer.write_header(header)
+            for qso in qsos:
+                writer.write_record(qso)
+        return output.getvalue()
+
+    def testRoundTrip(self):
+        stream = adif_io.AdxStream(io.BytesIO(self.write(HEADER, QSOS)))
+        self.assertEqual(stream.read_header(), HEADER)
+        self.assertEqual(list(stream), QSOS)
+
+    def testElements(self):
+        text = self.write(HEADER, QSOS).decode('utf-8')
+        self.assertIn('<USERDEF FIELDID="1">EPC</USERDEF>', text)
+        self.assertIn('<USERDEF FIELDNAME="EPC">32</USERDEF>', text)
+        self.assertIn('<APP PROGRAMID="LOTW" FIELDNAME="MODEGROUP">DATA</APP>', text)
+        self.assertIn('<NOTES>AT&amp;T &lt;eor&gt; &amp; &gt; "ok"</NOTES>', text)
+
+    def testNoRecords(self):
+        stream = adif_io.AdxStream(io.BytesIO(self.write({}, [])))
+        self.assertEqual(stream.read_header(), {})
+        self.assertEqual(list(stream), [])
+
+    def testQuickImport(self):
+        # The XML modules (and urllib, which saxutils imports) are not
+        # imported until an ADX file is read.
+        modules = subprocess.check_output(
+            [sys.executable, '-c',
+             'import sys, adif_io; print(" ".join(sorted(sys.modules)))'], text=True).split()
+        for module in ('xml.etree.ElementTree', 'xml.sax.saxutils', 'urllib.request'):
+            self.assertNotIn(module, modules)
+
+if __name__ == '__main__':
+    unittest.main()
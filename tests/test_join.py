@@ -0,0 +1,104 @@
+# test_join.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Tests of finddups1.py --join, with and without a time tolerance, by
+# hash join and by sort-merge join.
+#
+# USAGE (in the top directory, with PYTHONPATH set as in set-env.sh):
+#
+#    python3 -m unittest discover tests
+
+import os
+import tempfile
+import unittest
+
+import finddups1
+import join
+import partition
+import tolerance
+
+LOTW = '''lotw <EOH>
+<CALL:4>W1AW <QSO_DATE:8>20240101 <TIME_ON:4>1200 <BAND:3>20M <MODE:3>FT8 <QSL_RCVD:1>Y <EOR>
+<CALL:4>W1AW <QSO_DATE:8>20240101 <TIME_ON:4>1210 <BAND:3>20M <MODE:3>FT8 <EOR>
+<CALL:4>K1AA <QSO_DATE:8>20240101 <TIME_ON:4>1300 <BAND:3>40M <MODE:2>CW <EOR>
+<CALL:4>N1BB <QSO_DATE:7>2024010 <TIME_ON:4>1300 <BAND:3>40M <MODE:2>CW <EOR>
+'''
+
+LOGGER = '''log <EOH>
+<CALL:4>W1AW <QSO_DATE:8>20240101 <TIME_ON:4>1205 <BAND:3>20M <MODE:3>FT8 <EOR>
+<CALL:4>K1AA <QSO_DATE:8>20240101 <TIME_ON:6>130059 <BAND:3>40M <MODE:2>CW <EOR>
+<CALL:4>K1AA <QSO_DATE:8>20240101 <TIME_ON:4>1320 <BAND:3>40M <MODE:2>CW <EOR>
+<CALL:4>K1AA <QSO_DATE:8>20240101 <TIME_ON:4>1320 <BAND:3>20M <MODE:2>CW <EOR>
+<CALL:4>N1BB <QSO_DATE:7>2024010 <TIME_ON:4>1300 <BAND:3>40M <MODE:2>CW <EOR>
+<CALL:4>N1BB <QSO_DATE:7>2024010 <TIME_ON:4>1301 <BAND:3>40M <MODE:2>CW <EOR>
+'''
+
+class JoinTest(unittest.TestCase):
+
+    def table(self, text):
+        with tempfile.NamedTemporaryFile('wb', suffix='.adi', delete=False) as adif_file:
+            adif_file.write(text.encode('utf-8'))
+        self.addCleanup(os.remove, adif_file.name)
+        header, table = finddups1.readInput(adif_file.name, finddups1.PARSER_MMAP)
+        self.addCleanup(table.source.close)
+        return table
+
+    def join(self, window, maxMemory=None):
+        """Return (status, LotW matches, first LotW row) of each logger QSO."""
+        lotw = self.table(LOTW)
+        logger = self.table(LOGGER)
+        qso_map = finddups1.grind(lotw, window)
+        method = join.joinMethod(len(logger), len(lotw), maxMemory)
+        matched, counts, firsts = finddups1.joinLogs(lotw, qso_map, logger, method,
+                                                     maxMemory, window=window)
+        return [(finddups1.joinStatus(matched[row]), counts[row], firsts[row])
+                for row in range(len(logger))]
+
+    def testExact(self):
+        expected = [(finddups1.JOIN_NONE, 0, -1),
+                    (finddups1.JOIN_UNCONFIRMED, 1, 2),
+                    (finddups1.JOIN_NONE, 0, -1),
+                    (finddups1.JOIN_NONE, 0, -1),
+                    (finddups1.JOIN_UNCONFIRMED, 1, 3),
+                    (finddups1.JOIN_NONE, 0, -1)]
+        self.assertEqual(self.join(0), expected)
+        # The LotW side does not fit: sort-merge join
+        self.assertEqual(self.join(0, maxMemory=1), expected)
+
+    def testTolerance(self):
+        window = tolerance.parseTolerance('lotw')
+        expected = [(finddups1.JOIN_DUP, 2, 0),
+                    (finddups1.JOIN_UNCONFIRMED, 1, 2),
+                    (finddups1.JOIN_UNCONFIRMED, 1, 2),
+                    (finddups1.JOIN_NONE, 0, -1),
+                    # A bad date only matches exactly.
+                    (finddups1.JOIN_UNCONFIRMED, 1, 3),
+                    (finddups1.JOIN_NONE, 0, -1)]
+        self.assertEqual(self.join(window), expected)
+        self.assertEqual(self.join(window, maxMemory=1), expected)
+
+    def testBandJoinEdges(self):
+        left = [(('a', 0), 0), (('a', 60), 1), (('b', 0), 2)]
+        right = [(('a', 30), 10), (('a', 91), 11), (('b', 32), 12)]
+        expected = [(0, 10), (1, 10), (1, 11)]
+        for method in (join.JOIN_HASH, join.JOIN_SORT_MERGE):
+            with partition.SpillDirectory() as spillDir:
+                pairs = join.joinPairs(left, len(left), right, len(right), method,
+                                       spillDir, maxMemory=1, window=31)
+                self.assertEqual(sorted(pairs), expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# test_mapped.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Tests that adif_io.MappedAdif reads the same QSOs as read_from_string().
+#
+# USAGE (in the top directory, with PYTHONPATH set as in set-env.sh):
+#
+#    python3 -m unittest discover tests
+
+import io
+import os
+import tempfile
+import unittest
+
+import adif_io
+
+class MappedAdifTest(unittest.TestCase):
+
+    def mapped(self, text):
+        """Return the header and the AdifRecords of text, and read_from_string() of it."""
+        with tempfile.NamedTemporaryFile('wb', suffix='.adi', delete=False) as adif_file:
+            adif_file.write(text.encode('utf-8'))
+        self.addCleanup(os.remove, adif_file.name)
+        adif = adif_io.MappedAdif(adif_file.name)
+        self.addCleanup(adif.close)
+        return adif.header, list(adif), adif_io.read_from_string(text)
+
+    def testRepeatedField(self):
+        header, records, (qsos, expected) = self.mapped(
+            'x<eoh>\n<CALL:2>K1<CALL:2>W2<BAND:3>20m<eor>\n')
+        record = records[0]
+        self.assertEqual(dict(record), qsos[0])
+        self.assertEqual(dict(record), {'CALL': 'W2', 'BAND': '20m'})
+        self.assertEqual(len(record), 2)
+        self.assertEqual(list(record), ['CALL', 'BAND'])
+        output = io.BytesIO()
+        with adif_io.AdifWriter(output) as writer:
+            writer.write_record(record)
+        self.assertEqual(output.getvalue(), b'\n<CALL:2>W2\n<BAND:3>20m\n<EOR>\n')
+
+    def testNonAsciiName(self):
+        header, records, (qsos, expected) = self.mapped(
+            'x <ÄH:1>q<eoh>\n<ÄX:1>z<CALL:2>K3<eor>\n<CALL:2>N1<€X:1>y<eor>\n')
+        self.assertEqual(header, expected)
+        self.assertEqual([dict(record) for record in records], qsos)
+        self.assertEqual(dict(records[0]), {'ÄX': 'z', 'CALL': 'K3'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# test_passthrough.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Tests that --passthrough sets the ADIF PROP_MODE field of a duplicate.
+#
+# USAGE (in the top directory, with PYTHONPATH set as in set-env.sh):
+#
+#    python3 -m unittest discover tests
+
+import os
+import tempfile
+import unittest
+
+import adif_io
+
+import finddups1
+
+class MungedBytesTest(unittest.TestCase):
+
+    def munged(self, text):
+        """Return mungedBytes() of each record of text."""
+        with tempfile.NamedTemporaryFile('wb', suffix='.adi', delete=False) as adif_file:
+            adif_file.write(text.encode('utf-8'))
+        self.addCleanup(os.remove, adif_file.name)
+        adif = adif_io.MappedAdif(adif_file.name)
+        self.addCleanup(adif.close)
+        return [finddups1.mungedBytes(adif, record) for record in adif]
+
+    def testAddPropMode(self):
+        munged, = self.munged('x<eoh>\n<CALL:2>K1 <eor>\n')
+        self.assertEqual(munged, b'\n<CALL:2>K1 <PROP_MODE:3>IRL\n<eor>')
+
+    def testReplacePropMode(self):
+        munged, = self.munged('x<eoh>\n<CALL:2>K1 <PROP_MODE:2>ES <BAND:3>20m <eor>\n')
+        self.assertEqual(munged, b'\n<CALL:2>K1 <PROP_MODE:3>IRL <BAND:3>20m <eor>')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# test_server.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Tests of the --serve server (server.py): lookups over a Unix socket,
+# and a reload that replaces the index when the file changes.
+#
+# USAGE (in the top directory, with PYTHONPATH set as in set-env.sh):
+#
+#    python3 -m unittest discover tests
+
+import asyncio
+import gc
+import json
+import os
+import tempfile
+import unittest
+import weakref
+
+import finddups1
+import server
+
+BEFORE = '''lotw <EOH>
+<CALL:4>W1AW <QSO_DATE:8>20240101 <TIME_ON:4>1200 <BAND:3>20M <MODE:3>FT8 <EOR>
+'''
+
+AFTER = '''lotw <EOH>
+<CALL:4>W1AW <QSO_DATE:8>20240101 <TIME_ON:4>1200 <BAND:3>20M <MODE:3>FT8 <QSL_RCVD:1>Y <EOR>
+<CALL:4>K1AA <QSO_DATE:8>20240101 <TIME_ON:4>1300 <BAND:3>40M <MODE:2>CW <EOR>
+'''
+
+W1AW = {'CALL': 'W1AW', 'QSO_DATE': '20240101', 'TIME_ON': '1200', 'BAND': '20M', 'MODE': 'FT8'}
+K1AA = {'CALL': 'K1AA', 'QSO_DATE': '20240101', 'TIME_ON': '1300', 'BAND': '40M', 'MODE': 'CW'}
+N1BB = {'CALL': 'N1BB', 'QSO_DATE': '20240101', 'TIME_ON': '1400', 'BAND': '40M', 'MODE': 'CW'}
+
+def load(fileName):
+    return finddups1.readInputs([fileName], finddups1.PARSER_MMAP, 1, False)[1]
+
+class ReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.fileName = os.path.join(directory.name, 'lotw.adi')
+        self.socketName = os.path.join(directory.name, 'finddups.sock')
+        self.write(BEFORE)
+
+    def write(self, text):
+        # Replaced as a whole, as a new download would be, so the old
+        # index can go on reading the old file.
+        newName = self.fileName + '.new'
+        with open(newName, 'w') as adif_file:
+            adif_file.write(text)
+        os.replace(newName, self.fileName)
+
+    def testReload(self):
+        asyncio.run(self.reload())
+
+    async def reload(self):
+        dupServer = server.DupServer(self.fileName, load, reloadInterval=0.01)
+        serving = asyncio.ensure_future(dupServer.serve(('unix', self.socketName)))
+        while not os.path.exists(self.socketName):
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_unix_connection(self.socketName)
+
+        async def request(**request):
+            writer.write(json.dumps(request).encode('utf-8') + b'\n')
+            return json.loads(await reader.readline())
+
+        try:
+            response = await request(op='lookup', qso=W1AW)
+            self.assertTrue(response['dup'])
+            self.assertFalse(response['confirmed'])
+            self.assertFalse((await request(op='lookup', qso=K1AA))['dup'])
+            await request(op='insert', qso=N1BB)
+            self.assertTrue((await request(op='lookup', qso=N1BB))['dup'])
+            # Only the cycle collector can free an index in a cycle.
+            dupServer.index.cycle = [dupServer.index]
+            oldIndex = weakref.ref(dupServer.index)
+
+            self.write(AFTER)
+            while (await request(op='stats'))['reloads'] < 1:
+                await asyncio.sleep(0.01)
+            self.assertIsNot(dupServer.index, oldIndex())
+            self.assertEqual((await request(op='stats'))['records'], 2)
+            response = await request(op='lookup', qso=W1AW)
+            self.assertTrue(response['dup'])
+            self.assertTrue(response['confirmed'])
+            self.assertTrue((await request(op='lookup', qso=K1AA))['dup'])
+            # The inserted QSO went with the old index.
+            self.assertFalse((await request(op='lookup', qso=N1BB))['dup'])
+
+            # The old index was frozen by the reload (it was still in
+            # use then), and is collected by the next one.
+            self.write(AFTER)
+            while (await request(op='stats'))['reloads'] < 2:
+                await asyncio.sleep(0.01)
+            self.assertIsNone(oldIndex())
+        finally:
+            writer.close()
+            serving.cancel()
+            await asyncio.gather(serving, return_exceptions=True)
+            gc.unfreeze()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# test_tolerance.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Tests of time-tolerance matching (tolerance.py, finddups.groupRows()).
+#
+# USAGE (in the top directory, with PYTHONPATH set as in set-env.sh):
+#
+#    python3 -m unittest discover tests
+
+import unittest
+
+import finddups
+import tolerance
+
+def qso(timeOn):
+    return {'CALL': 'K1ABC', 'QSO_DATE': '20230101', 'TIME_ON': timeOn,
+            'BAND': '20M', 'MODE': 'FT8'}
+
+class ParseToleranceTest(unittest.TestCase):
+
+    def testValues(self):
+        self.assertEqual(tolerance.parseTolerance('lotw'), 30 * 60)
+        self.assertEqual(tolerance.parseTolerance('2.5'), 150)
+        self.assertEqual(tolerance.parseTolerance('0'), 0)
+
+    def testBadValues(self):
+        for text in ('inf', '-inf', 'nan', '1e400', '-1', 'soon'):
+            with self.assertRaises(ValueError):
+                tolerance.parseTolerance(text)
+        with self.assertRaises(ValueError):
+            finddups.Policy(tolerance='inf')
+
+class ClustersTest(unittest.TestCase):
+
+    def testNoChaining(self):
+        # Each neighbour is within 30 minutes, but not the whole chain.
+        bucket = [(minutes * 60, row) for row, minutes in enumerate([0, 25, 50, 75, 100])]
+        self.assertEqual([[row for epoch, row in cluster]
+                          for cluster in tolerance.clusters(bucket, 30 * 60)],
+                         [[0, 1], [2, 3], [4]])
+
+    def testWithinWindow(self):
+        bucket = [(0, 0), (600, 1), (1800, 2), (1801, 3)]
+        self.assertEqual([[row for epoch, row in cluster]
+                          for cluster in tolerance.clusters(bucket, 30 * 60)],
+                         [[0, 1, 2], [3]])
+
+    def testMatchingPairs(self):
+        # clusters() splits 25 and 50, which are within 30 minutes;
+        # matchingPairs() has every pair.
+        bucket = [(minutes * 60, row) for row, minutes in enumerate([0, 25, 50, 75, 100])]
+        self.assertEqual(list(tolerance.matchingPairs(bucket, 30 * 60)),
+                         [(0, 1), (1, 2), (2, 3), (3, 4)])
+        bucket = [(0, 0), (600, 1), (1800, 2), (1801, 3)]
+        self.assertEqual(list(tolerance.matchingPairs(bucket, 30 * 60)),
+                         [(0, 1), (0, 2), (1, 2), (1, 3), (2, 3)])
+
+class FindDuplicatesTest(unittest.TestCase):
+
+    def testChainIsNotOneGroup(self):
+        qsos = [qso(timeOn) for timeOn in ['0000', '0025', '0050', '0115', '0140']]
+        groups = finddups.find_duplicates(qsos, finddups.Policy('lotw'))
+        self.assertEqual([(group.keep, group.dups) for group in groups],
+                         [([0], [1]), ([2], [3])])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# tolerance.py (python3)
+
+#  Copyright 2024 Aron K. Insinga
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# Time-tolerance matching for finddups1.py.
+#
+# Clublog matches QSOs whose times are within +/- 15 minutes, LotW
+# within 30 minutes (see the comments in finddups1.py).  The QSOs are
+# put into buckets by (CALL, BAND, RX_BAND, MODE), each bucket is
+# sorted by QSO start time (epoch seconds), and then a single sweep
+# over each sorted bucket groups the QSOs within the window of the
+# first QSO of their group, so that all of the QSOs of a group are
+# within the window of each other.  That is O(n log n) overall, even
+# when a few very busy callsigns have thousands of QSOs each; nothing
+# compares all pairs.
+#
+# The groups do not hold every matching pair: two QSOs within the
+# window of each other are in different groups when the first one is
+# not within the window of the first QSO of its group (e.g. with lotw,
+# QSOs at 0000, 0025 and 0050 are grouped [0000, 0025], [0050]).
+# matchingPairs() yields every pair, for callers that need them all.
+
+import bisect
+import math
+
+# Matching windows in seconds, for --tolerance
+TOLERANCE_EXACT = 'exact'
+TOLERANCE_PRESETS = {
+    TOLERANCE_EXACT: 0,
+    'clublog': 15 * 60,
+    'lotw': 30 * 60,
+}
+
+def parseTolerance(text):
+    """Return the window in seconds for a preset name or a number of minutes.
+    0 means exact matching (the time truncated to HHMM must be equal)."""
+    if text in TOLERANCE_PRESETS:
+        return TOLERANCE_PRESETS[text]
+    try:
+        minutes = float(text)
+    except ValueError:
+        raise ValueError('tolerance must be one of {} or a number of minutes: {!r}'.format(
+            ', '.join(TOLERANCE_PRESETS), text)) from None
+    if not math.isfinite(minutes):
+        raise ValueError('tolerance must be a finite number of minutes: {!r}'.format(text))
+    if minutes < 0:
+        raise ValueError('tolerance must not be negative: {!r}'.format(text))
+    return int(minutes * 60)
+
+# A bucket is a list of (epoch, row) entries, where row is the row of
+# the QSO in the QsoTable (its position in the file), sorted with
+# list.sort() (by time, then by position in the file).
+
+def clusters(bucket, window):
+    """Split a sorted bucket into lists of entries: each list starts with
+    the earliest entry not in an earlier list, and holds the entries
+    within window seconds of it.  So every two entries of a list are
+    within window seconds of each other; QSOs spaced a little less than
+    window apart do not chain into one list.  Entries within window
+    seconds of each other on both sides of the start of a list are in
+    different lists (see matchingPairs())."""
+    cluster = []
+    anchor = None
+    for entry in bucket:
+        if cluster and entry[0] - anchor > window:
+            yield cluster
+            cluster = []
+        if not cluster:
+            anchor = entry[0]
+        cluster.append(entry)
+    if cluster:
+        yield cluster
+
+def matchingPairs(bucket, window):
+    """Yield (i, j), i < j, for every pair of entries of a sorted bucket
+    whose times are within window seconds of each other, whether or not
+    clusters() puts them in the same list.
+    The work is proportional to the number of pairs found."""
+    times = [entry[0] for entry in bucket]
+    for i, t in enumerate(times):
+        last = bisect.bisect_right(times, t + window, i + 1)
+        for j in range(i + 1, last):
+            yield i, j